@@ -1,4 +1,4 @@
-"""Bilingual and BilingualDict are classes which contain English and Welsh values."""
+"""Bilingual and its subclasses are classes which contain English and Welsh values."""
 
 
 class Bilingual:
@@ -27,13 +27,55 @@ class BilingualDict(Bilingual):
     """Collection of fields some or all of which may have English/Welsh values."""
 
     def __init__(self, data, private=None):
-        """Initialize BilingualDict object. The data variable is modified by this method."""
+        """
+        Initialize BilingualDict object. The data variable is modified by this method.
+
+        data may be any mapping that supports keys(), such as a row returned by
+        ons_csv_to_ctb_json_read.Reader. It is copied to a dict if it is not already a dict.
+        """
+        if not isinstance(data, dict):
+            data = dict(data)
         self.private = private
         welsh = {}
         localize_dict(data, welsh)
         Bilingual.__init__(self, data, welsh)
 
 
+class CategoryLabels(Bilingual):
+    """
+    CategoryLabels holds the English and Welsh labels for the categories of a classification.
+
+    The codes and labels are held in parallel tuples, rather than as a dictionary of code to label
+    for each language, so that no objects are created for individual categories. The dictionaries
+    are only created by english() and welsh() when the labels are serialised. Categories with an
+    empty label are omitted from the dictionary for that language. If there are no Welsh labels
+    then welsh_labels should be None and welsh() returns None.
+    """
+
+    def __init__(self, codes, english_labels, welsh_labels):
+        """Initialize CategoryLabels object."""
+        super().__init__(english_labels, welsh_labels, default_to_english=False)
+        self.codes = codes
+
+    def __len__(self):
+        """Return the number of categories."""
+        return len(self.codes)
+
+    def english(self):
+        """Return a dictionary of category code to English label."""
+        return {code: label for code, label in zip(self.codes, self._english) if label}
+
+    def has_welsh(self):
+        """Return True if there are Welsh labels."""
+        return self._welsh is not None
+
+    def welsh(self):
+        """Return a dictionary of category code to Welsh label, or None if there are none."""
+        if self._welsh is None:
+            return None
+        return {code: label for code, label in zip(self.codes, self._welsh) if label}
+
+
 def localize(original, welsh, key_index, value):
     """
     Resolve the translations or call localize_dict/localize_list.
@@ -0,0 +1,214 @@
+"""Cache validated CSV rows on disk, keyed on the file contents and the processing options."""
+import hashlib
+import logging
+import os
+import pickle
+import sys
+import tempfile
+import types
+from ons_csv_to_ctb_json_read import Row, RowData
+
+# Increment CACHE_FORMAT_VERSION whenever the structure of cache entries changes.
+CACHE_FORMAT_VERSION = 1
+
+CACHE_SUFFIX = '.pickle'
+
+
+def file_digest(filename):
+    """Return the SHA-256 digest of the contents of a file."""
+    hasher = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def intern_values(values, positions):
+    """Return a tuple of values with the strings at the specified positions interned."""
+    values = list(values)
+    for position in positions:
+        if values[position] is not None:
+            values[position] = sys.intern(values[position])
+    return tuple(values)
+
+
+class CacheKey:
+    """
+    CacheKey accumulates the values that determine the contents of a cache entry.
+
+    A key can only be created from values that can be fingerprinted exactly: strings, numbers,
+    None, collections of these values, and functions whose closures only contain these values.
+    The source code of the module defining each function is included in the key, so any change to
+    validation or conversion code invalidates the affected entries. If a value cannot be
+    fingerprinted then the key is marked as invalid and the data must not be cached.
+    """
+
+    def __init__(self, *parts):
+        """Initialise CacheKey object with the cache format and pickle protocol versions."""
+        self.valid = True
+        self._hasher = hashlib.sha256()
+        self._modules = set()
+        self.add(CACHE_FORMAT_VERSION, pickle.HIGHEST_PROTOCOL)
+        self.add(*parts)
+
+    def add(self, *values):
+        """Add values to the key."""
+        for value in values:
+            if not self._add(value):
+                self.valid = False
+
+    def add_modules(self, *module_names):
+        """Add the source code of the named modules to the key."""
+        self._modules.update(module_names)
+
+    def _update(self, text):
+        self._hasher.update(text.encode('utf-8'))
+        self._hasher.update(b'\0')
+
+    def _add(self, value):
+        if value is None or isinstance(value, (str, int, float, bool)):
+            self._update(f'{type(value).__name__}:{value!r}')
+            return True
+
+        if isinstance(value, (set, frozenset)):
+            # Sort on the repr so that the order is deterministic regardless of the element types.
+            self._update(f'set:{len(value)}')
+            return all(self._add(v) for v in sorted(value, key=repr))
+
+        if isinstance(value, (list, tuple)):
+            self._update(f'seq:{len(value)}')
+            return all(self._add(v) for v in value)
+
+        if isinstance(value, types.FunctionType):
+            self._update(f'fn:{value.__module__}.{value.__qualname__}')
+            self._modules.add(value.__module__)
+            cells = value.__closure__ or ()
+            self._update(f'cells:{len(cells)}')
+            return all(self._add(cell.cell_contents) for cell in cells)
+
+        if isinstance(value, types.BuiltinFunctionType) and value.__module__ == 'builtins':
+            self._update(f'builtin:{value.__qualname__}')
+            return True
+
+        return False
+
+    def hexdigest(self):
+        """Return the key as a hex string, or None if the key is invalid."""
+        if not self.valid:
+            return None
+
+        hasher = self._hasher.copy()
+        for module_name in sorted(self._modules | {__name__, Row.__module__}):
+            hasher.update(module_name.encode('utf-8'))
+            hasher.update(file_digest(sys.modules[module_name].__file__).encode('utf-8'))
+        return hasher.hexdigest()
+
+
+class RowCache:
+    """
+    RowCache stores the validated rows read from CSV files in a cache directory.
+
+    Each entry is keyed on the content of the file, the column specifications (including the
+    values used by any validate_fn), the unique_combo_fields and the dataset filter. Entries are
+    only written for files that were read without any errors, so a cache hit is exactly
+    equivalent to reading the file.
+    """
+
+    def __init__(self, cache_dir):
+        """Initialise RowCache object, creating the cache directory if required."""
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def entry_filename(self, key):
+        """Return the name of the file containing the cache entry for the key."""
+        return os.path.join(self.cache_dir, key + CACHE_SUFFIX)
+
+    def load(self, key):
+        """Load an entry from the cache, returning None if it is not present or is unreadable."""
+        try:
+            with open(self.entry_filename(key), 'rb') as file:
+                return pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError) as exception:
+            logging.warning(f'Ignoring unreadable cache entry {self.entry_filename(key)}: '
+                            f'{exception}')
+            return None
+
+    def store(self, key, entry):
+        """Store an entry in the cache. The file is written atomically."""
+        file_descriptor, temp_filename = tempfile.mkstemp(dir=self.cache_dir,
+                                                          suffix=CACHE_SUFFIX + '.tmp')
+        try:
+            with os.fdopen(file_descriptor, 'wb') as file:
+                pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_filename, self.entry_filename(key))
+        except BaseException:
+            os.unlink(temp_filename)
+            raise
+
+    def reader_key(self, reader):
+        """Return the cache key for the data read by an ons_csv_to_ctb_json_read.Reader."""
+        key = CacheKey('rows', file_digest(reader.filename),
+                       [tuple(column) for column in reader.columns],
+                       reader.unique_combo_fields, reader.dataset_filters)
+        return key.hexdigest()
+
+    def rows(self, reader):
+        """
+        Yield the validated rows for a Reader, using the cached rows if they are available.
+
+        If the rows are not in the cache then the file is read and, provided that no errors were
+        encountered, the rows are added to the cache.
+        """
+        key = self.reader_key(reader)
+        if key is None:
+            logging.debug(f'Reading {reader.filename}: not cacheable')
+            yield from reader.rows()
+            return
+
+        entry = self.load(key)
+        if entry is not None:
+            logging.debug(f'Reading {reader.filename}: using cache entry {key}')
+            column_index = {name: position for position, name in enumerate(entry['columns'])}
+            reader.column_index = column_index
+            # Unpickled strings are not interned, so intern the values of interned columns again.
+            interned = [column_index[column.name] for column in reader.columns if column.intern]
+            for values, row_num in entry['rows']:
+                if interned:
+                    values = intern_values(values, interned)
+                yield Row(RowData(column_index, values), row_num)
+            reader.dropped_by_dataset_filter = entry['dropped_by_dataset_filter']
+            reader.log_dropped_by_dataset_filter(reader.dropped_by_dataset_filter)
+            return
+
+        cached_rows = []
+        for row in reader.rows():
+            cached_rows.append((tuple(row.data.values()), row.row_num))
+            yield row
+
+        if not reader.error_count:
+            self.store(key, {
+                'columns': tuple(reader.column_index),
+                'rows': cached_rows,
+                'dropped_by_dataset_filter': reader.dropped_by_dataset_filter,
+            })
+
+    def geo_cats(self, filename, read_fn, open_fn=None):
+        """
+        Return the result of read_fn(filename, open_fn) for a geography file, using the cache.
+
+        open_fn only determines how the file is opened, so it is not part of the cache key.
+        """
+        key = CacheKey('geo', file_digest(filename), read_fn).hexdigest()
+        entry = self.load(key) if key else None
+        if entry is not None:
+            logging.debug(f'Reading {filename}: using cache entry {key}')
+            # The source_file is not part of the key, so that identical files are cached once.
+            return {var: geo_cats._replace(source_file=filename)
+                    for var, geo_cats in entry.items()}
+
+        data = read_fn(filename, open_fn)
+        if key:
+            self.store(key, data)
+        return data
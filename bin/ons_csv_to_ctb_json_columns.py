@@ -0,0 +1,404 @@
+"""Column specifications for each of the CSV source files read by the Loader."""
+import os
+from collections import namedtuple
+from ons_csv_to_ctb_json_read import Reader, required, optional, unsigned_int, read_fieldnames
+from ons_csv_to_ctb_json_geo import assign_columns_to_variables
+from ons_csv_to_ctb_json_symbols import Symbols
+
+# KeysOf is used as the validate_fn of a column whose values must be keys of other metadata. It
+# names either a Loader property or a set of values supplied when the columns are requested, and
+# is replaced with a membership check by file_columns(). This allows the columns of every file to
+# be inspected before any of the data has been loaded.
+KeysOf = namedtuple('KeysOf', 'name')
+
+
+def isnumeric(string):
+    """Check whether the string is numeric."""
+    return string.isnumeric()
+
+
+def is_unsigned_int(string):
+    """Check whether the string is an unsigned integer."""
+    return string.isdecimal()
+
+
+def is_y_or_n(string):
+    """Return true if the string is either 'Y' or 'N'."""
+    return string in ['Y', 'N']
+
+
+def isoneof(valid_values):
+    """Return a function that checks whether the value is in the specified set of values."""
+    valid_values_set = set(valid_values)
+
+    def validate_fn(value):
+        """Check if value is in set."""
+        return value in valid_values_set
+
+    return validate_fn
+
+
+# The expected columns in each source file.
+FILE_COLUMNS = {
+    'Contact.csv': [
+        required('Contact_Id', unique=True),
+        required('Contact_Name'),
+        required('Contact_Email'),
+
+        optional('Contact_Phone'),
+        optional('Contact_Website'),
+    ],
+    'Source.csv': [
+        required('Source_Mnemonic', unique=True),
+        required('Source_Description'),
+        required('Id'),
+        required('Version'),
+
+        optional('Source_Description_Welsh'),
+        optional('Copyright_Statement'),
+        optional('Licence'),
+        optional('Nationals_Statistic_Certified'),
+        optional('Methodology_Link'),
+        optional('Methodology_Statement'),
+        optional('Methodology_Statement_Welsh'),
+        optional('SDC_Link'),
+        optional('SDC_Statement'),
+        optional('SDC_Statement_Welsh'),
+        optional('Contact_Id', validate_fn=KeysOf('contacts')),
+    ],
+    'Census_Release.csv': [
+        required('Census_Release_Number', unique=True),
+        required('Census_Release_Description'),
+        required('Release_Date'),
+        required('Id'),
+    ],
+    'Security_Classification.csv': [
+        required('Security_Mnemonic', unique=True),
+        required('Id'),
+        required('Security_Description'),
+
+        optional('Security_Description_Welsh'),
+    ],
+    'Statistical_Unit.csv': [
+        required('Statistical_Unit', unique=True),
+        required('Statistical_Unit_Description'),
+        required('Id'),
+
+        optional('Statistical_Unit_Label'),
+        optional('Statistical_Unit_Label_Welsh'),
+        optional('Statistical_Unit_Description_Welsh'),
+    ],
+    'Dataset.csv': [
+        required('Dataset_Mnemonic', unique=True),
+        required('Security_Mnemonic', validate_fn=KeysOf('security_classifications')),
+        required('Dataset_Title'),
+        required('Id'),
+        required('Geographic_Coverage'),
+        required('Dataset_Population'),
+        required('Statistical_Unit', validate_fn=KeysOf('statistical_units')),
+        required('Version'),
+        required('Dataset_Description'),
+        required('Signed_Off_Flag', validate_fn=is_y_or_n),
+
+        optional('Dataset_Title_Welsh'),
+        optional('Dataset_Description_Welsh'),
+        optional('Dataset_Mnemonic_2011'),
+        optional('Geographic_Coverage_Welsh'),
+        optional('Dataset_Population_Welsh'),
+        optional('Last_Updated'),
+        optional('Contact_Id', validate_fn=KeysOf('contacts')),
+        optional('Observation_Type_Code', validate_fn=KeysOf('observation_types')),
+        optional('Destination_Pre_Built_Database_Mnemonic', validate_fn=KeysOf('databases')),
+    ],
+    'Database.csv': [
+        required('Database_Mnemonic', unique=True),
+        required('Source_Mnemonic', validate_fn=KeysOf('sources')),
+        required('Database_Title'),
+        required('Id'),
+        required('Database_Description'),
+        required('Version'),
+        # This should be mandatory but is not yet populated
+        optional('Cantabular_DB_Flag', validate_fn=is_y_or_n),
+        required('Database_Type_Code', validate_fn=KeysOf('database_types')),
+
+        optional('Database_Title_Welsh'),
+        optional('Database_Description_Welsh'),
+    ],
+    'Category.csv': [
+        required('Category_Code'),
+        required('Classification_Mnemonic', validate_fn=KeysOf('classifications')),
+        required('Internal_Category_Label_English'),
+        required('Id'),
+        required('Variable_Mnemonic'),
+        required('Version'),
+
+        # Sort_Order values are not validated as this is an optional field.
+        optional('Sort_Order'),
+        optional('External_Category_Label_English'),
+        optional('External_Category_Label_Welsh'),
+    ],
+    'Topic.csv': [
+        required('Topic_Mnemonic', unique=True),
+        required('Topic_Title'),
+        required('Topic_Description'),
+        required('Id'),
+
+        optional('Topic_Description_Welsh'),
+        optional('Topic_Title_Welsh'),
+    ],
+    'Question.csv': [
+        required('Question_Code', unique=True),
+        required('Question_Label'),
+        required('Version'),
+        required('Id'),
+
+        optional('Question_Label_Welsh'),
+        optional('Reason_For_Asking_Question'),
+        optional('Reason_For_Asking_Question_Welsh'),
+        optional('Question_First_Asked_In_Year'),
+    ],
+    'Variable_Type.csv': [
+        required('Variable_Type_Code', unique=True),
+        required('Variable_Type_Description'),
+        required('Id'),
+
+        optional('Variable_Type_Description_Welsh'),
+    ],
+    'Variable.csv': [
+        required('Variable_Mnemonic', unique=True),
+        required('Security_Mnemonic', validate_fn=KeysOf('security_classifications')),
+        required('Variable_Type_Code', validate_fn=KeysOf('variable_types')),
+        required('Variable_Title'),
+        required('Variable_Description'),
+        required('Id'),
+        required('Version'),
+        required('Signed_Off_Flag', validate_fn=is_y_or_n),
+
+        # Required for non-geographic variables but not always populated in source files
+        optional('Statistical_Unit', validate_fn=KeysOf('statistical_units')),
+
+        # Required for geographic variables but not yet populated
+        optional('Geographic_Theme'),
+        optional('Geographic_Coverage'),
+
+        optional('Variable_Title_Welsh'),
+        optional('Variable_Description_Welsh'),
+        optional('Variable_Mnemonic_2011'),
+        optional('Comparability_Comments'),
+        optional('Comparability_Comments_Welsh'),
+        optional('Uk_Comparison_Comments'),
+        optional('Uk_Comparison_Comments_Welsh'),
+        optional('Geographic_Theme_Welsh'),
+        optional('Geographic_Coverage_Welsh'),
+        optional('Topic_Mnemonic', validate_fn=KeysOf('topics')),
+        optional('Number_Of_Classifications'),
+        optional('Quality_Statement_Text'),
+        optional('Quality_Statement_Text_Welsh'),
+        optional('Quality_Summary_URL'),
+        optional('Geography_Hierarchy_Order', validate_fn=is_unsigned_int),
+        optional('Variable_Short_Description'),
+        optional('Variable_Short_Description_Welsh'),
+    ],
+    'Classification.csv': [
+        required('Id'),
+        required('Classification_Mnemonic', unique=True),
+        required('Variable_Mnemonic', validate_fn=KeysOf('variables')),
+        required('Internal_Classification_Label_English'),
+        required('Security_Mnemonic', validate_fn=KeysOf('security_classifications')),
+        required('Version'),
+        required('Signed_Off_Flag', validate_fn=is_y_or_n),
+
+        optional('Number_Of_Category_Items', value_type=unsigned_int),
+        optional('External_Classification_Label_English'),
+        optional('External_Classification_Label_Welsh'),
+        optional('Mnemonic_2011'),
+        optional('Parent_Classification_Mnemonic'),
+        optional('Default_Classification_Flag'),
+        optional('Flat_Classification_Flag'),
+        optional('Not_Applicable_Category_Description'),
+        optional('Not_Applicable_Category_Description_Welsh'),
+    ],
+    'Observation_Type.csv': [
+        required('Observation_Type_Code', unique=True),
+        required('Observation_Type_Label'),
+        required('Id'),
+
+        optional('Observation_Type_Description'),
+        optional('Decimal_Places', validate_fn=isnumeric),
+        optional('Prefix'),
+        optional('Suffix'),
+        optional('FillTrailingSpaces', validate_fn=is_y_or_n),
+        optional('NegativeSign'),
+    ],
+    'Database_Type.csv': [
+        required('Database_Type_Code', unique=True),
+        required('Database_Type_Description'),
+        required('Id'),
+    ],
+    'Metadata_Version.csv': [
+        optional('Id'),
+        optional('Metadata_Version_Number'),
+    ],
+    'Dataset_Keyword.csv': [
+        required('Id'),
+        required('Dataset_Keyword'),
+        required('Dataset_Mnemonic', validate_fn=KeysOf('dataset_mnemonics')),
+    ],
+    'Variable_Keyword.csv': [
+        required('Id'),
+        required('Variable_Keyword'),
+        required('Variable_Mnemonic', validate_fn=KeysOf('variable_mnemonics')),
+    ],
+    'Database_Variable.csv': [
+        required('Variable_Mnemonic', validate_fn=KeysOf('variables')),
+        required('Database_Mnemonic', validate_fn=KeysOf('database_mnemonics')),
+        optional('Classification_Mnemonic', validate_fn=KeysOf('classifications')),
+        required('Id'),
+        required('Version'),
+
+        optional('Lowest_Geog_Variable_Flag', validate_fn=isoneof(['Y', 'N'])),
+        # No action is currently taken on these fields
+        optional('Source_Classification_Flag', validate_fn=isoneof(['Y', 'N'])),
+        optional('Cantabular_Public_Flag', validate_fn=isoneof(['Y', 'N'])),
+    ],
+    'Related_Datasets.csv': [
+        required('Related_Dataset_Mnemonic', validate_fn=KeysOf('dataset_mnemonics')),
+        required('Dataset_Mnemonic', validate_fn=KeysOf('dataset_mnemonics')),
+        required('Id'),
+    ],
+    'Publication_Dataset.csv': [
+        required('Publication_Mnemonic', unique=True),
+        required('Dataset_Mnemonic', validate_fn=KeysOf('dataset_mnemonics')),
+        required('Id'),
+
+        optional('Publication_Title'),
+        optional('Publisher_Name'),
+        optional('Publisher_Website'),
+    ],
+    'Release_Dataset.csv': [
+        required('Census_Release_Number', validate_fn=KeysOf('census_releases')),
+        required('Dataset_Mnemonic', validate_fn=KeysOf('dataset_mnemonics')),
+        required('Id'),
+    ],
+    'Variable_Source_Question.csv': [
+        required('Source_Question_Code', validate_fn=KeysOf('questions')),
+        required('Variable_Mnemonic', validate_fn=KeysOf('variable_mnemonics')),
+        required('Id'),
+    ],
+    'Dataset_Variable.csv': [
+        required('Dataset_Mnemonic', validate_fn=KeysOf('dataset_mnemonics')),
+        required('Database_Mnemonic', validate_fn=KeysOf('databases')),
+        required('Id'),
+        required('Variable_Mnemonic', validate_fn=KeysOf('variables')),
+
+        optional('Classification_Mnemonic', validate_fn=KeysOf('classifications')),
+        optional('Processing_Priority', value_type=unsigned_int),
+        optional('Lowest_Geog_Variable_Flag', validate_fn=isoneof({'Y', 'N'})),
+        optional('Minimum_Threshold_Person', validate_fn=isnumeric),
+        optional('Minimum_Threshold_HH', validate_fn=isnumeric),
+    ],
+    'Topic_Classification.csv': [
+        required('Topic_Mnemonic', validate_fn=KeysOf('topics')),
+        required('Classification_Mnemonic', validate_fn=KeysOf('classification_mnemonics')),
+        required('Id'),
+    ],
+    'Category_Mapping.csv': [
+        required('Classification_Mnemonic', validate_fn=KeysOf('classification_mnemonics')),
+        required('Codebook_Mnemonic'),
+    ],
+}
+
+
+def file_columns(filename, symbols, **valid_values):
+    """
+    Return the column specifications for a source file.
+
+    Each KeysOf placeholder is replaced with a check that the value is one of the named
+    valid_values or, if there are no such values, one of the named Symbols in symbols (normally
+    the SymbolTable of a Loader). Looking up the Symbols loads the referenced metadata if it has
+    not already been loaded. valid_values may be supplied as Symbols to avoid indexing them for
+    each file that refers to them.
+    """
+    columns = []
+    for column in FILE_COLUMNS[filename]:
+        if isinstance(column.validate_fn, KeysOf):
+            name = column.validate_fn.name
+            keys = valid_values[name] if name in valid_values else symbols[name]
+            if not isinstance(keys, Symbols):
+                keys = Symbols(keys)
+            column = column._replace(validate_fn=keys.validator())
+        columns.append(column)
+    return columns
+
+
+# Category.csv may instead be supplied as several shards which each contain some of its rows. The
+# shards are all the .csv files in the Category sub-directory of the input directory, e.g.
+# Category/part1.csv and Category/part2.csv. No other files are treated as shards.
+CATEGORY_SHARD_DIRECTORY = 'Category'
+
+
+def source_filenames(input_directory, filename):
+    """
+    Return the names of the files in input_directory that contain the rows of a source file.
+
+    If the Category sub-directory exists then the names of the shards of Category.csv within it are
+    returned in sorted order. Otherwise only filename is returned. A ValueError is raised if both
+    Category.csv and the sub-directory exist, or if the sub-directory contains no .csv files.
+    """
+    if filename != 'Category.csv':
+        return [filename]
+
+    shard_directory = os.path.join(input_directory, CATEGORY_SHARD_DIRECTORY)
+    if not os.path.isdir(shard_directory):
+        return [filename]
+    if os.path.exists(os.path.join(input_directory, filename)):
+        raise ValueError(f'Found both {filename} and {CATEGORY_SHARD_DIRECTORY} directory in '
+                         f'{input_directory}: only one or the other may be supplied')
+    shards = sorted(name for name in os.listdir(shard_directory) if name.endswith('.csv'))
+    if not shards:
+        raise ValueError(f'No .csv files found in {shard_directory}')
+    return [os.path.join(CATEGORY_SHARD_DIRECTORY, name) for name in shards]
+
+
+def all_source_filenames(input_directory, filenames):
+    """Return the names of the files in input_directory that contain the rows of filenames."""
+    return [name for filename in filenames for name in source_filenames(input_directory, filename)]
+
+
+def check_headers(input_directory, geography_files):
+    """
+    Check the headers of all the source files and geography files.
+
+    Only the header row of each file is read, so this is quick and finds missing files and
+    columns before any data is loaded. All the problems that are found are reported together in a
+    single ValueError.
+    """
+    def raise_value_error(msg):
+        """Raise a ValueError exception."""
+        raise ValueError(msg)
+
+    problems = []
+    for filename, columns in FILE_COLUMNS.items():
+        try:
+            names = source_filenames(input_directory, filename)
+        except ValueError as exception:
+            problems.append(str(exception))
+            continue
+
+        for name in names:
+            full_filename = os.path.join(input_directory, name)
+            try:
+                Reader(full_filename, columns, raise_value_error).read_header(
+                    read_fieldnames(full_filename))
+            except (OSError, ValueError) as exception:
+                problems.append(str(exception))
+
+    for filename in geography_files:
+        try:
+            assign_columns_to_variables(filename, [v.strip() for v in read_fieldnames(filename)])
+        except (OSError, ValueError) as exception:
+            problems.append(str(exception))
+
+    if problems:
+        summary = f'{len(problems)} problem(s) found in file headers:'
+        raise ValueError('\n'.join([summary] + problems))
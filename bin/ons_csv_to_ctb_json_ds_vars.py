@@ -34,7 +34,7 @@ class DatasetVarsBuilder():
                                    'Classification_Mnemonic must not be specified for '
                                    f'geographic variable {variable_mnemonic} in dataset '
                                    f'{self.dataset_mnemonic}')
-        if variable['Processing_Priority']:
+        if variable['Processing_Priority'] is not None:
             self.recoverable_error(f'Reading {self.filename}:{row_num} '
                                    'Processing_Priority must not be specified for geographic'
                                    f' variable {variable_mnemonic} in dataset '
@@ -86,7 +86,7 @@ class DatasetVarsBuilder():
             logging.warning(f'Reading {self.filename}:{row_num} dropping record')
             return
 
-        if not variable['Processing_Priority']:
+        if variable['Processing_Priority'] is None:
             self.recoverable_error(f'Reading {self.filename}:{row_num} '
                                    'Processing_Priority not specified for classification '
                                    f'{classification_mnemonic} in dataset '
@@ -95,7 +95,7 @@ class DatasetVarsBuilder():
             variable['Processing_Priority'] = 0
 
         self.classifications.append(variable['Classification_Mnemonic'])
-        self.processing_priorities.append(int(variable['Processing_Priority']))
+        self.processing_priorities.append(variable['Processing_Priority'])
 
         database_mnemonic = variable['Database_Mnemonic']
         database = self.all_databases[database_mnemonic]
@@ -0,0 +1,103 @@
+"""Encode output files as JSON, reusing the encoded text of values that appear many times."""
+import json
+
+# SharedJSONEncoder temporarily replaces each SharedJSON value with this string. The NUL characters
+# ensure that it does not clash with any real value.
+PLACEHOLDER = '\x00SharedJSON\x00'
+
+
+class SharedJSON:
+    """
+    SharedJSON holds a value that may appear at several places in an output file.
+
+    The value is encoded by a SharedJSONEncoder the first time that it is encountered and the
+    encoded text is reused wherever else the same SharedJSON object appears. It must always be
+    encoded with the same encoder settings.
+    """
+
+    __slots__ = ('value', '_text')
+
+    def __init__(self, value):
+        """Initialise SharedJSON object."""
+        self.value = value
+        self._text = None
+
+    def text(self, encoder):
+        """Return the value encoded by encoder. The value is only encoded once."""
+        if self._text is None:
+            self._text = ''.join(encoder.iterencode(self.value))
+        return self._text
+
+    def indented_text(self, encoder, indent):
+        """Return the encoded value for use at a position with the specified indentation."""
+        return self.text(encoder).replace('\n', '\n' + indent)
+
+
+class LazySharedJSON(SharedJSON):
+    """
+    LazySharedJSON is a SharedJSON whose value is only created when it is first encoded.
+
+    The value is returned by get_value(). It is discarded as soon as it has been encoded, so only
+    the encoded text is retained. uses is the number of times that the value is expected to be
+    encoded: the encoded text is also discarded after its last expected use. If it is encoded
+    again after that, then the value is recreated and encoded again.
+    """
+
+    __slots__ = ('get_value', 'uses')
+
+    def __init__(self, get_value, uses=1):
+        """Initialise LazySharedJSON object."""
+        super().__init__(None)
+        self.get_value = get_value
+        self.uses = uses
+
+    def text(self, encoder):
+        """Return the value encoded by encoder. The value is only created and encoded once."""
+        text = self._text
+        if text is None:
+            text = ''.join(encoder.iterencode(self.get_value()))
+        self.uses -= 1
+        self._text = text if self.uses > 0 else None
+        return text
+
+
+class SharedJSONEncoder(json.JSONEncoder):
+    """
+    SharedJSONEncoder is a JSONEncoder that reuses the encoded text of SharedJSON values.
+
+    Each SharedJSON value is first encoded as a placeholder string, which is then replaced with the
+    encoded text of the value. When the output is indented, the encoded text is indented to match
+    its position. Encoded strings never contain a newline, so the indentation of each position is
+    given by the text after the last newline written before it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Initialise SharedJSONEncoder object."""
+        super().__init__(*args, **kwargs)
+        self._pending = []
+        self._placeholder = super().encode(PLACEHOLDER)
+
+    def default(self, o):
+        """Return a placeholder for a SharedJSON value, which is replaced by its encoded text."""
+        if isinstance(o, SharedJSON):
+            self._pending.append(o)
+            return PLACEHOLDER
+        return super().default(o)
+
+    def iterencode(self, o, _one_shot=False):
+        """
+        Encode the given object and yield each string representation as available.
+
+        _one_shot is ignored, so that the Python implementation of the encoder is always used. It
+        yields the placeholder for each SharedJSON value immediately after calling default().
+        """
+        indent = ''
+        for chunk in super().iterencode(o):
+            if chunk == self._placeholder and self._pending:
+                yield self._pending.pop().indented_text(self, indent)
+                continue
+
+            newline = chunk.rfind('\n')
+            if newline >= 0:
+                indent = chunk[newline + 1:]
+            yield chunk
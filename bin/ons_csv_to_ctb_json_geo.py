@@ -13,11 +13,21 @@ NAME_SUFFIX = 'nm'
 WELSH_NAME_SUFFIX = 'nmw'
 
 
-def read_geo_cats(filenames):
-    """Read a list of geography lookup files and return the combined categories from all files."""
+def read_geo_cats(filenames, row_cache=None, open_fn=None):
+    """
+    Read a list of geography lookup files and return the combined categories from all files.
+
+    If row_cache is specified then the contents of each file are loaded from the cache when the
+    file is unchanged. If open_fn is specified then it is used instead of the builtin open() to
+    open each file.
+    """
     data = {}
     for filename in filenames:
-        for variable, geo_cats in read_file(filename).items():
+        if row_cache:
+            file_data = row_cache.geo_cats(filename, read_file, open_fn)
+        else:
+            file_data = read_file(filename, open_fn)
+        for variable, geo_cats in file_data.items():
             if variable not in data:
                 data[variable] = geo_cats
             elif data[variable].code_to_label != geo_cats.code_to_label:
@@ -27,7 +37,7 @@ def read_geo_cats(filenames):
     return data
 
 
-def read_file(filename):
+def read_file(filename, open_fn=None):
     """
     Read a lookup file containing variable category codes, labels and Welsh labels.
 
@@ -49,8 +59,9 @@ def read_file(filename):
        on all lines.
      - The column names are handled in a case-insensitive manner.
 
+    If open_fn is specified then it is used instead of the builtin open() to open the file.
     """
-    with open(filename, newline='', encoding='utf-8-sig') as csvfile:
+    with (open_fn or open)(filename, newline='', encoding='utf-8-sig') as csvfile:
         reader = csv.reader(csvfile)
         fieldnames = [v.strip() for v in next(reader)]
         var_to_columns = assign_columns_to_variables(filename, fieldnames)
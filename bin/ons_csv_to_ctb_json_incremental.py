@@ -0,0 +1,112 @@
+"""Reuse the metadata loaded by a previous build for source files that have not changed."""
+import logging
+import os
+from ons_csv_to_ctb_json_cache import CACHE_SUFFIX, CacheKey, RowCache, file_digest
+from ons_csv_to_ctb_json_columns import all_source_filenames
+from ons_csv_to_ctb_json_stages import STAGE_FILES, STAGE_INPUTS, required_stages
+
+# Modules containing the code that determines the value of each stage.
+STAGE_MODULES = ('ons_csv_to_ctb_json_load', 'ons_csv_to_ctb_json_bilingual',
+                 'ons_csv_to_ctb_json_ds_vars', 'ons_csv_to_ctb_json_columns',
+                 'ons_csv_to_ctb_json_geo', 'ons_csv_to_ctb_json_read',
+                 'ons_csv_to_ctb_json_symbols')
+
+
+def category_classification_fields(loader):
+    """
+    Return the fields of the classifications that are used by Loader.categories.
+
+    The categories are keyed on these fields instead of on the whole classifications stage, so
+    that the categories, which are the most expensive stage to load, can be reused when other
+    classification metadata change. Any other classification field that is used to load the
+    categories must be added here.
+    """
+    return [(name, classification.private['Is_Geographic'],
+             classification.private['Number_Of_Category_Items'])
+            for name, classification in loader.classifications.items()]
+
+
+# Functions that return the parts of an input stage that are used by a stage, keyed on the stage
+# and input stage names. By default the key of the input stage is used instead.
+INPUT_FINGERPRINTS = {
+    ('categories', 'classifications'): category_classification_fields,
+}
+
+
+class LogRecorder(logging.Handler):
+    """LogRecorder collects the level and message of each log record that it handles."""
+
+    def __init__(self):
+        """Initialise LogRecorder object."""
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        """Record the level and message."""
+        self.messages.append((record.levelno, record.getMessage()))
+
+
+class IncrementalBuild:
+    """
+    IncrementalBuild stores the value of each Loader stage in a state directory.
+
+    The entry for a stage is keyed on the contents of the files that the stage reads and on the
+    keys of the stages that it uses, so a change to a file invalidates the stages that read it and
+    every stage that is derived from them. The key also includes the dataset filter, the log level
+    and the source code of the loader modules. Other stages are restored from the state directory
+    instead of being loaded again, and their log messages are repeated.
+
+    Stages that encounter errors are never stored. Entries that are not used by the latest build
+    are removed, so the state directory only contains the results of the latest build.
+    """
+
+    def __init__(self, state_dir):
+        """Initialise IncrementalBuild object, creating the state directory if required."""
+        self.state_dir = state_dir
+        self.entries = RowCache(state_dir)
+
+    def stage_key(self, loader, name, input_keys):
+        """Return the key for a stage, given the keys (or fingerprints) of its input stages."""
+        filenames = [loader.full_filename(f)
+                     for f in all_source_filenames(loader.input_directory, STAGE_FILES[name])]
+        if name == 'categories':
+            filenames.extend(loader.geography_files)
+        key = CacheKey('stage', name, [(f, file_digest(f)) for f in filenames], input_keys,
+                       loader.dataset_filter, logging.getLogger().getEffectiveLevel())
+        key.add_modules(*STAGE_MODULES)
+        return key.hexdigest()
+
+    def load_stages(self, loader, targets):
+        """Load the target properties of a Loader, reusing the stored stages where possible."""
+        keys = {}
+        reused = []
+        for name in required_stages(targets):
+            input_keys = [INPUT_FINGERPRINTS[name, n](loader) if (name, n) in INPUT_FINGERPRINTS
+                          else keys[n] for n in STAGE_INPUTS[name]]
+            keys[name] = self.stage_key(loader, name, input_keys)
+            entry = self.entries.load(keys[name])
+            if entry is not None:
+                for level, message in entry['messages']:
+                    logging.log(level, message)
+                loader.cache.set(name, entry['value'])
+                reused.append(name)
+                continue
+
+            recorder = LogRecorder()
+            logging.getLogger().addHandler(recorder)
+            error_count = loader.error_count()
+            try:
+                value = getattr(loader, name)
+            finally:
+                logging.getLogger().removeHandler(recorder)
+            if loader.error_count() == error_count:
+                self.entries.store(keys[name], {'value': value, 'messages': recorder.messages})
+
+        current = {key + CACHE_SUFFIX for key in keys.values()}
+        for filename in os.listdir(self.state_dir):
+            if filename.endswith(CACHE_SUFFIX) and filename not in current:
+                os.remove(os.path.join(self.state_dir, filename))
+
+        logging.info(f'Incremental build reused {len(reused)} of {len(keys)} stages: '
+                     f'{", ".join(reused) if reused else "none"}')
+        return reused
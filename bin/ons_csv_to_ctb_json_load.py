@@ -1,50 +1,140 @@
 """Load metadata from CSV files and export in JSON format."""
 import os
 import logging
+import sys
+import threading
 from collections import namedtuple
-from functools import lru_cache
-from ons_csv_to_ctb_json_bilingual import BilingualDict, Bilingual
-from ons_csv_to_ctb_json_read import Reader, required, optional
+from ons_csv_to_ctb_json_bilingual import BilingualDict, Bilingual, CategoryLabels
+from ons_csv_to_ctb_json_read import Reader
+from ons_csv_to_ctb_json_columns import FILE_COLUMNS, all_source_filenames, file_columns, \
+    source_filenames
 from ons_csv_to_ctb_json_geo import read_geo_cats
+from ons_csv_to_ctb_json_cache import RowCache
+from ons_csv_to_ctb_json_prefetch import Prefetcher, PrefetchedReader
+from ons_csv_to_ctb_json_profile import profiled_call
+from ons_csv_to_ctb_json_memo import MemoCache, MemoizedProperty
+from ons_csv_to_ctb_json_stages import STAGE_FILES, STAGE_INPUTS
+from ons_csv_to_ctb_json_symbols import Symbols, SymbolTable
 from ons_csv_to_ctb_json_ds_vars import DatasetVarsBuilder, DatasetVariables, TABULAR_DATABASE_TYPE
 
 PUBLIC_SECURITY_MNEMONIC = 'PUB'
 GEOGRAPHIC_VARIABLE_TYPE = 'GEOG'
 
+# Values in these columns are repeated on many rows and in several files. They are interned when
+# they are read, to reduce memory usage and so that dictionary lookups use identity comparisons.
+INTERNED_COLUMNS = {'Classification_Mnemonic', 'Variable_Mnemonic', 'Database_Mnemonic',
+                    'Dataset_Mnemonic', 'Security_Mnemonic', 'Version'}
+
 DatabaseClassifications = namedtuple('DatabaseClassifications',
                                      'classifications lowest_geog_variable non_public')
 
 
-def isnumeric(string):
-    """Check whether the string is numeric."""
-    return string.isnumeric()
+def append_to_list_in_dict(dictionary, key, value):
+    """
+    Append a value to the list at dictionary[key].
 
+    An empty list is first created if the key is not in dictionary.
+    """
+    if key not in dictionary:
+        dictionary[key] = []
+    dictionary[key].append(value)
 
-def is_y_or_n(string):
-    """Return true if the string is either 'Y' or 'N'."""
-    return string in ['Y', 'N']
 
+def build_category_labels(mnemonic, num_cat_items, columns):
+    """
+    Build and validate the categories of a classification from lists of values in row order.
 
-def isoneof(valid_values):
-    """Return a function that checks whether the value is in the specified set of values."""
-    valid_values_set = set(valid_values)
+    columns holds lists of the codes, external English labels, internal English labels and Welsh
+    labels of the categories.
 
-    def validate_fn(value):
-        """Check if value is in set."""
-        return value in valid_values_set
+    The codes, English labels and Welsh labels are returned as tuples, along with an error message
+    if the number of categories does not match num_cat_items, or None otherwise. The external
+    English label of each category is used if it is populated, otherwise the internal English
+    label is used. If no Welsh labels are populated then None is returned in their place.
 
-    return validate_fn
+    Each classification is built independently of the others, using only its own values.
+    """
+    codes, external_english, internal_english, welsh = columns
+    error = None
+    if num_cat_items and len(codes) != num_cat_items:
+        error = f'Unexpected number of categories for {mnemonic}: expected {num_cat_items} ' \
+                f'but found {len(codes)}'
 
+    english = tuple(external or internal
+                    for external, internal in zip(external_english, internal_english))
+    return tuple(codes), english, tuple(welsh) if any(welsh) else None, error
 
-def append_to_list_in_dict(dictionary, key, value):
+
+def unique_across_shards(shard_rows, recoverable_error):
     """
-    Append a value to the list at dictionary[key].
+    Yield the filename and each row from the rows of the shards of Category.csv, in turn.
 
-    An empty list is first created if the key is not in dictionary.
+    shard_rows is a list of (full filename, rows) pairs. Each shard is only checked for duplicate
+    Category_Code/Classification_Mnemonic combinations when it is read, so rows with combinations
+    that appeared in an earlier shard are reported using recoverable_error and dropped here.
     """
-    if key not in dictionary:
-        dictionary[key] = []
-    dictionary[key].append(value)
+    if len(shard_rows) == 1:
+        filename, rows = shard_rows[0]
+        for row in rows:
+            yield filename, row
+        return
+
+    combos = set()
+    for filename, rows in shard_rows:
+        for row in rows:
+            combo = (row.data['Category_Code'], row.data['Classification_Mnemonic'])
+            if combo in combos:
+                recoverable_error(f'Reading {filename}:{row.row_num} duplicate value combo '
+                                  f'{"/".join(combo)} for Category_Code/Classification_Mnemonic '
+                                  'in an earlier shard')
+                logging.warning(f'Reading {filename}:{row.row_num} dropping record')
+                continue
+            combos.add(combo)
+            yield filename, row
+
+
+class CategoryLabelsPool:
+    """
+    CategoryLabelsPool provides a single shared CategoryLabels object for identical categories.
+
+    Many classifications, such as derived classifications or geographies that are repeated in
+    several lookup files, have identical codes and labels. Sets of categories are identified by
+    their contents, using the hash of their codes and labels. The memory that would have been used
+    to hold the duplicate codes and labels is estimated.
+    """
+
+    def __init__(self):
+        """Initialise CategoryLabelsPool object."""
+        self.distinct = {}
+        self.duplicates = 0
+        self.duplicate_bytes = 0
+
+    def get(self, codes, english_labels, welsh_labels):
+        """Return the CategoryLabels object for the specified tuples of codes and labels."""
+        key = (codes, english_labels, welsh_labels)
+        labels = self.distinct.get(key)
+        if labels is None:
+            labels = self.distinct[key] = CategoryLabels(*key)
+        else:
+            self.duplicates += 1
+            for column in key:
+                if column is not None:
+                    self.duplicate_bytes += sys.getsizeof(column) + \
+                        sum(sys.getsizeof(value) for value in column if value)
+        return labels
+
+    def log_savings(self):
+        """Log the number of duplicate sets of categories and the memory saved, if any."""
+        if self.duplicates:
+            logging.info(f'Shared the categories of {self.duplicates} classifications which are '
+                         f'identical to those of other classifications, saving approximately '
+                         f'{self.duplicate_bytes} bytes')
+
+
+# Settings which affect how the Loader reads its input but not its output. They correspond to the
+# --cache-dir, --prefetch and --profile options in ons_csv_to_ctb_json_main.py.
+LoaderOptions = namedtuple('LoaderOptions', 'cache_dir prefetch profiler')
+LoaderOptions.__new__.__defaults__ = (None, False, None)
 
 
 class Loader:
@@ -59,14 +149,47 @@ class Loader:
     created.
 
     Many of the fields in this class are cached properties, with the data loaded on first access.
+    The loaded data are held in the cache attribute of each Loader. They can be discarded using
+    cache.clear(), which also discards any data that were derived from them. The keys of the
+    loaded data are indexed in the symbols attribute, which is used to validate foreign keys and
+    to find mnemonics case insensitively.
+
+    The properties can be accessed concurrently from multiple threads, e.g. by a long-running
+    service that shares a Loader between requests. Each property is loaded exactly once.
     """
 
-    def __init__(self, input_directory, geography_files, best_effort=False, dataset_filter=''):
+    def __init__(self, input_directory, geography_files, best_effort=False, dataset_filter='',
+                 options=None):
         """Initialise MetadataLoader object."""
         self.input_directory = input_directory
         self.geography_files = geography_files
         self.dataset_filter = dataset_filter
+        self.options = options if options else LoaderOptions()
+        self.row_cache = RowCache(self.options.cache_dir) if self.options.cache_dir else None
+        self.prefetcher = None
+        if self.options.prefetch:
+            filenames = [self.full_filename(f)
+                         for f in all_source_filenames(input_directory, FILE_COLUMNS)]
+            self.prefetcher = Prefetcher(filenames + list(geography_files))
+
+        def discard_prefetched(name):
+            """
+            Discard the prefetched contents of the files read by a stage once it is stored.
+
+            Files whose rows were read from the row cache, or which belong to stages that were
+            restored by other means, are never parsed, so their contents would otherwise be kept.
+            """
+            filenames = all_source_filenames(input_directory, STAGE_FILES.get(name, ()))
+            self.prefetcher.discard([self.full_filename(f) for f in filenames])
+            if name == 'categories':
+                self.prefetcher.discard(geography_files)
+
+        self.cache = MemoCache(STAGE_INPUTS, profiler=self.options.profiler,
+                               on_store=discard_prefetched if self.prefetcher else None)
+        self.symbols = SymbolTable(self)
         self._error_count = 0
+        # Errors may be reported by stages that are loaded concurrently.
+        error_count_lock = threading.Lock()
 
         def raise_value_error(msg):
             """Raise a ValueError exception."""
@@ -74,7 +197,8 @@ class Loader:
 
         def log_error(msg):
             """Log the error."""
-            self._error_count += 1
+            with error_count_lock:
+                self._error_count += 1
             logging.warning(msg)
 
         self.recoverable_error = log_error if best_effort else raise_value_error
@@ -90,26 +214,42 @@ class Loader:
         A list of ons_csv_to_ctb_json_read.Row objects is returned. Each Row contains the data
         and corresponding line number.
         """
+        return list(self.iter_file(filename, columns, unique_combo_fields))
+
+    def iter_file(self, filename, columns, unique_combo_fields=None):
+        """
+        Read data from a CSV file one row at a time.
+
+        This is equivalent to read_file() except that the ons_csv_to_ctb_json_read.Row objects are
+        yielded as they are read, rather than being returned as a list.
+
+        If a cache directory was specified then the rows are read from the cache when the file
+        contents and the column specifications are unchanged. If the input files were prefetched
+        then the file is parsed from its prefetched contents. If a profiler was specified then the
+        rows that are read and dropped are counted by it.
+        """
         full_filename = self.full_filename(filename)
-        return Reader(full_filename, columns, self.recoverable_error, unique_combo_fields,
-                      self.dataset_filter).read()
+        columns = [c._replace(intern=True) if c.name in INTERNED_COLUMNS else c for c in columns]
+        if self.prefetcher:
+            reader = PrefetchedReader(full_filename, columns, self.recoverable_error,
+                                      unique_combo_fields, self.dataset_filter,
+                                      prefetcher=self.prefetcher)
+        else:
+            reader = Reader(full_filename, columns, self.recoverable_error, unique_combo_fields,
+                            self.dataset_filter)
+        rows = self.row_cache.rows(reader) if self.row_cache else reader.rows()
+        if self.options.profiler:
+            return self.options.profiler.count_rows(reader, rows)
+        return rows
 
     def full_filename(self, filename):
         """Add the input_directory path to the filename."""
         return os.path.join(self.input_directory, filename)
 
-    @property
-    @lru_cache(maxsize=1)
+    @MemoizedProperty
     def contacts(self):
         """Load contacts."""
-        columns = [
-            required('Contact_Id', unique=True),
-            required('Contact_Name'),
-            required('Contact_Email'),
-
-            optional('Contact_Phone'),
-            optional('Contact_Website'),
-        ]
+        columns = file_columns('Contact.csv', self.symbols)
         contact_rows = self.read_file('Contact.csv', columns)
 
         contacts = {}
@@ -118,28 +258,10 @@ class Loader:
 
         return contacts
 
-    @property
-    @lru_cache(maxsize=1)
+    @MemoizedProperty
     def sources(self):
         """Load sources."""
-        columns = [
-            required('Source_Mnemonic', unique=True),
-            required('Source_Description'),
-            required('Id'),
-            required('Version'),
-
-            optional('Source_Description_Welsh'),
-            optional('Copyright_Statement'),
-            optional('Licence'),
-            optional('Nationals_Statistic_Certified'),
-            optional('Methodology_Link'),
-            optional('Methodology_Statement'),
-            optional('Methodology_Statement_Welsh'),
-            optional('SDC_Link'),
-            optional('SDC_Statement'),
-            optional('SDC_Statement_Welsh'),
-            optional('Contact_Id', validate_fn=isoneof(self.contacts.keys())),
-        ]
+        columns = file_columns('Source.csv', self.symbols)
         source_rows = self.read_file('Source.csv', columns)
 
         sources = {}
@@ -161,16 +283,10 @@ class Loader:
 
         return sources
 
-    @property
-    @lru_cache(maxsize=1)
+    @MemoizedProperty
     def census_releases(self):
         """Load census releases."""
-        columns = [
-            required('Census_Release_Number', unique=True),
-            required('Census_Release_Description'),
-            required('Release_Date'),
-            required('Id'),
-        ]
+        columns = file_columns('Census_Release.csv', self.symbols)
         census_release_rows = self.read_file('Census_Release.csv', columns)
 
         census_releases = {}
@@ -181,8 +297,7 @@ class Loader:
 
         return census_releases
 
-    @property
-    @lru_cache(maxsize=1)
+    @MemoizedProperty
     def security_classifications(self):
         """
         Load security classifications.
@@ -191,13 +306,7 @@ class Loader:
         and classifications with a public security classification are exported.
         """
         filename = 'Security_Classification.csv'
-        columns = [
-            required('Security_Mnemonic', unique=True),
-            required('Id'),
-            required('Security_Description'),
-
-            optional('Security_Description_Welsh'),
-        ]
+        columns = file_columns(filename, self.symbols)
         security_classification_rows = self.read_file(filename, columns)
 
         security_classifications = {sc.data['Security_Mnemonic'] for sc in
@@ -212,19 +321,10 @@ class Loader:
 
         return security_classifications
 
-    @property
-    @lru_cache(maxsize=1)
+    @MemoizedProperty
     def statistical_units(self):
         """Load statistical units."""
-        columns = [
-            required('Statistical_Unit', unique=True),
-            required('Statistical_Unit_Description'),
-            required('Id'),
-
-            optional('Statistical_Unit_Label'),
-            optional('Statistical_Unit_Label_Welsh'),
-            optional('Statistical_Unit_Description_Welsh'),
-        ]
+        columns = file_columns('Statistical_Unit.csv', self.symbols)
         statistical_unit_rows = self.read_file('Statistical_Unit.csv', columns)
 
         statistical_units = {}
@@ -242,37 +342,14 @@ class Loader:
 
         return statistical_units
 
-    @property
-    @lru_cache(maxsize=1)
+    @MemoizedProperty
     def datasets(self):
         """Load datasets."""
         filename = 'Dataset.csv'
-        columns = [
-            required('Dataset_Mnemonic', unique=True),
-            required('Security_Mnemonic', validate_fn=isoneof(self.security_classifications)),
-            required('Dataset_Title'),
-            required('Id'),
-            required('Geographic_Coverage'),
-            required('Dataset_Population'),
-            required('Statistical_Unit', validate_fn=isoneof(self.statistical_units.keys())),
-            required('Version'),
-            required('Dataset_Description'),
-            required('Signed_Off_Flag', validate_fn=is_y_or_n),
-
-            optional('Dataset_Title_Welsh'),
-            optional('Dataset_Description_Welsh'),
-            optional('Dataset_Mnemonic_2011'),
-            optional('Geographic_Coverage_Welsh'),
-            optional('Dataset_Population_Welsh'),
-            optional('Last_Updated'),
-            optional('Contact_Id', validate_fn=isoneof(self.contacts.keys())),
-            optional('Observation_Type_Code', validate_fn=isoneof(self.observation_types.keys())),
-            optional('Destination_Pre_Built_Database_Mnemonic',
-                     validate_fn=isoneof(self.databases.keys())),
-        ]
+        columns = file_columns(filename, self.symbols)
         dataset_rows = self.read_file(filename, columns)
 
-        dataset_mnemonics = [d.data['Dataset_Mnemonic'] for d in dataset_rows]
+        dataset_mnemonics = Symbols(d.data['Dataset_Mnemonic'] for d in dataset_rows)
 
         dataset_to_related_datasets = self.load_dataset_to_related(dataset_mnemonics)
         dataset_to_publications = self.load_dataset_to_publications(dataset_mnemonics)
@@ -385,27 +462,13 @@ class Loader:
 
         return datasets
 
-    @property
-    @lru_cache(maxsize=1)
+    @MemoizedProperty
     def databases(self):
         """Load databases."""
-        columns = [
-            required('Database_Mnemonic', unique=True),
-            required('Source_Mnemonic', validate_fn=isoneof(self.sources.keys())),
-            required('Database_Title'),
-            required('Id'),
-            required('Database_Description'),
-            required('Version'),
-            # This should be mandatory but is not yet populated
-            optional('Cantabular_DB_Flag', validate_fn=is_y_or_n),
-            required('Database_Type_Code', validate_fn=isoneof(self.database_types.keys())),
-
-            optional('Database_Title_Welsh'),
-            optional('Database_Description_Welsh'),
-        ]
+        columns = file_columns('Database.csv', self.symbols)
         database_rows = self.read_file('Database.csv', columns)
 
-        database_mnemonics = [d.data['Database_Mnemonic'] for d in database_rows]
+        database_mnemonics = Symbols(d.data['Database_Mnemonic'] for d in database_rows)
         database_to_classifications = self.load_database_to_classifications(database_mnemonics)
 
         databases = {}
@@ -437,88 +500,89 @@ class Loader:
 
         return databases
 
-    @property
-    @lru_cache(maxsize=1)
+    @MemoizedProperty
     def categories(self):
         """
         Load categories.
 
         Cantabular has a built-in catLabels concept. This is a dictionary of category codes to
-        category labels. The data from the categories file are converted to this format.
+        category labels. The categories of each classification are held in an
+        ons_csv_to_ctb_json_bilingual.CategoryLabels object, which is converted to this format
+        when the output is serialised.
 
         English values are excluded. These will be present in the codebook. Unpopulated Welsh
         values are also excluded.
         """
-        filename = 'Category.csv'
-        columns = [
-            required('Category_Code'),
-            required('Classification_Mnemonic', validate_fn=isoneof(self.classifications.keys())),
-            required('Internal_Category_Label_English'),
-            required('Id'),
-            required('Variable_Mnemonic'),
-            required('Version'),
-
-            # Sort_Order values are not validated as this is an optional field.
-            optional('Sort_Order'),
-            optional('External_Category_Label_English'),
-            optional('External_Category_Label_Welsh'),
-        ]
-        category_rows = self.read_file(
-            filename, columns,
-            # There can only be one row for each Category_Code/Classification_Mnemonic combination.
-            unique_combo_fields=['Category_Code', 'Classification_Mnemonic'])
-
+        columns = file_columns('Category.csv', self.symbols)
+        # The categories may be split into several shards. Each shard is parsed in turn, so the
+        # rows are in the same order as if the shards had been concatenated and errors are always
+        # reported in the same order.
+        category_rows = unique_across_shards(
+            [(self.full_filename(filename), self.iter_file(
+                filename, columns,
+                # There can only be one row for each Category_Code/Classification_Mnemonic
+                # combination.
+                unique_combo_fields=['Category_Code', 'Classification_Mnemonic']))
+             for filename in source_filenames(self.input_directory, 'Category.csv')],
+            self.recoverable_error)
+
+        # The codes, English labels and Welsh labels of each classification are collected in
+        # parallel lists, so no objects are created for individual categories. Classifications
+        # are held in the order of their first row. The full name of the file containing the first
+        # row of each classification is used when reporting errors.
         classification_to_cats = {}
-        for cat, row_num in category_rows:
+        classification_files = {}
+        for filename, (cat, row_num) in category_rows:
             classification_mnemonic = cat['Classification_Mnemonic']
-            if self.classifications[classification_mnemonic].private['Is_Geographic']:
-                raise ValueError(f'Reading {self.full_filename(filename)}:{row_num} '
-                                 'found category for geographic classification '
-                                 f'{classification_mnemonic}: all categories for geographic '
-                                 'classifications must be in a separate lookup file')
-
-            append_to_list_in_dict(classification_to_cats, classification_mnemonic, cat)
-
-        # Choose which English label to use for a given category
-        def english_label(cat):
-            if cat['External_Category_Label_English']:
-                return cat['External_Category_Label_English']
-            return cat['Internal_Category_Label_English']
-
+            cats = classification_to_cats.get(classification_mnemonic)
+            if cats is None:
+                # The classification is checked on its first row, rather than on every row.
+                if self.classifications[classification_mnemonic].private['Is_Geographic']:
+                    raise ValueError(f'Reading {filename}:{row_num} '
+                                     'found category for geographic classification '
+                                     f'{classification_mnemonic}: all categories for geographic '
+                                     'classifications must be in a separate lookup file')
+                cats = classification_to_cats[classification_mnemonic] = ([], [], [], [])
+                classification_files[classification_mnemonic] = filename
+
+            # Only the code and labels are kept, so memory usage does not depend on other columns.
+            cats[0].append(cat['Category_Code'])
+            cats[1].append(cat['External_Category_Label_English'])
+            cats[2].append(cat['Internal_Category_Label_English'])
+            cats[3].append(cat['External_Category_Label_Welsh'])
+
+        # Each classification is built and validated separately. The classifications are processed
+        # in the order of their first row, so any errors are reported in row order.
         categories = {}
-        for classification_mnemonic, one_var_categories in classification_to_cats.items():
-            num_cat_items = \
-                self.classifications[classification_mnemonic].private['Number_Of_Category_Items']
-            if num_cat_items and len(one_var_categories) != num_cat_items:
+        pool = CategoryLabelsPool()
+        for classification_mnemonic, cats in classification_to_cats.items():
+            codes, english, welsh, error = build_category_labels(
+                classification_mnemonic,
+                self.classifications[classification_mnemonic].private['Number_Of_Category_Items'],
+                cats)
+            if error:
                 self.recoverable_error(
-                    f'Reading {self.full_filename(filename)} '
-                    f'Unexpected number of categories for {classification_mnemonic}: '
-                    f'expected {num_cat_items} but found {len(one_var_categories)}')
-
-            welsh_cats = {cat['Category_Code']: cat['External_Category_Label_Welsh']
-                          for cat in one_var_categories if cat['External_Category_Label_Welsh']}
-            english_cats = {cat['Category_Code']: english_label(cat) for cat in one_var_categories}
+                    f'Reading {classification_files[classification_mnemonic]} {error}')
 
             # If Welsh labels are not provided then do not substitute English labels in their
             # place. The Welsh base dataset includes the base English dataset and the metadata
             # server will perform the substitution automatically.
-            categories[classification_mnemonic] = Bilingual(english_cats,
-                                                            welsh_cats if welsh_cats else None,
-                                                            default_to_english=False)
+            categories[classification_mnemonic] = pool.get(codes, english, welsh)
 
         # Categories for geographic variables are supplied in a separate file.
         if not self.geography_files:
             logging.info('No geography files specified')
+            pool.log_savings()
             return categories
 
         # read_geo_cats returns a dictionary of lower case variable name to categories.
         # This allows the reader to be case agnostic with regards to column headings.
-        for lc_name, geo_cats in read_geo_cats(self.geography_files).items():
-            for name in self.classifications:
-                if name.lower() == lc_name:
-                    class_name = name
-                    break
-            else:
+        open_fn = self.prefetcher.open if self.prefetcher else None
+        for lc_name, geo_cats in profiled_call(self.options.profiler, 'read', 'read_geo_cats',
+                                               read_geo_cats, self.geography_files,
+                                               self.row_cache, open_fn).items():
+            class_name = self.symbols.find('classifications', lc_name)
+            if not class_name:
                 logging.info(f'Reading {geo_cats.source_file}: found labels for unknown '
                              f'geographic classification: {lc_name}')
                 continue
@@ -528,16 +592,15 @@ class Loader:
                                        f'non geographic classification: {class_name}')
                 continue
 
-            english_names = {cd: nm.name for cd, nm in geo_cats.code_to_label.items() if nm.name}
-            welsh_names = {cd: nm.welsh_name for cd, nm in geo_cats.code_to_label.items()
-                           if nm.welsh_name}
+            names = geo_cats.code_to_label.values()
+            welsh_names = tuple(nm.welsh_name for nm in names)
 
             # If Welsh names are not provided then do not substitute English names in their place.
             # The Welsh base dataset includes the base English dataset and the metadata server
             # will perform the substitution automatically.
-            categories[class_name] = Bilingual(english_names,
-                                               welsh_names if welsh_names else None,
-                                               default_to_english=False)
+            categories[class_name] = pool.get(
+                tuple(geo_cats.code_to_label), tuple(nm.name for nm in names),
+                welsh_names if any(welsh_names) else None)
 
         geos_with_labels = []
         for class_name, classification in self.classifications.items():
@@ -547,21 +610,13 @@ class Loader:
             logging.info('Labels supplied for these geographic classifications: '
                          f'{sorted(geos_with_labels)}')
 
+        pool.log_savings()
         return categories
 
-    @property
-    @lru_cache(maxsize=1)
+    @MemoizedProperty
     def topics(self):
         """Load topics."""
-        columns = [
-            required('Topic_Mnemonic', unique=True),
-            required('Topic_Title'),
-            required('Topic_Description'),
-            required('Id'),
-
-            optional('Topic_Description_Welsh'),
-            optional('Topic_Title_Welsh'),
-        ]
+        columns = file_columns('Topic.csv', self.symbols)
         topic_rows = self.read_file('Topic.csv', columns)
 
         topics = {}
@@ -576,21 +631,10 @@ class Loader:
 
         return topics
 
-    @property
-    @lru_cache(maxsize=1)
+    @MemoizedProperty
     def questions(self):
         """Load questions."""
-        columns = [
-            required('Question_Code', unique=True),
-            required('Question_Label'),
-            required('Version'),
-            required('Id'),
-
-            optional('Question_Label_Welsh'),
-            optional('Reason_For_Asking_Question'),
-            optional('Reason_For_Asking_Question_Welsh'),
-            optional('Question_First_Asked_In_Year'),
-        ]
+        columns = file_columns('Question.csv', self.symbols)
         question_rows = self.read_file('Question.csv', columns)
 
         questions = {}
@@ -606,18 +650,11 @@ class Loader:
 
         return questions
 
-    @property
-    @lru_cache(maxsize=1)
+    @MemoizedProperty
     def variable_types(self):
         """Load variable types."""
         filename = 'Variable_Type.csv'
-        columns = [
-            required('Variable_Type_Code', unique=True),
-            required('Variable_Type_Description'),
-            required('Id'),
-
-            optional('Variable_Type_Description_Welsh'),
-        ]
+        columns = file_columns(filename, self.symbols)
         variable_type_rows = self.read_file(filename, columns)
 
         variable_types = {}
@@ -637,49 +674,14 @@ class Loader:
 
         return variable_types
 
-    @property
-    @lru_cache(maxsize=1)
+    @MemoizedProperty
     def variables(self):
         """Load variables."""
         filename = 'Variable.csv'
-        columns = [
-            required('Variable_Mnemonic', unique=True),
-            required('Security_Mnemonic', validate_fn=isoneof(self.security_classifications)),
-            required('Variable_Type_Code', validate_fn=isoneof(self.variable_types.keys())),
-            required('Variable_Title'),
-            required('Variable_Description'),
-            required('Id'),
-            required('Version'),
-            required('Signed_Off_Flag', validate_fn=is_y_or_n),
-
-            # Required for non-geographic variables but not always populated in source files
-            optional('Statistical_Unit', validate_fn=isoneof(self.statistical_units.keys())),
-
-            # Required for geographic variables but not yet populated
-            optional('Geographic_Theme'),
-            optional('Geographic_Coverage'),
-
-            optional('Variable_Title_Welsh'),
-            optional('Variable_Description_Welsh'),
-            optional('Variable_Mnemonic_2011'),
-            optional('Comparability_Comments'),
-            optional('Comparability_Comments_Welsh'),
-            optional('Uk_Comparison_Comments'),
-            optional('Uk_Comparison_Comments_Welsh'),
-            optional('Geographic_Theme_Welsh'),
-            optional('Geographic_Coverage_Welsh'),
-            optional('Topic_Mnemonic', validate_fn=isoneof(self.topics.keys())),
-            optional('Number_Of_Classifications'),
-            optional('Quality_Statement_Text'),
-            optional('Quality_Statement_Text_Welsh'),
-            optional('Quality_Summary_URL'),
-            optional('Geography_Hierarchy_Order', validate_fn=isnumeric),
-            optional('Variable_Short_Description'),
-            optional('Variable_Short_Description_Welsh'),
-        ]
+        columns = file_columns(filename, self.symbols)
         variable_rows = self.read_file(filename, columns)
 
-        variable_mnemonics = [v.data['Variable_Mnemonic'] for v in variable_rows]
+        variable_mnemonics = Symbols(v.data['Variable_Mnemonic'] for v in variable_rows)
         variable_to_source_questions = self.load_variable_to_questions(variable_mnemonics)
         variable_to_keywords = self.load_variable_keywords(variable_mnemonics)
 
@@ -690,9 +692,11 @@ class Loader:
         all_geography_hierarchy_orders = {}
 
         for variable, row_num in variable_rows:
-            geography_hierarchy_order = variable.get('Geography_Hierarchy_Order', None)
-            geography_hierarchy_order = int(geography_hierarchy_order) if \
-                geography_hierarchy_order else None
+            # Geography_Hierarchy_Order is exported as it appears in the source file, but values
+            # are compared as integers.
+            geography_hierarchy_order = variable['Geography_Hierarchy_Order']
+            if geography_hierarchy_order is not None:
+                geography_hierarchy_order = int(geography_hierarchy_order)
 
             # Ensure that non-geographic variables do not have geographic values set.
             is_geographic = variable['Variable_Type_Code'] == GEOGRAPHIC_VARIABLE_TYPE
@@ -703,7 +707,7 @@ class Loader:
                 #                    f'no Statistical_Unit specified for non geographic variable: '
                 #                    f'{variable["Variable_Mnemonic"]}')
                 for geo_field in all_geo_fields:
-                    if variable[geo_field]:
+                    if variable[geo_field] is not None:
                         self.recoverable_error(f'Reading {self.full_filename(filename)}:{row_num} '
                                                f'{geo_field} specified for non geographic '
                                                f'variable: {variable["Variable_Mnemonic"]}')
@@ -719,7 +723,7 @@ class Loader:
                         all_geography_hierarchy_orders[geography_hierarchy_order] = \
                             variable['Variable_Mnemonic']
 
-                if not variable['Geography_Hierarchy_Order']:
+                if geography_hierarchy_order is None:
                     self.recoverable_error(f'Reading {self.full_filename(filename)}:{row_num} '
                                            'no Geography_Hierarchy_Order specified for geographic '
                                            f'variable: {variable["Variable_Mnemonic"]}')
@@ -727,6 +731,7 @@ class Loader:
                     logging.warning(f'Reading {self.full_filename(filename)}:{row_num} '
                                     'using 0 for Geography_Hierarchy_Order')
                     variable['Geography_Hierarchy_Order'] = '0'
+                    geography_hierarchy_order = 0
 
             # These values are not yet populated in source files
             # else:
@@ -789,36 +794,18 @@ class Loader:
                          'Variable_Description': Bilingual(
                              variable.pop('Variable_Description'),
                              variable.pop('Variable_Description_Welsh')),
-                         'Geography_Hierarchy_Order': variable['Geography_Hierarchy_Order']})
+                         'Geography_Hierarchy_Order': geography_hierarchy_order})
         return variables
 
-    @property
-    @lru_cache(maxsize=1)
+    @MemoizedProperty
     def classifications(self):
         """Load classifications."""
         filename = 'Classification.csv'
-        columns = [
-            required('Id'),
-            required('Classification_Mnemonic', unique=True),
-            required('Variable_Mnemonic', validate_fn=isoneof(self.variables.keys())),
-            required('Internal_Classification_Label_English'),
-            required('Security_Mnemonic', validate_fn=isoneof(self.security_classifications)),
-            required('Version'),
-            required('Signed_Off_Flag', validate_fn=is_y_or_n),
-
-            optional('Number_Of_Category_Items', validate_fn=isnumeric),
-            optional('External_Classification_Label_English'),
-            optional('External_Classification_Label_Welsh'),
-            optional('Mnemonic_2011'),
-            optional('Parent_Classification_Mnemonic'),
-            optional('Default_Classification_Flag'),
-            optional('Flat_Classification_Flag'),
-            optional('Not_Applicable_Category_Description'),
-            optional('Not_Applicable_Category_Description_Welsh'),
-        ]
+        columns = file_columns(filename, self.symbols)
         classification_rows = self.read_file(filename, columns)
 
-        classification_mnemonics = [c.data['Classification_Mnemonic'] for c in classification_rows]
+        classification_mnemonics = Symbols(c.data['Classification_Mnemonic']
+                                           for c in classification_rows)
         classification_to_topics = self.load_classification_to_topics(classification_mnemonics)
         classification_to_codebook = self.load_class_to_codebook_mnemonic(classification_mnemonics)
 
@@ -863,8 +850,7 @@ class Loader:
             del classification['Flat_Classification_Flag']
             del classification['Id']
 
-            num_cat_items = classification.pop('Number_Of_Category_Items')
-            num_cat_items = int(num_cat_items) if num_cat_items else 0
+            num_cat_items = classification.pop('Number_Of_Category_Items') or 0
 
             # The Cantabular_Public_Flag is set for each classification on a per database basis.
             # The base version has the flag set to Y, and may be set to N for other databases.
@@ -914,22 +900,10 @@ class Loader:
 
         return classifications
 
-    @property
-    @lru_cache(maxsize=1)
+    @MemoizedProperty
     def observation_types(self):
         """Load observation types."""
-        columns = [
-            required('Observation_Type_Code', unique=True),
-            required('Observation_Type_Label'),
-            required('Id'),
-
-            optional('Observation_Type_Description'),
-            optional('Decimal_Places', validate_fn=isnumeric),
-            optional('Prefix'),
-            optional('Suffix'),
-            optional('FillTrailingSpaces', validate_fn=is_y_or_n),
-            optional('NegativeSign'),
-        ]
+        columns = file_columns('Observation_Type.csv', self.symbols)
         observation_type_rows = self.read_file('Observation_Type.csv', columns)
 
         observation_types = {}
@@ -940,16 +914,11 @@ class Loader:
 
         return observation_types
 
-    @property
-    @lru_cache(maxsize=1)
+    @MemoizedProperty
     def database_types(self):
         """Load database types."""
-        columns = [
-            required('Database_Type_Code', unique=True),
-            required('Database_Type_Description'),
-            required('Id'),
-        ]
         filename = 'Database_Type.csv'
+        columns = file_columns(filename, self.symbols)
         database_type_rows = self.read_file(filename, columns)
 
         database_types = {}
@@ -964,14 +933,10 @@ class Loader:
 
         return database_types
 
-    @property
-    @lru_cache(maxsize=1)
+    @MemoizedProperty
     def metadata_version_number(self):
         """Load metadata version."""
-        columns = [
-            optional('Id'),
-            optional('Metadata_Version_Number'),
-        ]
+        columns = file_columns('Metadata_Version.csv', self.symbols)
         metadata_version_rows = self.read_file('Metadata_Version.csv', columns)
 
         if not metadata_version_rows:
@@ -982,11 +947,8 @@ class Loader:
 
     def load_dataset_keywords(self, dataset_mnemonics):
         """Load dataset keywords."""
-        columns = [
-            required('Id'),
-            required('Dataset_Keyword'),
-            required('Dataset_Mnemonic', validate_fn=isoneof(dataset_mnemonics)),
-        ]
+        columns = file_columns('Dataset_Keyword.csv', self.symbols,
+                               dataset_mnemonics=dataset_mnemonics)
         dataset_keyword_rows = self.read_file(
             'Dataset_Keyword.csv', columns,
             unique_combo_fields=['Dataset_Keyword', 'Dataset_Mnemonic'])
@@ -1005,11 +967,8 @@ class Loader:
 
     def load_variable_keywords(self, variable_mnemonics):
         """Load variable keywords."""
-        columns = [
-            required('Id'),
-            required('Variable_Keyword'),
-            required('Variable_Mnemonic', validate_fn=isoneof(variable_mnemonics)),
-        ]
+        columns = file_columns('Variable_Keyword.csv', self.symbols,
+                               variable_mnemonics=variable_mnemonics)
         variable_keyword_rows = self.read_file(
             'Variable_Keyword.csv', columns,
             unique_combo_fields=['Variable_Keyword', 'Variable_Mnemonic'])
@@ -1036,19 +995,8 @@ class Loader:
         to Y.
         """
         filename = 'Database_Variable.csv'
-        columns = [
-            required('Variable_Mnemonic', validate_fn=isoneof(self.variables.keys())),
-            required('Database_Mnemonic', validate_fn=isoneof(database_mnemonics)),
-            optional('Classification_Mnemonic', validate_fn=isoneof(self.classifications.keys())),
-            required('Id'),
-            required('Version'),
-
-            optional('Lowest_Geog_Variable_Flag', validate_fn=isoneof(['Y', 'N'])),
-            # No action is currently taken on these fields
-            optional('Source_Classification_Flag', validate_fn=isoneof(['Y', 'N'])),
-            optional('Cantabular_Public_Flag', validate_fn=isoneof(['Y', 'N'])),
-        ]
-        database_variable_rows = self.read_file(
+        columns = file_columns(filename, self.symbols, database_mnemonics=database_mnemonics)
+        database_variable_rows = self.iter_file(
             filename, columns,
             # There can only be one row for each Variable_Mnemonic/Database_Mnemonic combination.
             unique_combo_fields=['Variable_Mnemonic', 'Database_Mnemonic',
@@ -1129,11 +1077,7 @@ class Loader:
     def load_dataset_to_related(self, dataset_mnemonics):
         """Load the related datasets relationships."""
         filename = 'Related_Datasets.csv'
-        columns = [
-            required('Related_Dataset_Mnemonic', validate_fn=isoneof(dataset_mnemonics)),
-            required('Dataset_Mnemonic', validate_fn=isoneof(dataset_mnemonics)),
-            required('Id'),
-        ]
+        columns = file_columns(filename, self.symbols, dataset_mnemonics=dataset_mnemonics)
         related_dataset_rows = self.read_file(
             filename, columns,
             # There can only be one row for each Related_Dataset_Mnemonic/Dataset_Mnemonic
@@ -1149,15 +1093,8 @@ class Loader:
 
     def load_dataset_to_publications(self, dataset_mnemonics):
         """Load publications associated with each dataset."""
-        columns = [
-            required('Publication_Mnemonic', unique=True),
-            required('Dataset_Mnemonic', validate_fn=isoneof(dataset_mnemonics)),
-            required('Id'),
-
-            optional('Publication_Title'),
-            optional('Publisher_Name'),
-            optional('Publisher_Website'),
-        ]
+        columns = file_columns('Publication_Dataset.csv', self.symbols,
+                               dataset_mnemonics=dataset_mnemonics)
         publication_dataset_rows = self.read_file('Publication_Dataset.csv', columns)
 
         dataset_to_pubs = {}
@@ -1170,11 +1107,8 @@ class Loader:
 
     def load_dataset_to_releases(self, dataset_mnemonics):
         """Load releases associated with each dataset."""
-        columns = [
-            required('Census_Release_Number', validate_fn=isoneof(self.census_releases.keys())),
-            required('Dataset_Mnemonic', validate_fn=isoneof(dataset_mnemonics)),
-            required('Id'),
-        ]
+        columns = file_columns('Release_Dataset.csv', self.symbols,
+                               dataset_mnemonics=dataset_mnemonics)
         release_dataset_rows = self.read_file(
             'Release_Dataset.csv', columns,
             # There can only be one row for each Dataset_Mnemonic/Census_Release_Number
@@ -1190,11 +1124,8 @@ class Loader:
 
     def load_variable_to_questions(self, variable_mnemonics):
         """Load questions associated with each variable."""
-        columns = [
-            required('Source_Question_Code', validate_fn=isoneof(self.questions.keys())),
-            required('Variable_Mnemonic', validate_fn=isoneof(variable_mnemonics)),
-            required('Id'),
-        ]
+        columns = file_columns('Variable_Source_Question.csv', self.symbols,
+                               variable_mnemonics=variable_mnemonics)
         variable_source_question_rows = self.read_file(
             'Variable_Source_Question.csv', columns,
             # There can only be one row for each Variable_Mnemonic/Source_Question_Code
@@ -1230,19 +1161,8 @@ class Loader:
         Destination_Pre_Built_Database_Mnemonic field is populated in Dataset.csv.
         """
         filename = 'Dataset_Variable.csv'
-        columns = [
-            required('Dataset_Mnemonic', validate_fn=isoneof(dataset_mnemonics)),
-            required('Database_Mnemonic', validate_fn=isoneof(self.databases.keys())),
-            required('Id'),
-            required('Variable_Mnemonic', validate_fn=isoneof(self.variables.keys())),
-
-            optional('Classification_Mnemonic', validate_fn=isoneof(self.classifications.keys())),
-            optional('Processing_Priority', validate_fn=isnumeric),
-            optional('Lowest_Geog_Variable_Flag', validate_fn=isoneof({'Y', 'N'})),
-            optional('Minimum_Threshold_Person', validate_fn=isnumeric),
-            optional('Minimum_Threshold_HH', validate_fn=isnumeric),
-        ]
-        dataset_variable_rows = self.read_file(
+        columns = file_columns(filename, self.symbols, dataset_mnemonics=dataset_mnemonics)
+        dataset_variable_rows = self.iter_file(
             filename, columns,
             # There can only be one row for each Dataset_Mnemonic/Variable_Mnemonic
             # combination.
@@ -1275,11 +1195,8 @@ class Loader:
 
     def load_classification_to_topics(self, classification_mnemonics):
         """Load topics associated with each classification."""
-        columns = [
-            required('Topic_Mnemonic', validate_fn=isoneof(self.topics.keys())),
-            required('Classification_Mnemonic', validate_fn=isoneof(classification_mnemonics)),
-            required('Id'),
-        ]
+        columns = file_columns('Topic_Classification.csv', self.symbols,
+                               classification_mnemonics=classification_mnemonics)
         topic_classification_rows = self.read_file(
             'Topic_Classification.csv', columns,
             # There can only be one row for each Classification_Mnemonic/Topic_Mnemonic
@@ -1306,10 +1223,8 @@ class Loader:
         not required in the cantabular-metadata JSON files.
         """
         filename = 'Category_Mapping.csv'
-        columns = [
-            required('Classification_Mnemonic', validate_fn=isoneof(classification_mnemonics)),
-            required('Codebook_Mnemonic'),
-        ]
+        columns = file_columns(filename, self.symbols,
+                               classification_mnemonics=classification_mnemonics)
         rows = self.read_file(filename, columns)
 
         classification_to_codebook = {}
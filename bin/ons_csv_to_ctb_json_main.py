@@ -4,11 +4,19 @@ import os
 import logging
 import re
 import glob
+from collections import Counter
 from pathlib import Path
-from argparse import ArgumentParser
+from argparse import ArgumentParser, Namespace
 from datetime import datetime
-from ons_csv_to_ctb_json_load import Loader, PUBLIC_SECURITY_MNEMONIC
+from ons_csv_to_ctb_json_load import Loader, LoaderOptions, PUBLIC_SECURITY_MNEMONIC
+from ons_csv_to_ctb_json_columns import check_headers
+from ons_csv_to_ctb_json_stages import dataset_filter_stages, load_stages, OUTPUT_STAGES
+from ons_csv_to_ctb_json_incremental import IncrementalBuild
+from ons_csv_to_ctb_json_profile import Profiler, measure, profiled_call
+from ons_csv_to_ctb_json_prune import PrunedLoader
+from ons_csv_to_ctb_json_snapshot import restore_snapshot, save_snapshot
 from ons_csv_to_ctb_json_bilingual import BilingualDict, Bilingual
+from ons_csv_to_ctb_json_encode import LazySharedJSON, SharedJSONEncoder
 
 SCHEMA_VERSION = '1.4'
 
@@ -28,6 +36,8 @@ CANTABULAR_V9_3_0 = '9.3.0'
 FILE_CONTENT_TYPE_DATASET = 'dataset-md'
 FILE_CONTENT_TYPE_TABLES = 'tables-md'
 FILE_CONTENT_TYPE_SERVICE = 'service-md'
+FILE_CONTENT_TYPE_PROFILE = 'profile'
+FILE_PREFIXES = ['d', 't', 'tu']
 KNOWN_CANTABULAR_VERSIONS = [DEFAULT_CANTABULAR_VERSION, CANTABULAR_V10_2_2, CANTABULAR_V10_2_1,
                              CANTABULAR_V10_2_0, CANTABULAR_V10_1_1, CANTABULAR_V10_1_0,
                              CANTABULAR_V10_0_0, CANTABULAR_V9_3_0]
@@ -58,6 +68,25 @@ def cantabular_version_string(value):
     return value
 
 
+def file_prefix(value):
+    """Check that the value is a valid output filename prefix, or None for no prefix."""
+    if value is not None and value not in FILE_PREFIXES:
+        raise ValueError(f"invalid value: '{value}'")
+    return value
+
+
+# The options that can be specified for each variant in a --variants file, and the functions used
+# to check their values.
+VARIANT_OPTIONS = {
+    'file_prefix': file_prefix,
+    'metadata_master_version': filename_segment,
+    'build_number': positive_int,
+    'cantabular_version': cantabular_version_string,
+    'base_dataset_name': str,
+    'dataset_filter': str,
+}
+
+
 def main():
     """
     Load metadata in CSV format and export in JSON format.
@@ -104,7 +133,7 @@ def main():
 
     parser.add_argument('-p', '--file_prefix',
                         type=str,
-                        choices=['d', 't', 'tu'],
+                        choices=FILE_PREFIXES,
                         help='Prefix to use in output filenames: d=dev, t=test, tu=tuning '
                              '(default: no prefix i.e. operational)')
 
@@ -156,7 +185,82 @@ def main():
                              'duplication of variable data- the base dataset does not have to '
                              'exist as an actual Cantabular dataset.')
 
+    parser.add_argument('--cache-dir',
+                        type=str,
+                        help='Directory used to cache the validated contents of the input and '
+                             'geography files. Files are only re-read when their contents, the '
+                             'column validation rules or the dataset filter have changed. The '
+                             'directory is created if it does not exist.')
+
+    parser.add_argument('--prefetch',
+                        action='store_true',
+                        help='Read all the input and geography files into memory concurrently '
+                             'before they are parsed. This can reduce the time taken to load the '
+                             'files when they are on a network filesystem.')
+
+    parser.add_argument('--stage-threads',
+                        type=positive_int,
+                        default=0,
+                        help='Number of threads used to load the metadata. Metadata that do not '
+                             'depend on each other are loaded concurrently and the critical path '
+                             'through the loading stages is logged. '
+                             '(default: %(default)s i.e. load the metadata sequentially)')
+
+    parser.add_argument('--incremental-dir',
+                        type=str,
+                        help='Directory used to store the metadata loaded by each build. On '
+                             'subsequent builds, metadata are only loaded again if the source '
+                             'files that they are derived from have changed. The directory is '
+                             'created if it does not exist.')
+
+    parser.add_argument('--variants',
+                        type=str,
+                        help='JSON file containing a list of output variants. Each variant is an '
+                             'object with values for any of these options: '
+                             f'{", ".join(VARIANT_OPTIONS)}. The output files are written for '
+                             'each variant, using the command line values for any options that '
+                             'are not specified. The metadata are only loaded once.')
+
+    parser.add_argument('--save-snapshot',
+                        type=str,
+                        help='File used to save a snapshot of the fully loaded metadata. The '
+                             'snapshot can be restored with --restore-snapshot to produce output '
+                             'files with different output options without loading the metadata '
+                             'again. No snapshot is saved if any errors are encountered.')
+
+    parser.add_argument('--restore-snapshot',
+                        type=str,
+                        help='Snapshot file saved with --save-snapshot to restore the loaded '
+                             'metadata from, instead of loading them from the source files. The '
+                             'snapshot is rejected if the source files, geography files or '
+                             'dataset filter differ from those used to create it.')
+
+    parser.add_argument('--prune',
+                        action='store_true',
+                        help='Only output the databases and classifications that are referenced '
+                             'by the datasets, and only read the categories of those '
+                             'classifications. This is intended for use with --dataset-filter, '
+                             'so that builds for a few datasets only process the metadata that '
+                             'those datasets use.')
+
+    parser.add_argument('--profile',
+                        action='store_true',
+                        help='Write a JSON report to the output directory with the wall time, CPU '
+                             'time and numbers of rows and objects for each metadata loading '
+                             'stage, each step in building the output and each output file.')
+
+    parser.add_argument('--profile-memory',
+                        action='store_true',
+                        help='Also use tracemalloc to record the memory allocated by each step in '
+                             'the report written by --profile, along with the top allocation '
+                             'sites. This slows down the conversion considerably.')
+
     args = parser.parse_args()
+    # --stage-threads, --incremental-dir and --restore-snapshot each load the stages differently.
+    if args.stage_threads and (args.incremental_dir or args.restore_snapshot):
+        parser.error('--stage-threads cannot be used with --incremental-dir or --restore-snapshot')
+    if args.incremental_dir and args.restore_snapshot:
+        parser.error('--incremental-dir cannot be used with --restore-snapshot')
 
     logging.basicConfig(format='t=%(asctime)s lvl=%(levelname)s msg=%(message)s',
                         level=args.log_level)
@@ -179,79 +283,260 @@ def main():
         logging.info(f'Geography files: {",".join(geography_files)}')
     if args.dataset_filter:
         logging.info(f'Dataset filter: {args.dataset_filter}')
+    if args.cache_dir:
+        logging.info(f'Cache directory: {args.cache_dir}')
 
     for directory in (args.input_dir, args.output_dir):
         if not os.path.isdir(directory):
             raise ValueError(f'{directory} does not exist or is not a directory')
 
+    variants = read_variants(args.variants, args) if args.variants else [args]
+    # A pruned Loader only holds the metadata referenced by the datasets that match its filter, so
+    # it cannot be shared with other dataset filters.
+    if args.prune and len({variant.dataset_filter for variant in variants}) > 1:
+        raise ValueError('--prune cannot be used with variants that have different dataset '
+                         'filters')
+
     time_now = datetime.now()
-    todays_date = time_now.strftime('%Y%m%d')
-    build_time = time_now.isoformat()
+    profiler = Profiler(memory=args.profile_memory) \
+        if args.profile or args.profile_memory else None
 
-    base_filename_template = output_filename_template(
-        args.file_prefix, args.cantabular_version, args.metadata_master_version, todays_date,
-        args.build_number)
+    # Check the headers of all the input files, so that any problems with them are reported before
+    # any of the data is loaded.
+    check_headers(args.input_dir, geography_files)
 
     # loader is used to load the metadata from CSV files and convert it to JSON.
-    loader = Loader(args.input_dir, geography_files, best_effort=args.best_effort,
-                    dataset_filter=args.dataset_filter)
-
-    # Build Cantabular variable objects.
-    # A Cantabular variable is equivalent to an ONS classification.
-    ctb_variables = build_ctb_variables(loader.classifications, loader.categories)
-
-    # Build Cantabular dataset objects.
-    # A Cantabular dataset is equivalent to an ONS database.
-    ctb_datasets = build_ctb_datasets(loader.databases, ctb_variables, args.base_dataset_name)
-
-    # Build Cantabular table objects.
-    # A Cantabular table is equivalent to an ONS dataset.
-    ctb_tables = build_ctb_tables(loader.datasets)
-
-    # Build Cantabular service metadata.
-    service_metadata = build_ctb_service_metadata(loader.metadata_version_number, build_time,
-                                                  geography_files, args)
-
-    error_count = loader.error_count()
-    if error_count:
-        logging.warning(f'{error_count} errors were encountered during processing')
-
-    if args.cantabular_version in KNOWN_CANTABULAR_VERSIONS:
-        logging.info(
-            f'Output files will be written in Cantabular {args.cantabular_version} format, '
-            f'which is compatible with all versions of Cantabular from {CANTABULAR_V9_3_0} '
-            f'to {DEFAULT_CANTABULAR_VERSION}')
-    else:
-        logging.info(
-            f'{args.cantabular_version} is an unknown Cantabular version: files will be written '
-            f'using {DEFAULT_CANTABULAR_VERSION} format')
-
-    logging.info('Build '
-                 f'created={build_time} '
-                 f'best_effort={args.best_effort} '
-                 f'dataset_filter={json.dumps(args.dataset_filter)} '
-                 f'geography_file={json.dumps(basename_string(geography_files))} '
-                 f'versions_data={loader.metadata_version_number} '
-                 f'versions_schema={SCHEMA_VERSION} '
-                 f'versions_script={SCRIPT_VERSION}')
-
-    filename = os.path.join(args.output_dir,
-                            base_filename_template.format(FILE_CONTENT_TYPE_DATASET))
-    with open(filename, 'w') as jsonfile:
-        json.dump(ctb_datasets, jsonfile, indent=4)
-    logging.info(f'Written dataset metadata file to: {filename}')
-
-    filename = os.path.join(args.output_dir,
-                            base_filename_template.format(FILE_CONTENT_TYPE_TABLES))
-    with open(filename, 'w') as jsonfile:
-        json.dump(ctb_tables, jsonfile, indent=4)
-    logging.info(f'Written table metadata file to: {filename}')
-
-    filename = os.path.join(args.output_dir,
-                            base_filename_template.format(FILE_CONTENT_TYPE_SERVICE))
-    with open(filename, 'w') as jsonfile:
-        json.dump(service_metadata, jsonfile, indent=4)
-    logging.info(f'Written service metadata file to: {filename}')
+    loader = (PrunedLoader if args.prune else Loader)(
+        args.input_dir, geography_files, best_effort=args.best_effort,
+        dataset_filter=variants[0].dataset_filter,
+        # The input files are not read when a snapshot is restored, so they are not prefetched.
+        options=LoaderOptions(cache_dir=args.cache_dir,
+                              prefetch=args.prefetch and not args.restore_snapshot,
+                              profiler=profiler))
+    # When pruning, the categories are loaded once the referenced classifications are known.
+    stages = [s for s in OUTPUT_STAGES if s != 'categories'] if args.prune else OUTPUT_STAGES
+    if args.restore_snapshot:
+        restore_snapshot(loader, args.restore_snapshot)
+    elif args.incremental_dir:
+        IncrementalBuild(args.incremental_dir).load_stages(loader, stages)
+    elif args.stage_threads:
+        load_stages(loader, stages, args.stage_threads)
+    if args.prune:
+        loader.prune()
+    if args.save_snapshot:
+        save_snapshot(loader, args.save_snapshot)
+
+    # Each variant uses a Loader with its dataset filter. The first Loader uses the dataset filter
+    # of the first variant, and the others share all of its metadata that does not depend on the
+    # dataset filter.
+    loaders = {loader.dataset_filter: loader}
+    writer = OutputWriter(args.output_dir, geography_files, time_now, variants, profiler)
+    for variant in variants:
+        if variant.dataset_filter not in loaders:
+            loaders[variant.dataset_filter] = loader_for_dataset_filter(
+                loader, variant.dataset_filter, args.best_effort)
+        writer.write(loaders[variant.dataset_filter], variant,
+                     loader if loaders[variant.dataset_filter] is not loader else None)
+
+    if profiler:
+        filename = os.path.join(args.output_dir, output_filename_template(
+            args.file_prefix, args.cantabular_version, args.metadata_master_version,
+            time_now.strftime('%Y%m%d'), args.build_number).format(FILE_CONTENT_TYPE_PROFILE))
+        profiler.write_report(filename)
+        profiler.stop()
+        logging.info(f'Written profile report to: {filename}')
+
+
+def read_variants(filename, args):
+    """
+    Read a JSON file containing a list of output variants.
+
+    Each variant is an object containing string values for some of the VARIANT_OPTIONS, except that
+    file_prefix may also be null. Any options that are not specified are taken from args. A list
+    of argparse.Namespace objects is returned.
+    """
+    with open(filename) as jsonfile:
+        variants = json.load(jsonfile)
+    if not isinstance(variants, list) or not variants:
+        raise ValueError(f'Reading {filename}: expected a non-empty list of variants')
+
+    namespaces = []
+    filenames = {}
+    for number, variant in enumerate(variants, 1):
+        if not isinstance(variant, dict):
+            raise ValueError(f'Reading {filename}: variant {number} is not an object')
+        unknown = sorted(set(variant) - set(VARIANT_OPTIONS))
+        if unknown:
+            raise ValueError(f'Reading {filename}: variant {number} has unknown options: '
+                             f'{", ".join(unknown)}')
+
+        options = vars(args).copy()
+        for name, value in variant.items():
+            try:
+                if not isinstance(value, str) and not (name == 'file_prefix' and value is None):
+                    raise ValueError(f'invalid value: {json.dumps(value)}')
+                options[name] = VARIANT_OPTIONS[name](value)
+            except ValueError as exception:
+                raise ValueError(f'Reading {filename}: variant {number} has invalid {name}: '
+                                 f'{exception}') from exception
+        namespace = Namespace(**options)
+        filename_options = (namespace.file_prefix, namespace.cantabular_version,
+                            namespace.metadata_master_version, namespace.build_number)
+        if filename_options in filenames:
+            raise ValueError(f'Reading {filename}: variants {filenames[filename_options]} and '
+                             f'{number} have the same output filenames')
+        filenames[filename_options] = number
+        namespaces.append(namespace)
+
+    return namespaces
+
+
+def loader_for_dataset_filter(loader, dataset_filter, best_effort):
+    """
+    Return a Loader that uses a different dataset filter.
+
+    The new Loader shares the values of all the stages that have been loaded by loader and that do
+    not depend on the dataset filter. Input files are not prefetched by the new Loader, as most of
+    them will not be read again.
+    """
+    filtered_loader = Loader(loader.input_directory, loader.geography_files,
+                             best_effort=best_effort, dataset_filter=dataset_filter,
+                             options=loader.options._replace(prefetch=False))
+    filtered = dataset_filter_stages()
+    for name, value in loader.cache.values.items():
+        if name not in filtered:
+            filtered_loader.cache.set(name, value)
+    return filtered_loader
+
+
+class OutputWriter:
+    """
+    OutputWriter writes the output files for one or more variants.
+
+    The contents of each output file only depend on some of the options of a variant, e.g. the
+    tables only depend on the dataset filter. If a later variant has the same values for those
+    options, then the serialised contents of the file are retained until they have been written
+    for that variant. Otherwise the contents are serialised directly to the file.
+
+    If a profiler is specified then the time taken to build and write each file is recorded by it.
+    """
+
+    def __init__(self, output_dir, geography_files, time_now, variants, profiler=None):
+        """Initialise OutputWriter object for the list of variants that will be written."""
+        self.output_dir = output_dir
+        self.geography_files = geography_files
+        self.time_now = time_now
+        self.profiler = profiler
+        self.serialised = {}
+        self.remaining_uses = Counter(key for variant in variants
+                                      for key in self.content_keys(variant).values())
+
+    def build(self, loader, args):
+        """
+        Return the contents of each output file for the variant described by args.
+
+        The contents are keyed on the file content type. They are either the objects that must be
+        serialised or the serialised contents of a file written for an earlier variant.
+        """
+        keys = self.content_keys(args)
+        contents = {content_type: self.serialised.get(key) for content_type, key in keys.items()}
+
+        if not contents[FILE_CONTENT_TYPE_DATASET]:
+            # Build Cantabular variable objects.
+            # A Cantabular variable is equivalent to an ONS classification.
+            ctb_variables = profiled_call(self.profiler, 'build', 'build_ctb_variables',
+                                          build_ctb_variables, loader.classifications,
+                                          loader.categories)
+
+            # Build Cantabular dataset objects.
+            # A Cantabular dataset is equivalent to an ONS database.
+            contents[FILE_CONTENT_TYPE_DATASET] = profiled_call(
+                self.profiler, 'build', 'build_ctb_datasets', build_ctb_datasets,
+                loader.databases, ctb_variables, args.base_dataset_name)
+
+        if not contents[FILE_CONTENT_TYPE_TABLES]:
+            # Build Cantabular table objects.
+            # A Cantabular table is equivalent to an ONS dataset.
+            contents[FILE_CONTENT_TYPE_TABLES] = profiled_call(
+                self.profiler, 'build', 'build_ctb_tables', build_ctb_tables, loader.datasets)
+
+        if not contents[FILE_CONTENT_TYPE_SERVICE]:
+            # Build Cantabular service metadata.
+            contents[FILE_CONTENT_TYPE_SERVICE] = profiled_call(
+                self.profiler, 'build', 'build_ctb_service_metadata', build_ctb_service_metadata,
+                loader.metadata_version_number, self.time_now.isoformat(), self.geography_files,
+                args)
+
+        return contents
+
+    @staticmethod
+    def content_keys(args):
+        """Return the options of a variant that determine the contents of each output file."""
+        return {
+            FILE_CONTENT_TYPE_DATASET: (FILE_CONTENT_TYPE_DATASET, args.base_dataset_name),
+            FILE_CONTENT_TYPE_TABLES: (FILE_CONTENT_TYPE_TABLES, args.dataset_filter),
+            FILE_CONTENT_TYPE_SERVICE: (FILE_CONTENT_TYPE_SERVICE, args.dataset_filter),
+        }
+
+    def write(self, loader, args, shared_loader=None):
+        """
+        Write the output files for the variant described by args.
+
+        shared_loader is the Loader that loader shares metadata with, if any. Errors encountered by
+        either Loader are reported.
+        """
+        contents = self.build(loader, args)
+        keys = self.content_keys(args)
+        build_time = self.time_now.isoformat()
+
+        error_count = loader.error_count() + (shared_loader.error_count() if shared_loader else 0)
+        if error_count:
+            logging.warning(f'{error_count} errors were encountered during processing')
+
+        if args.cantabular_version in KNOWN_CANTABULAR_VERSIONS:
+            logging.info(
+                f'Output files will be written in Cantabular {args.cantabular_version} format, '
+                f'which is compatible with all versions of Cantabular from {CANTABULAR_V9_3_0} '
+                f'to {DEFAULT_CANTABULAR_VERSION}')
+        else:
+            logging.info(
+                f'{args.cantabular_version} is an unknown Cantabular version: files will be '
+                f'written using {DEFAULT_CANTABULAR_VERSION} format')
+
+        logging.info('Build '
+                     f'created={build_time} '
+                     f'best_effort={args.best_effort} '
+                     f'dataset_filter={json.dumps(args.dataset_filter)} '
+                     f'geography_file={json.dumps(basename_string(self.geography_files))} '
+                     f'versions_data={loader.metadata_version_number} '
+                     f'versions_schema={SCHEMA_VERSION} '
+                     f'versions_script={SCRIPT_VERSION}')
+
+        base_filename_template = output_filename_template(
+            args.file_prefix, args.cantabular_version, args.metadata_master_version,
+            self.time_now.strftime('%Y%m%d'), args.build_number)
+        for content_type, description in [(FILE_CONTENT_TYPE_DATASET, 'dataset'),
+                                          (FILE_CONTENT_TYPE_TABLES, 'table'),
+                                          (FILE_CONTENT_TYPE_SERVICE, 'service')]:
+            key = keys[content_type]
+            filename = os.path.join(self.output_dir, base_filename_template.format(content_type))
+            with measure(self.profiler, 'write', os.path.basename(filename)) as entry:
+                self.remaining_uses[key] -= 1
+                if self.remaining_uses[key] and not isinstance(contents[content_type], str):
+                    self.serialised[key] = json.dumps(contents[content_type], indent=4,
+                                                      cls=SharedJSONEncoder)
+                    contents[content_type] = self.serialised[key]
+                elif not self.remaining_uses[key]:
+                    self.serialised.pop(key, None)
+
+                with open(filename, 'w') as jsonfile:
+                    if isinstance(contents[content_type], str):
+                        jsonfile.write(contents[content_type])
+                    else:
+                        json.dump(contents[content_type], jsonfile, indent=4,
+                                  cls=SharedJSONEncoder)
+                entry['bytes'] = os.path.getsize(filename)
+            logging.info(f'Written {description} metadata file to: {filename}')
 
 
 def output_filename_template(prefix, cantabular_version, metadata_master_version, todays_date,
@@ -272,7 +557,14 @@ def build_ctb_variables(classifications, cat_labels):
 
     A variable is a built-in concept in cantabular-metadata, and is equivalent to an ONS
     classification.
+
+    Classifications with identical categories share the same category labels object. The labels
+    for each such object are held in LazySharedJSON values, so that they are only encoded once when
+    the output is serialised. The dictionaries of labels are only created when they are encoded
+    and are then discarded, so only the labels of one classification are expanded at a time. The
+    encoded text is discarded once it has been written for every classification that shares it.
     """
+    shared_cat_labels = {}
     ctb_variables = []
     for mnemonic, classification in classifications.items():
         # Only export public variables.
@@ -280,12 +572,26 @@ def build_ctb_variables(classifications, cat_labels):
             logging.info(f'Dropped non public classification: {mnemonic}')
             continue
 
+        labels = cat_labels.get(mnemonic, None)
+        if labels is not None:
+            if id(labels) not in shared_cat_labels:
+                shared_cat_labels[id(labels)] = Bilingual(
+                    LazySharedJSON(labels.english),
+                    LazySharedJSON(labels.welsh) if labels.has_welsh() else None,
+                    default_to_english=False)
+                labels = shared_cat_labels[id(labels)]
+            else:
+                # The labels are encoded once for each classification that uses them.
+                labels = shared_cat_labels[id(labels)]
+                for shared in filter(None, [labels.english(), labels.welsh()]):
+                    shared.uses += 1
+
         ctb_class = {
             'name': classification.private['Codebook_Mnemonic'],
             'label': classification.private['Classification_Label'],
             'description': classification.private['Variable_Description'],
             'meta': classification,
-            'catLabels': cat_labels.get(mnemonic, None)
+            'catLabels': labels
         }
         ctb_variables.append(BilingualDict(ctb_class))
         logging.debug(f'Loaded metadata for Cantabular variable: {mnemonic}')
@@ -0,0 +1,105 @@
+"""Memoise the values of properties separately for each object."""
+import threading
+from functools import wraps
+
+_MISSING = object()
+
+
+class MemoizedProperty(property):
+    """
+    Property whose value is computed on first access and then reused.
+
+    The value is stored in the cache attribute of the object, which must be a MemoCache. Each
+    object has its own cache, so values are never shared between objects and are released along
+    with the object.
+    """
+
+    def __init__(self, fget):
+        """Initialise MemoizedProperty object."""
+        name = fget.__name__
+
+        @wraps(fget)
+        def get(instance):
+            return instance.cache.get(name, lambda: fget(instance))
+
+        super().__init__(get, doc=fget.__doc__)
+
+
+class MemoCache:
+    """
+    MemoCache holds the memoised property values of a single object.
+
+    dependencies maps the name of each property to the names of the properties that its value is
+    computed from. It is used to discard values that depend on a value which is cleared. If a
+    profiler is specified then the time taken to compute each value is recorded by it, using an
+    ons_csv_to_ctb_json_profile.Profiler. If on_store is specified then on_store(name) is called
+    whenever a value is stored, whether it was computed or set.
+
+    Values can be requested concurrently from multiple threads. Each value is computed by only one
+    thread, while any other threads that request it wait for it to be computed. A value that has
+    been computed is returned without locking, so readers do not contend with each other. Values
+    must not be cleared while they are being computed.
+    """
+
+    def __init__(self, dependencies=None, profiler=None, on_store=None):
+        """Initialise MemoCache object."""
+        self.values = {}
+        self.dependencies = dependencies if dependencies else {}
+        self.profiler = profiler
+        self.on_store = on_store
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def __contains__(self, name):
+        """Return True if a value is held for the named property."""
+        return name in self.values
+
+    def get(self, name, compute):
+        """Return the value for the named property, calling compute() to obtain it if required."""
+        value = self.values.get(name, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        # The lock is reentrant so that a property which depends on itself fails with a
+        # RecursionError, as it would without locking, rather than deadlocking.
+        with self._locks_lock:
+            lock = self._locks.setdefault(name, threading.RLock())
+        with lock:
+            # Another thread may have computed the value while this one was waiting for the lock.
+            if name in self.values:
+                return self.values[name]
+            value = self.profiler.call('stage', name, compute) if self.profiler else compute()
+            self.set(name, value)
+            return value
+
+    def set(self, name, value):
+        """Store the value of the named property, replacing any existing value."""
+        self.values[name] = value
+        if self.on_store:
+            self.on_store(name)
+
+    def clear(self, *names):
+        """
+        Discard memoised values so that they are computed again when they are next accessed.
+
+        If no names are specified then all values are discarded. Otherwise the values of the named
+        properties, and of every property that depends on them directly or indirectly, are
+        discarded. The names of the discarded properties are returned.
+        """
+        if not names:
+            cleared = set(self.values)
+            self.values.clear()
+            return cleared
+
+        stale = set(names)
+        while True:
+            dependents = {name for name, inputs in self.dependencies.items()
+                          if name not in stale and stale.intersection(inputs)}
+            if not dependents:
+                break
+            stale |= dependents
+
+        cleared = stale.intersection(self.values)
+        for name in cleared:
+            del self.values[name]
+        return cleared
@@ -0,0 +1,69 @@
+"""Read input files into memory concurrently, before they are parsed."""
+import io
+from concurrent.futures import ThreadPoolExecutor
+from ons_csv_to_ctb_json_read import Reader
+
+# Reading files is I/O bound, so more threads than CPUs can be used. This mainly helps when the
+# files are on a network filesystem with a high latency.
+PREFETCH_THREADS = 8
+
+
+def read_bytes(filename):
+    """Return the contents of a file as bytes."""
+    with open(filename, 'rb') as file:
+        return file.read()
+
+
+class Prefetcher:
+    """
+    Prefetcher reads a set of files into memory using a pool of threads.
+
+    All the files are read in the background as soon as the Prefetcher is created. When a file
+    is opened using open(), the caller only waits for that file to be read, so the remaining
+    files are read while earlier files are being parsed. The contents of each file are discarded
+    once it has been read, or when discard() is called for files that will not be read.
+    """
+
+    def __init__(self, filenames, threads=PREFETCH_THREADS):
+        """Initialise Prefetcher object and start reading the files."""
+        executor = ThreadPoolExecutor(max_workers=threads)
+        self.pending = {filename: executor.submit(read_bytes, filename) for filename in filenames}
+        # The threads exit once all the files have been read.
+        executor.shutdown(wait=False)
+
+    def read(self, filename):
+        """
+        Return the contents of a file as bytes, using the prefetched contents if available.
+
+        Files that were not prefetched, or that have already been read, are read from disk. Any
+        error encountered when reading the file is raised here.
+        """
+        future = self.pending.pop(filename, None)
+        if future is None:
+            return read_bytes(filename)
+        return future.result()
+
+    def discard(self, filenames):
+        """Discard the prefetched contents of files, cancelling them if they are still pending."""
+        for filename in filenames:
+            future = self.pending.pop(filename, None)
+            if future is not None:
+                future.cancel()
+
+    def open(self, filename, newline=None, encoding=None):
+        """Open a file for reading as text, using the prefetched contents if available."""
+        return io.TextIOWrapper(io.BytesIO(self.read(filename)), encoding=encoding,
+                                newline=newline)
+
+
+class PrefetchedReader(Reader):
+    """PrefetchedReader is a Reader which opens its file using a Prefetcher."""
+
+    def __init__(self, *args, prefetcher, **kwargs):
+        """Initialise PrefetchedReader object."""
+        super().__init__(*args, **kwargs)
+        self.prefetcher = prefetcher
+
+    def open_file(self):
+        """Open the file for reading as text, using the prefetched contents if available."""
+        return self.prefetcher.open(self.filename, newline='', encoding='utf-8-sig')
@@ -0,0 +1,229 @@
+"""Record where the time is spent when converting the metadata, for the --profile option."""
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# time.thread_time() was added in Python 3.7. The CPU time of the whole process is used on older
+# versions, which overstates the CPU time of stages that are loaded concurrently.
+thread_time = getattr(time, 'thread_time', time.process_time)
+
+# Number of allocation sites listed for each step when memory usage is traced.
+MEMORY_TOP_SITES = 5
+
+
+def object_count(value):
+    """Return the number of objects in a value, or None if it is not a collection."""
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+@contextmanager
+def measure(profiler, kind, name):
+    """
+    Record a step with profiler, if it is not None.
+
+    The entry for the step is yielded. If there is no profiler then an empty dictionary is yielded
+    instead, so that statistics can be added to it regardless.
+    """
+    if profiler:
+        with profiler.measure(kind, name) as entry:
+            yield entry
+    else:
+        yield {}
+
+
+def profiled_call(profiler, kind, name, func, *args):
+    """Call func with args, recording the step with profiler if it is not None."""
+    if profiler:
+        return profiler.call(kind, name, func, *args)
+    return func(*args)
+
+
+class MemoryTracker:
+    """
+    MemoryTracker uses tracemalloc to record the memory allocated by each step of a conversion.
+
+    For each step the net memory allocated, the peak memory traced while it was in progress and
+    the source lines that allocated the most memory are recorded. The net memory of a step
+    excludes the memory allocated by steps nested within it, but the peak memory and allocation
+    sites include them. Peak memory for each step is only available from Python 3.9, which added
+    tracemalloc.reset_peak(). Memory is traced for the whole process, so the figures are only
+    attributed accurately to each step when the steps are not run concurrently.
+    """
+
+    def __init__(self):
+        """Initialise MemoryTracker object and start tracing memory allocations."""
+        tracemalloc.start()
+        self.peak = 0
+        self.excluded = [tracemalloc.Filter(False, tracemalloc.__file__),
+                         tracemalloc.Filter(False, __file__)]
+
+    def sample_peak(self):
+        """Return the peak traced memory since the previous sample, or since tracing started."""
+        _, peak = tracemalloc.get_traced_memory()
+        self.peak = max(self.peak, peak)
+        self.reset_peak()
+        return peak
+
+    @staticmethod
+    def reset_peak():
+        """Reset the peak traced memory to the current traced memory, if this is supported."""
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+
+    def begin(self, stack):
+        """Return the memory state at the start of the innermost step on the stack."""
+        peak = self.sample_peak()
+        if len(stack) > 1:
+            stack[-2]['peak'] = max(stack[-2]['peak'], peak)
+        current, _ = tracemalloc.get_traced_memory()
+        stack[-1]['peak'] = current
+        return current, tracemalloc.take_snapshot()
+
+    def end(self, stack, state):
+        """Add the memory statistics to the entry of the innermost step on the stack."""
+        current, _ = tracemalloc.get_traced_memory()
+        start_memory, start_snapshot = state
+        step = stack[-1]
+        step['peak'] = max(step['peak'], self.sample_peak())
+        net_memory = current - start_memory
+        if len(stack) > 1:
+            stack[-2]['peak'] = max(stack[-2]['peak'], step['peak'])
+            stack[-2]['memory'] += net_memory
+
+        stats = tracemalloc.take_snapshot().filter_traces(self.excluded).compare_to(
+            start_snapshot.filter_traces(self.excluded), 'lineno')
+        step['entry'].update({
+            'memory_net': net_memory - step['memory'],
+            'memory_peak': step['peak'] if hasattr(tracemalloc, 'reset_peak') else None,
+            'memory_sites': [{'site': f'{os.path.basename(stat.traceback[0].filename)}:'
+                                      f'{stat.traceback[0].lineno}',
+                              'size': stat.size_diff,
+                              'count': stat.count_diff}
+                             for stat in stats[:MEMORY_TOP_SITES] if stat.size_diff > 0],
+        })
+        # The memory used to compare the snapshots is not attributed to any step.
+        self.reset_peak()
+
+    def stop(self):
+        """Stop tracing memory allocations."""
+        self.sample_peak()
+        tracemalloc.stop()
+
+
+class Profiler:
+    """
+    Profiler records the wall time, CPU time and other statistics for each step of a conversion.
+
+    Each step is recorded as an entry with a kind, such as stage, build or write, and a name. The
+    times of an entry exclude the times of any steps that are nested within it, e.g. a stage that
+    is loaded on first access by another stage. Steps can be recorded concurrently from several
+    threads, with nesting tracked separately for each thread. The entries are listed in the order
+    in which the steps started. If memory is True then the memory allocated by each step is also
+    recorded, using a MemoryTracker.
+    """
+
+    def __init__(self, memory=False):
+        """Initialise Profiler object."""
+        self.memory = MemoryTracker() if memory else None
+        self.entries = []
+        self.start_wall_time = time.perf_counter()
+        self.start_cpu_time = time.process_time()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        """Return the stack of steps that are in progress in the current thread."""
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def measure(self, kind, name):
+        """
+        Record the time taken by the steps executed within the context.
+
+        The entry for the step is yielded, so that other statistics can be added to it.
+        """
+        entry = {'kind': kind, 'name': name, 'wall_time': None, 'cpu_time': None}
+        with self._lock:
+            self.entries.append(entry)
+        # Each step on the stack holds its entry and the totals for the steps nested within it.
+        stack = self._stack()
+        stack.append({'entry': entry, 'wall_time': 0.0, 'cpu_time': 0.0, 'memory': 0})
+        memory_state = self.memory.begin(stack) if self.memory else None
+        start_wall_time, start_cpu_time = time.perf_counter(), thread_time()
+        try:
+            yield entry
+        finally:
+            wall_time = time.perf_counter() - start_wall_time
+            cpu_time = thread_time() - start_cpu_time
+            if self.memory:
+                self.memory.end(stack, memory_state)
+            step = stack.pop()
+            entry['wall_time'] = wall_time - step['wall_time']
+            entry['cpu_time'] = cpu_time - step['cpu_time']
+            if stack:
+                stack[-1]['wall_time'] += wall_time
+                stack[-1]['cpu_time'] += cpu_time
+
+    def call(self, kind, name, func, *args):
+        """Call func with args, recording the time taken and the number of objects returned."""
+        with self.measure(kind, name) as entry:
+            value = func(*args)
+            entry['objects'] = object_count(value)
+        return value
+
+    def count_rows(self, reader, rows):
+        """
+        Yield the rows from a Reader, counting them along with the rows it dropped.
+
+        Rows are dropped by the dataset filter and, in best effort mode, when they fail validation.
+        The counts are added to the innermost step in progress when the rows have been read.
+        """
+        rows_read = 0
+        for row in rows:
+            rows_read += 1
+            yield row
+
+        stack = self._stack()
+        if stack:
+            entry = stack[-1]['entry']
+            rows_dropped = reader.dropped_by_dataset_filter + reader.dropped_by_validation
+            counts = {'rows_read': rows_read,
+                      'rows_dropped': rows_dropped,
+                      'errors': reader.error_count}
+            for name, count in counts.items():
+                entry[name] = entry.get(name, 0) + count
+            entry.setdefault('files', {})[os.path.basename(reader.filename)] = counts
+
+    def report(self):
+        """
+        Return the entries along with the total time since the Profiler was created.
+
+        If memory is traced then the peak traced memory is also included.
+        """
+        report = {
+            'wall_time': time.perf_counter() - self.start_wall_time,
+            'cpu_time': time.process_time() - self.start_cpu_time,
+        }
+        if self.memory:
+            self.memory.sample_peak()
+            report['memory_peak'] = self.memory.peak
+        report['entries'] = self.entries
+        return report
+
+    def write_report(self, filename):
+        """Write the report to a JSON file."""
+        with open(filename, 'w') as jsonfile:
+            json.dump(self.report(), jsonfile, indent=4)
+
+    def stop(self):
+        """Stop tracing memory allocations, if they are being traced."""
+        if self.memory:
+            self.memory.stop()
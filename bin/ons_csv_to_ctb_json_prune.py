@@ -0,0 +1,53 @@
+"""Restrict the output to the metadata that are referenced by the loaded datasets."""
+import logging
+import os
+from ons_csv_to_ctb_json_columns import CATEGORY_SHARD_DIRECTORY
+from ons_csv_to_ctb_json_load import Loader
+
+
+class PrunedLoader(Loader):
+    """
+    PrunedLoader only outputs the metadata that are referenced by the datasets that it loads.
+
+    When prune() is called, the databases of the loaded datasets are found, along with all the
+    classifications in those databases. The classifications, databases and categories are then
+    restricted to these. If the categories have not already been loaded then the rows of
+    Category.csv for other classifications are skipped without being validated, which is where
+    most of the time is saved when only a few datasets are kept by the dataset filter.
+
+    The other metadata are still loaded in full, since they are needed to validate the datasets.
+    The variables, topics and questions only appear in the output as part of the classifications,
+    so they are pruned along with them.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Initialise PrunedLoader object."""
+        super().__init__(*args, **kwargs)
+        self.category_classifications = None
+
+    def iter_file(self, filename, columns, unique_combo_fields=None):
+        """Read data from a CSV file, skipping the categories of pruned classifications."""
+        is_shard = os.path.dirname(filename) == CATEGORY_SHARD_DIRECTORY
+        is_category_file = filename == 'Category.csv' or is_shard
+        if is_category_file and self.category_classifications is not None:
+            columns = [c._replace(keep_values=self.category_classifications)
+                       if c.name == 'Classification_Mnemonic' else c for c in columns]
+        return super().iter_file(filename, columns, unique_combo_fields)
+
+    def prune(self):
+        """Restrict the classifications, databases and categories to those that are referenced."""
+        databases = {dataset.private['Database_Mnemonic'] for dataset in self.datasets.values()}
+        classifications = set()
+        for database_mnemonic in databases:
+            classifications.update(self.databases[database_mnemonic].private['Classifications'])
+
+        logging.info(f'Pruned metadata to {len(classifications)} of {len(self.classifications)} '
+                     f'classifications and {len(databases)} of {len(self.databases)} databases '
+                     f'referenced by {len(self.datasets)} datasets')
+
+        self.category_classifications = frozenset(classifications)
+        for name, keep in [('categories', classifications), ('classifications', classifications),
+                           ('databases', databases)]:
+            values = getattr(self, name)
+            self.cache.set(name, {mnemonic: value for mnemonic, value in values.items()
+                                  if mnemonic in keep})
@@ -1,24 +1,144 @@
 """Load metadata from CSV files and export in JSON format."""
 import csv
 import logging
+import sys
 from collections import namedtuple
+from operator import itemgetter
 
-Column = namedtuple('Column', 'name unique validate_fn required')
+# If intern is True then values in the column are interned using sys.intern, so that repeated
+# values such as mnemonics share a single string object. If keep_values is not None then rows
+# whose value in the column is not one of keep_values are skipped before they are validated.
+Column = namedtuple('Column', 'name unique validate_fn required value_type intern keep_values')
+Column.__new__.__defaults__ = (None,)
 
 
-def required(name, unique=False, validate_fn=None):
+def required(name, unique=False, validate_fn=None, value_type=None, intern=False):
     """Return a Column with required set to True."""
-    return Column(name, unique, validate_fn, required=True)
+    return Column(name, unique, validate_fn, required=True, value_type=value_type, intern=intern)
 
 
-def optional(name, unique=False, validate_fn=None):
+def optional(name, unique=False, validate_fn=None, value_type=None, intern=False):
     """Return a Column with required set to False."""
-    return Column(name, unique, validate_fn, required=False)
+    return Column(name, unique, validate_fn, required=False, value_type=value_type, intern=intern)
+
+
+def unsigned_int(string):
+    """Convert a string of digits to an int. A ValueError is raised if the string is invalid."""
+    if not string.isnumeric():
+        raise ValueError(f'invalid unsigned integer: {string}')
+    return int(string)
 
 
 Row = namedtuple('Row', 'data row_num')
 
 
+class RowData:
+    """
+    RowData is a compact mapping of column names to the values in a single row.
+
+    The mapping of column names to positions is shared by all the rows read from a file and the
+    values are held in a tuple, which uses far less memory than a dict for each row. The first
+    time that a row is modified its contents are copied to a private dict, so rows that are
+    reshaped using pop(), del and item assignment behave exactly like a dict.
+    """
+
+    __slots__ = ('_index', '_values')
+
+    def __init__(self, index, values):
+        """Initialise RowData object from a shared column index and a tuple of values."""
+        self._index = index
+        self._values = values
+
+    def _as_dict(self):
+        """Copy the values to a private dict, if this has not already been done, and return it."""
+        if self._index is not None:
+            self._values = dict(zip(self._index, self._values))
+            self._index = None
+        return self._values
+
+    def __getitem__(self, key):
+        """Return the value for key."""
+        if self._index is None:
+            return self._values[key]
+        return self._values[self._index[key]]
+
+    def __setitem__(self, key, value):
+        """Set the value for key."""
+        self._as_dict()[key] = value
+
+    def __delitem__(self, key):
+        """Remove key."""
+        del self._as_dict()[key]
+
+    def __contains__(self, key):
+        """Check whether key is present."""
+        if self._index is None:
+            return key in self._values
+        return key in self._index
+
+    def __iter__(self):
+        """Iterate over the keys."""
+        if self._index is None:
+            return iter(self._values)
+        return iter(self._index)
+
+    def __len__(self):
+        """Return the number of keys."""
+        return len(self._values)
+
+    def __eq__(self, other):
+        """Compare with another RowData or dict."""
+        if isinstance(other, (RowData, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __repr__(self):
+        """Return a representation of the row in dict format."""
+        return f'RowData({dict(self.items())!r})'
+
+    def keys(self):
+        """Return the keys."""
+        if self._index is None:
+            return self._values.keys()
+        return self._index.keys()
+
+    def values(self):
+        """Return the values."""
+        if self._index is None:
+            return self._values.values()
+        return iter(self._values)
+
+    def items(self):
+        """Return (key, value) pairs."""
+        if self._index is None:
+            return self._values.items()
+        return zip(self._index, self._values)
+
+    def get(self, key, default=None):
+        """Return the value for key if key is present, else default."""
+        if key in self:
+            return self[key]
+        return default
+
+    def pop(self, key, *default):
+        """Remove key and return its value."""
+        return self._as_dict().pop(key, *default)
+
+
+def read_fieldnames(filename):
+    """Read the header row of a CSV file without reading the rest of the file."""
+    with open(filename, newline='', encoding='utf-8-sig') as csvfile:
+        return next(csv.reader(csvfile), [])
+
+
+def projection(indices):
+    """Return a function that extracts the fields at the specified indices from a row."""
+    if len(indices) == 1:
+        index = indices[0]
+        return lambda fields: (fields[index],)
+    return itemgetter(*indices)
+
+
 class Reader:
     """Reader is used to read a CSV file containing metadata."""
 
@@ -27,112 +147,247 @@ class Reader:
         """Initialise Reader object."""
         self.filename = filename
         self.columns = columns
-        self.expected_columns = {c.name for c in columns}
         self.unique_column_values = {c.name: set() for c in columns if c.unique}
         self.unique_combo_fields = unique_combo_fields
-        if unique_combo_fields:
-            self.unique_combos = set()
-        self.recoverable_error = recoverable_error
+        self.error_count = 0
+
+        def report_error(msg):
+            self.error_count += 1
+            recoverable_error(msg)
+
+        self.recoverable_error = report_error
+        # Mapping of expected column names to positions in each row. It is populated when the
+        # header is read.
+        self.column_index = {}
+        # Numbers of records dropped by the dataset filter and, in best effort mode, because they
+        # failed validation. They are set when the file is read.
+        self.dropped_by_dataset_filter = 0
+        self.dropped_by_validation = 0
         # Split the dataset_filter string at this point to ensure consistent handling of empty
         # values e.g. ", ,A".
         self.dataset_filters = tuple(df.strip() for df in dataset_filter.split(',') if df.strip())
 
     def read(self):
         """
-        Read a file as a dictionary with each value corresponding to a list of rows.
+        Read a file and return a list of validated rows.
+
+        Each row is returned as an ons_csv_to_ctb_json_read.Row object containing a dictionary of
+        the expected fields and the corresponding line number.
+        """
+        return list(self.rows())
+
+    def rows(self):
+        """
+        Read a file and yield the validated rows one at a time.
 
-        Each row is converted to a dictionary, and added to the returned dictionary using the "key"
-        field in the row as a key.
+        This behaves in the same way as read() but the rows are not collected into a list, so the
+        caller can process large files without holding every row in memory.
         """
-        data = []
-        with open(self.filename, newline='', encoding='utf-8-sig') as csvfile:
-            reader = csv.DictReader(csvfile)
-            header_set = set(reader.fieldnames)
+        with self.open_file() as csvfile:
+            reader = csv.reader(csvfile)
+            fieldnames = next(reader, [])
+            get_fields = projection(self.read_header(fieldnames))
+            dataset_mnemonic_index = self.column_index.get('Dataset_Mnemonic')
+            num_fields = len(fieldnames)
+            validate_row = self.compile_validator()
+            keep_row = self.compile_row_filter()
 
-            missing_columns = self.expected_columns - header_set
-            if missing_columns:
-                raise ValueError(f'Reading {self.filename}: missing expected columns: '
-                                 f'{", ".join(sorted(missing_columns))}')
+            self.dropped_by_dataset_filter = 0
+            self.dropped_by_validation = 0
 
-            dropped_by_dataset_filter = 0
+            row_num = 1
+            for fields in reader:
+                # Blank lines are skipped and are not included in the row numbering.
+                if not fields:
+                    continue
+                row_num += 1
 
-            for row_num, row in enumerate(reader, 2):
-                if None in row:
+                if len(fields) > num_fields:
                     raise ValueError(f'Reading {self.filename}: too many fields on row {row_num}')
-                if None in row.values():
+                if len(fields) < num_fields:
                     raise ValueError(f'Reading {self.filename}: too few fields on row {row_num}')
 
-                for k in list(row.keys()):
-                    if k not in self.expected_columns:
-                        del row[k]
+                values = get_fields(fields)
+
+                if not any(values):
+                    continue
 
-                if not [k for k in row if row[k]]:
+                if self.dataset_filters and dataset_mnemonic_index is not None and not \
+                        values[dataset_mnemonic_index].startswith(self.dataset_filters):
+                    self.dropped_by_dataset_filter += 1
                     continue
 
-                if self.dataset_filters and 'Dataset_Mnemonic' in row and not \
-                        row['Dataset_Mnemonic'].startswith(self.dataset_filters):
-                    dropped_by_dataset_filter += 1
+                values = [v.strip() for v in values]
+                if keep_row and not keep_row(values):
                     continue
 
-                if not self.validate_row(row, row_num):
+                if not validate_row(values, row_num):
+                    self.dropped_by_validation += 1
                     logging.warning(f'Reading {self.filename}:{row_num} dropping record')
                     continue
 
-                for k in row.keys():
-                    if row[k] == '':
-                        row[k] = None
+                yield Row(RowData(self.column_index,
+                                  tuple([None if v == '' else v for v in values])),
+                          row_num)
 
-                data.append(Row(row, row_num))
+        self.log_dropped_by_dataset_filter(self.dropped_by_dataset_filter)
 
+    def open_file(self):
+        """Open the file for reading as text."""
+        return open(self.filename, newline='', encoding='utf-8-sig')
+
+    def read_header(self, fieldnames):
+        """
+        Check the header and identify the position of each expected column.
+
+        column_index is populated and a list of the positions of the expected columns in each
+        row is returned.
+        """
+        expected_columns = {c.name for c in self.columns}
+
+        # Identify the position of each expected column in the header. If a column name is
+        # repeated then the last occurrence is used, which is consistent with csv.DictReader.
+        column_indices = {name: index for index, name in enumerate(fieldnames)
+                          if name in expected_columns}
+
+        missing_columns = expected_columns - column_indices.keys()
+        if missing_columns:
+            raise ValueError(f'Reading {self.filename}: missing expected columns: '
+                             f'{", ".join(sorted(missing_columns))}')
+
+        # Only the expected fields are extracted from each row. They are kept in the order in
+        # which they appear in the file.
+        names = sorted(column_indices, key=column_indices.get)
+        self.column_index = {name: position for position, name in enumerate(names)}
+        return [column_indices[name] for name in names]
+
+    def log_dropped_by_dataset_filter(self, dropped_by_dataset_filter):
+        """Log the number of records that were dropped by the dataset filter, if any."""
         if dropped_by_dataset_filter:
             logging.info(f'Reading {self.filename} dropped {dropped_by_dataset_filter} records '
                          'related to datasets with Dataset_Mnemonics that do not start with one '
                          f'of: {list(self.dataset_filters)}')
 
-        return data
+    def compile_row_filter(self):
+        """
+        Return a function that checks whether a row should be kept, or None to keep every row.
 
-    def validate_row(self, row, row_num):
-        """Validate the fields in a row."""
-        keep_row = True
-        for column in self.columns:
-            row[column.name] = row[column.name].strip()
+        A row is kept if the value of each column that has keep_values is one of those values. The
+        returned function takes a list of stripped values in the order given by column_index.
+        """
+        keep_values = [(self.column_index[c.name], c.keep_values) for c in self.columns
+                       if c.keep_values is not None]
+        if not keep_values:
+            return None
 
-            if column.required and not row[column.name]:
-                self.recoverable_error(f'Reading {self.filename}:{row_num} no value supplied '
-                                       f'for required field {column.name}')
-                keep_row = False
-                continue
+        def keep_row(values):
+            return all(values[position] in keep for position, keep in keep_values)
 
-            if column.unique:
-                # Ensure values are case-insensitive unique
-                lower_case_name = row[column.name].lower()
-                if lower_case_name in self.unique_column_values[column.name]:
-                    self.recoverable_error(f'Reading {self.filename}:{row_num} duplicate '
-                                           f'value {row[column.name]} for {column.name}')
-                    keep_row = False
-                    continue
+        return keep_row
+
+    def compile_validator(self):
+        """
+        Return a function that validates the fields in a row.
+
+        The column specifications are compiled into a single function for the file once the
+        header has been read. A check is only created for each column that is required, unique,
+        interned or has a validate_fn or value_type, so other columns add no per-row work.
 
-                self.unique_column_values[column.name].add(lower_case_name)
+        The returned function takes a list of values, in the order given by column_index, and
+        the row number. Values of columns with a value_type are converted in place, values of
+        interned columns are replaced by the interned string and invalid optional values are
+        cleared. It returns False if the row should be dropped.
+        """
+        checked_columns = [c for c in self.columns
+                           if c.required or c.unique or c.validate_fn or c.value_type or c.intern]
+        checks = [self.compile_column_check(c, self.column_index[c.name]) for c in checked_columns]
+
+        # The combination is only checked and recorded for rows that pass the column checks, so
+        # that a dropped row does not cause a later row with the same combination to be dropped.
+        check_combo = self.compile_unique_combo_check() if self.unique_combo_fields else None
 
-            if row[column.name] and column.validate_fn and not \
-                    column.validate_fn(row[column.name]):
-                self.recoverable_error(f'Reading {self.filename}:{row_num} invalid value '
-                                       f'{row[column.name]} for {column.name}')
-                if column.required:
+        def validate_row(values, row_num):
+            keep_row = True
+            for check in checks:
+                if not check(values, row_num):
                     keep_row = False
-                    continue
-                logging.warning(f'Reading {self.filename}:{row_num} ignoring field {column.name}')
-                row[column.name] = ""
+            if keep_row and check_combo:
+                return check_combo(values, row_num)
+            return keep_row
 
-        if self.unique_combo_fields and keep_row:
-            combo = tuple([row[f] for f in self.unique_combo_fields])
-            if combo in self.unique_combos:
-                self.recoverable_error(f'Reading {self.filename}:{row_num} duplicate '
-                                       f'value combo {"/".join(combo)} for '
-                                       f'{"/".join(self.unique_combo_fields)}')
+        return validate_row
 
-                keep_row = False
-            else:
-                self.unique_combos.add(combo)
+    def compile_column_check(self, column, position):
+        """Return a function that performs the checks for a single column."""
+        name = column.name
+        required_value = column.required
+        unique_values = self.unique_column_values.get(name)
+        validate_fn = column.validate_fn
+        value_type = column.value_type
+        intern_value = column.intern
+        filename = self.filename
+        recoverable_error = self.recoverable_error
 
-        return keep_row
+        def invalid_value(values, row_num, value):
+            recoverable_error(f'Reading {filename}:{row_num} invalid value '
+                              f'{value} for {name}')
+            if required_value:
+                return False
+            logging.warning(f'Reading {filename}:{row_num} ignoring field {name}')
+            values[position] = ""
+            return True
+
+        def check(values, row_num):
+            value = values[position]
+
+            if required_value and not value:
+                recoverable_error(f'Reading {filename}:{row_num} no value supplied '
+                                  f'for required field {name}')
+                return False
+
+            if unique_values is not None:
+                # Ensure values are case-insensitive unique
+                lower_case_name = value.lower()
+                if lower_case_name in unique_values:
+                    recoverable_error(f'Reading {filename}:{row_num} duplicate '
+                                      f'value {value} for {name}')
+                    return False
+
+                unique_values.add(lower_case_name)
+
+            if value and validate_fn and not validate_fn(value):
+                return invalid_value(values, row_num, value)
+
+            # Convert the value to the column type, treating conversion failures in the same way
+            # as a failed validate_fn.
+            if value and value_type:
+                try:
+                    values[position] = value_type(value)
+                except ValueError:
+                    return invalid_value(values, row_num, value)
+            elif value and intern_value:
+                values[position] = sys.intern(value)
+
+            return True
+
+        return check
+
+    def compile_unique_combo_check(self):
+        """Return a function that checks that the unique_combo_fields values are unique."""
+        get_combo = projection([self.column_index[f] for f in self.unique_combo_fields])
+        description = "/".join(self.unique_combo_fields)
+        unique_combos = set()
+        filename = self.filename
+        recoverable_error = self.recoverable_error
+
+        def check(values, row_num):
+            combo = get_combo(values)
+            if combo in unique_combos:
+                recoverable_error(f'Reading {filename}:{row_num} duplicate '
+                                  f'value combo {"/".join(combo)} for {description}')
+                return False
+
+            unique_combos.add(combo)
+            return True
+
+        return check
@@ -0,0 +1,98 @@
+"""Save the fully loaded metadata to a snapshot file and restore it in a later run."""
+import logging
+import os
+import pickle
+import tempfile
+from ons_csv_to_ctb_json_cache import CacheKey, file_digest
+from ons_csv_to_ctb_json_columns import FILE_COLUMNS, all_source_filenames
+from ons_csv_to_ctb_json_incremental import STAGE_MODULES
+from ons_csv_to_ctb_json_stages import OUTPUT_STAGES
+
+# Every snapshot file starts with SNAPSHOT_MAGIC followed by the format version. Increment
+# SNAPSHOT_FORMAT_VERSION whenever the structure of snapshot files changes.
+SNAPSHOT_MAGIC = b'CTB-METADATA-SNAPSHOT\n'
+SNAPSHOT_FORMAT_VERSION = 1
+
+
+def snapshot_inputs(loader):
+    """Return the name and digest of each source file and geography file used by a Loader."""
+    inputs = [(f, file_digest(loader.full_filename(f)))
+              for f in all_source_filenames(loader.input_directory, FILE_COLUMNS)]
+    inputs.extend((os.path.basename(f), file_digest(f)) for f in loader.geography_files)
+    return inputs
+
+
+def snapshot_settings(loader):
+    """Return a key for the settings and code, other than the inputs, that affect the metadata."""
+    key = CacheKey('snapshot', loader.dataset_filter, type(loader).__name__)
+    key.add_modules(*STAGE_MODULES, type(loader).__module__)
+    return key.hexdigest()
+
+
+def save_snapshot(loader, filename):
+    """
+    Save the metadata used to build the output files to a snapshot file.
+
+    All the metadata are loaded if they have not already been loaded. No snapshot is saved if
+    any errors were encountered in best effort mode, since they would not be reported again when
+    the snapshot is restored. The file is written atomically. Returns True if it was saved.
+    """
+    values = {name: getattr(loader, name) for name in OUTPUT_STAGES}
+    if loader.error_count():
+        logging.warning(f'Not saving snapshot to {filename} as errors were encountered')
+        return False
+
+    header = {
+        'inputs': snapshot_inputs(loader),
+        'settings': snapshot_settings(loader),
+    }
+    file_descriptor, temp_filename = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(filename)), suffix='.tmp')
+    try:
+        with os.fdopen(file_descriptor, 'wb') as file:
+            file.write(SNAPSHOT_MAGIC)
+            for part in (SNAPSHOT_FORMAT_VERSION, header, values):
+                pickle.dump(part, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_filename, filename)
+    except BaseException:
+        os.unlink(temp_filename)
+        raise
+
+    logging.info(f'Saved snapshot of loaded metadata to: {filename}')
+    return True
+
+
+def restore_snapshot(loader, filename):
+    """
+    Restore the metadata used to build the output files from a snapshot file.
+
+    A ValueError is raised if the file is not a snapshot with the current format version, or if
+    the source files, geography files, dataset filter, type of loader (e.g. a PrunedLoader) or
+    loader code differ from those used to create it. Snapshot files are unpickled, so they must
+    only be restored from trusted sources.
+    """
+    with open(filename, 'rb') as file:
+        if file.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+            raise ValueError(f'{filename} is not a metadata snapshot file')
+        version = pickle.load(file)
+        if version != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f'{filename} has snapshot format version {version} but version '
+                             f'{SNAPSHOT_FORMAT_VERSION} is required')
+
+        header = pickle.load(file)
+        inputs = snapshot_inputs(loader)
+        if header['inputs'] != inputs:
+            saved = dict(header['inputs'])
+            changed = [name for name, digest in inputs if saved.get(name) != digest]
+            changed.extend(name for name in saved if name not in dict(inputs))
+            raise ValueError(f'{filename} is stale: input files have changed: '
+                             f'{", ".join(changed) if changed else "order of geography files"}')
+        if header['settings'] != snapshot_settings(loader):
+            raise ValueError(f'{filename} was created with a different dataset filter, pruning '
+                             'setting or version of the conversion code')
+
+        values = pickle.load(file)
+
+    for name, value in values.items():
+        loader.cache.set(name, value)
+    logging.info(f'Restored loaded metadata from snapshot: {filename}')
@@ -0,0 +1,160 @@
+"""Load Loader properties concurrently, in an order determined by their dependencies."""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from ons_csv_to_ctb_json_columns import FILE_COLUMNS
+
+# Each stage is a cached Loader property. These are the other properties that each stage uses,
+# either directly or to validate the values in its source files. A stage is only started once
+# all of its inputs have been loaded, so that threads do not wait for each other's stages.
+STAGE_INPUTS = {
+    'contacts': (),
+    'census_releases': (),
+    'security_classifications': (),
+    'statistical_units': (),
+    'observation_types': (),
+    'database_types': (),
+    'topics': (),
+    'questions': (),
+    'variable_types': (),
+    'metadata_version_number': (),
+    'sources': ('contacts',),
+    'variables': ('questions', 'security_classifications', 'statistical_units', 'topics',
+                  'variable_types'),
+    'classifications': ('security_classifications', 'topics', 'variables'),
+    'categories': ('classifications',),
+    'databases': ('classifications', 'database_types', 'sources', 'variables'),
+    'datasets': ('census_releases', 'classifications', 'contacts', 'databases',
+                 'observation_types', 'security_classifications', 'statistical_units',
+                 'variables'),
+}
+
+# The source files that each stage reads. The categories stage also reads the geography files.
+STAGE_FILES = {
+    'contacts': ('Contact.csv',),
+    'census_releases': ('Census_Release.csv',),
+    'security_classifications': ('Security_Classification.csv',),
+    'statistical_units': ('Statistical_Unit.csv',),
+    'observation_types': ('Observation_Type.csv',),
+    'database_types': ('Database_Type.csv',),
+    'topics': ('Topic.csv',),
+    'questions': ('Question.csv',),
+    'variable_types': ('Variable_Type.csv',),
+    'metadata_version_number': ('Metadata_Version.csv',),
+    'sources': ('Source.csv',),
+    'variables': ('Variable.csv', 'Variable_Source_Question.csv', 'Variable_Keyword.csv'),
+    'classifications': ('Classification.csv', 'Topic_Classification.csv',
+                        'Category_Mapping.csv'),
+    'categories': ('Category.csv',),
+    'databases': ('Database.csv', 'Database_Variable.csv'),
+    'datasets': ('Dataset.csv', 'Related_Datasets.csv', 'Publication_Dataset.csv',
+                 'Release_Dataset.csv', 'Dataset_Variable.csv', 'Dataset_Keyword.csv'),
+}
+
+# The Loader properties used by ons_csv_to_ctb_json_main.py to build the output files.
+OUTPUT_STAGES = ('classifications', 'categories', 'databases', 'datasets',
+                 'metadata_version_number')
+
+
+def required_stages(targets):
+    """Return the targets and all the stages that they depend on, in a valid load order."""
+    ordered = []
+
+    def add(name):
+        """Add a stage after adding its inputs."""
+        if name not in ordered:
+            for input_name in STAGE_INPUTS[name]:
+                add(input_name)
+            ordered.append(name)
+
+    for target in targets:
+        add(target)
+    return ordered
+
+
+def dataset_filter_stages():
+    """
+    Return the stages whose values depend on the dataset filter.
+
+    The dataset filter is applied to every file with a Dataset_Mnemonic column, so these are the
+    stages that read such files and the stages that use them. Loaders with different dataset
+    filters can share the values of all the other stages.
+    """
+    filtered_files = {filename for filename, columns in FILE_COLUMNS.items()
+                      if 'Dataset_Mnemonic' in [column.name for column in columns]}
+    stages = set()
+    for name in required_stages(STAGE_INPUTS):
+        if filtered_files.intersection(STAGE_FILES[name]) or \
+                stages.intersection(STAGE_INPUTS[name]):
+            stages.add(name)
+    return stages
+
+
+def critical_path(durations):
+    """
+    Return the critical path through the stages that were loaded.
+
+    This is the chain of dependent stages with the greatest total duration, which determines the
+    minimum time that it takes to load all the stages however many threads are used.
+    """
+    finish = {}
+    previous = {}
+    for name in required_stages(durations):
+        inputs = STAGE_INPUTS[name]
+        previous[name] = max(inputs, key=finish.get) if inputs else None
+        finish[name] = durations[name] + (finish[previous[name]] if inputs else 0)
+
+    name = max(finish, key=finish.get)
+    path = []
+    while name:
+        path.append(name)
+        name = previous[name]
+    return path[::-1]
+
+
+def load_stages(loader, targets, threads):
+    """
+    Load the target properties of a Loader, and the stages they depend on, using a thread pool.
+
+    A stage is started as soon as all of its inputs have been loaded, so independent stages are
+    loaded concurrently. The loaded values are cached by the Loader. The critical path is logged
+    and the duration of each stage is returned. If a stage fails then no further stages are
+    started and the first exception is raised once the running stages have finished.
+    """
+    stages = required_stages(targets)
+    waiting_on = {name: set(STAGE_INPUTS[name]) for name in stages}
+    durations = {}
+
+    def load(name):
+        """Load a single stage and record its duration."""
+        start = time.perf_counter()
+        getattr(loader, name)
+        durations[name] = time.perf_counter() - start
+        return name
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        running = set()
+        failed = None
+        while waiting_on or running:
+            if not failed:
+                for name in [n for n in waiting_on if not waiting_on[n]]:
+                    del waiting_on[name]
+                    running.add(executor.submit(load, name))
+            if not running:
+                break
+
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception():
+                    failed = failed or future.exception()
+                    continue
+                for inputs in waiting_on.values():
+                    inputs.discard(future.result())
+
+        if failed:
+            raise failed
+
+    path = critical_path(durations)
+    description = ' -> '.join(f'{name} ({durations[name]:.3f}s)' for name in path)
+    logging.info(f'Critical path: {description} total={sum(durations[n] for n in path):.3f}s')
+    return durations
@@ -0,0 +1,73 @@
+"""Index mnemonics and other keys for exact and case insensitive lookups."""
+
+
+class Symbols:
+    """
+    Symbols is a set of names that can also be looked up case insensitively.
+
+    Each name is case folded once, when the Symbols object is created, so that every lookup takes
+    constant time. If several names have the same case folded form then the first of them is
+    returned by find().
+    """
+
+    def __init__(self, names):
+        """Initialise Symbols object."""
+        self.names = set()
+        self.folded = {}
+        for name in names:
+            self.names.add(name)
+            self.folded.setdefault(name.casefold(), name)
+
+    def __contains__(self, name):
+        """Return True if name is one of the names."""
+        return name in self.names
+
+    def __len__(self):
+        """Return the number of names."""
+        return len(self.names)
+
+    def validator(self):
+        """Return a function that checks whether a value is one of the names."""
+        names = self.names
+
+        def validate_fn(value):
+            """Check if value is one of the names."""
+            return value in names
+
+        return validate_fn
+
+    def find(self, name):
+        """Return the name that matches name case insensitively, or None if there is no match."""
+        return self.folded.get(name.casefold())
+
+
+class SymbolTable:
+    """
+    SymbolTable holds Symbols for the keys of each kind of metadata held by a Loader.
+
+    The Symbols for a kind of metadata are built from the keys of the attribute of the source
+    object with the same name, e.g. SymbolTable(loader)['classifications'] holds the keys of
+    loader.classifications. They are built when they are first requested, loading the metadata if
+    required, and are only built again if the attribute refers to a different object, e.g. after
+    the loaded metadata have been discarded with loader.cache.clear(). If several threads request
+    Symbols that have not yet been built then each may build them, which is harmless since they
+    are built from the same keys.
+    """
+
+    def __init__(self, source):
+        """Initialise SymbolTable object."""
+        self.source = source
+        self._entries = {}
+
+    def __getitem__(self, kind):
+        """Return the Symbols for the keys of the named kind of metadata."""
+        values = getattr(self.source, kind)
+        entry = self._entries.get(kind)
+        if entry is None or entry[0] is not values:
+            entry = (values, Symbols(values))
+            self._entries[kind] = entry
+        return entry[1]
+
+    def find(self, kind, name):
+        """Return the key of the named kind of metadata that matches name case insensitively."""
+        return self[kind].find(name)
@@ -1,7 +1,16 @@
 import unittest.mock
+import contextlib
 import os
 import io
 import csv
+import pathlib
+import shutil
+import tempfile
+from collections import namedtuple
+from datetime import datetime
+import ons_csv_to_ctb_json_main
+
+INPUT_DIR = os.path.join(pathlib.Path(__file__).parent.resolve(), 'testdata')
 
 def mock_open(*args, **kargs):
   f_open = unittest.mock.mock_open(*args, **kargs)
@@ -25,3 +34,82 @@ def build_test_file(fieldnames, rows):
     for row in rows:
         writer.writerow(row)
     return csv_string.getvalue()
+
+
+@unittest.mock.patch('ons_csv_to_ctb_json_main.datetime')
+def run_main(test_case, args, output_dir, mock_datetime):
+    """
+    Run ons_csv_to_ctb_json_main with the given arguments and a fixed build time.
+
+    The output files are written to output_dir. Return the contents of each file in output_dir
+    keyed on its name, and the log messages.
+    """
+    mock_datetime.now.return_value = datetime(1970, 1, 1)
+    mock_datetime.side_effect = lambda *a, **kw: datetime(*a, **kw)
+    with test_case.assertLogs(level='INFO') as cm:
+        with unittest.mock.patch('sys.argv', ['test', '-o', output_dir] + args):
+            ons_csv_to_ctb_json_main.main()
+
+    output = {}
+    for filename in os.listdir(output_dir):
+        with open(os.path.join(output_dir, filename), 'rb') as f:
+            output[filename] = f.read()
+    return output, cm.output
+
+
+OptionRuns = namedtuple('OptionRuns', 'output logs option_output option_logs')
+
+
+class MainTestMixin:
+    """
+    Mixin for test cases that run ons_csv_to_ctb_json_main with the options that they test.
+
+    Each test has its own temporary directory, which holds the output directory and, if copy_input
+    is True, a copy of the test data that the test may modify. main_args are used in every run.
+    """
+    copy_input = False
+    main_args = []
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.output_dir = os.path.join(self.temp_dir, 'output')
+        os.mkdir(self.output_dir)
+        self.input_dir = INPUT_DIR
+        if self.copy_input:
+            self.input_dir = os.path.join(self.temp_dir, 'input')
+            shutil.copytree(INPUT_DIR, self.input_dir)
+        self.geography_file = os.path.join(self.input_dir, 'geography/geography1.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def run_main(self, extra_args):
+        """
+        Run ons_csv_to_ctb_json_main on the test data with main_args and extra_args.
+
+        The output directory is emptied first, so only the files written by this run are returned,
+        along with the log messages.
+        """
+        for filename in os.listdir(self.output_dir):
+            os.remove(os.path.join(self.output_dir, filename))
+        args = ['-i', self.input_dir, '-g', self.geography_file] + self.main_args
+        return run_main(self, args + extra_args, self.output_dir)
+
+    def assert_output_identical(self, option_args, base_args=(), option_patches=(),
+                                extra_files=()):
+        """
+        Check that using option_args does not change the output files.
+
+        ons_csv_to_ctb_json_main is run with base_args and then with base_args and option_args.
+        option_patches are applied during the second run, e.g. to check that no files are read.
+        extra_files, such as reports, are removed from the output of the second run before it is
+        compared. The output and log messages of both runs are returned as an OptionRuns.
+        """
+        output, logs = self.run_main(list(base_args))
+        with contextlib.ExitStack() as stack:
+            for patch in option_patches:
+                stack.enter_context(patch)
+            option_output, option_logs = self.run_main(list(base_args) + option_args)
+        compared_output = {f: c for f, c in option_output.items() if f not in extra_files}
+        self.assertEqual(compared_output, output)
+        return OptionRuns(output, logs, option_output, option_logs)
@@ -65,13 +65,13 @@ class TestBestEffort(unittest.TestCase):
             r'Category.csv Unexpected number of categories for CLASS1: expected 4 but found 1',
             r'Database_Variable.csv Lowest_Geog_Variable_Flag set on GEO3 and GEO1 for database DB1',
             r'Database_Variable.csv GEO1 is unknown Classification_Mnemonic for Variable_Mnemonic VAR1',
-            r'Dataset_Variable.csv:4 duplicate value combo DS1/VAR1 for Dataset_Mnemonic/Variable_Mnemonic',
-            r'Dataset_Variable.csv:4 dropping record',
             r'Dataset_Variable.csv:2 Lowest_Geog_Variable_Flag set on non-geographic variable VAR1 for dataset DS1',
             r'Dataset_Variable.csv:2 Processing_Priority not specified for classification CLASS1 in dataset DS1',
             r'Dataset_Variable.csv:2 using 0 for Processing_Priority',
             r'Dataset_Variable.csv:3 Classification_Mnemonic must not be specified for geographic variable GEO1 in dataset DS1',
             r'Dataset_Variable.csv:3 Processing_Priority must not be specified for geographic variable GEO1 in dataset DS1',
+            r'Dataset_Variable.csv:4 duplicate value combo DS1/VAR1 for Dataset_Mnemonic/Variable_Mnemonic',
+            r'Dataset_Variable.csv:4 dropping record',
             r'Dataset_Variable.csv:5 Lowest_Geog_Variable_Flag set on variable GEO2 and GEO1 for dataset DS1',
             r'Dataset_Variable.csv:5 DS1 has geographic variable GEO2 that is not in database DB1',
             r'Dataset_Variable.csv:7 Classification must be specified for non-geographic VAR2 in dataset DS1',
@@ -1,6 +1,6 @@
 import unittest.mock
 import unittest
-from ons_csv_to_ctb_json_bilingual import Bilingual, BilingualDict
+from ons_csv_to_ctb_json_bilingual import Bilingual, BilingualDict, CategoryLabels
 
 
 class TestBilingual(unittest.TestCase):
@@ -38,6 +38,22 @@ class TestBilingual(unittest.TestCase):
                                         'list': ['1', 'cy'],
                                         'dict': {'a': 'a', 'b': 'b_cy'}})
 
+    def test_category_labels(self):
+        labels = CategoryLabels(('1', '2', '3'), ('one', 'two', None), ('un', None, 'tri'))
+        self.assertEqual(len(labels), 3)
+        self.assertEqual(labels.english(), {'1': 'one', '2': 'two'})
+        self.assertEqual(labels.welsh(), {'1': 'un', '3': 'tri'})
+        self.assertTrue(labels.has_welsh())
+
+        labels = CategoryLabels(('1', '2'), ('one', 'two'), None)
+        self.assertEqual(labels.english(), {'1': 'one', '2': 'two'})
+        self.assertIsNone(labels.welsh())
+        self.assertFalse(labels.has_welsh())
+
+        data = BilingualDict({'catLabels': CategoryLabels(('1',), ('one',), ('un',))})
+        self.assertEqual(data.english(), {'catLabels': {'1': 'one'}})
+        self.assertEqual(data.welsh(), {'catLabels': {'1': 'un'}})
+
     def test_invalid_type(self):
         with self.assertRaisesRegex(ValueError, "^Unexpected type <class 'int'> for int:1$"):
             data = BilingualDict({
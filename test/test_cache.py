@@ -0,0 +1,118 @@
+import unittest.mock
+import unittest
+import os
+import shutil
+import sys
+from helper_funcs import MainTestMixin
+from ons_csv_to_ctb_json_cache import CacheKey
+from ons_csv_to_ctb_json_load import Loader, LoaderOptions
+from ons_csv_to_ctb_json_columns import isoneof
+from ons_csv_to_ctb_json_read import required
+
+DATASET_FILENAME = 'cantabm_v10-2-3_unknown-metadata-version_dataset-md_19700101-1.json'
+
+
+class TestCache(MainTestMixin, unittest.TestCase):
+    copy_input = True
+
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = os.path.join(self.temp_dir, 'cache')
+        self.main_args = ['--cache-dir', self.cache_dir]
+
+    def test_cached_output_identical(self):
+        """Check that the output and log messages are identical when the cache is used."""
+        runs = self.assert_output_identical([], option_patches=[
+            unittest.mock.patch('ons_csv_to_ctb_json_read.Reader.rows',
+                                side_effect=AssertionError('file should not be read')),
+            unittest.mock.patch('ons_csv_to_ctb_json_geo.assign_columns_to_variables',
+                                side_effect=AssertionError('file should not be read'))])
+        self.assertTrue(os.listdir(self.cache_dir))
+        self.assertEqual(runs.logs, runs.option_logs)
+
+    def test_cached_values_interned(self):
+        """Check that values of interned columns are interned when loaded from the cache."""
+        columns = [required('Variable_Mnemonic', intern=True), required('Variable_Title')]
+        loader = Loader(self.input_dir, [], options=LoaderOptions(cache_dir=self.cache_dir))
+        rows = loader.read_file('Variable.csv', columns)
+        self.assertTrue(os.listdir(self.cache_dir))
+
+        with unittest.mock.patch('ons_csv_to_ctb_json_read.Reader.rows',
+                                 side_effect=AssertionError('file should not be read')):
+            cached_rows = loader.read_file('Variable.csv', columns)
+
+        self.assertEqual(rows, cached_rows)
+        for row in cached_rows:
+            self.assertIs(row.data['Variable_Mnemonic'],
+                          sys.intern(''.join(row.data['Variable_Mnemonic'])))
+            self.assertIsNot(row.data['Variable_Title'],
+                             sys.intern(''.join(row.data['Variable_Title'])))
+
+    def test_changed_file_invalidates_entry(self):
+        """Check that a file is read again if its contents are changed."""
+        self.run_main([])
+
+        with open(os.path.join(self.input_dir, 'Classification.csv'), 'a') as f:
+            f.write('\n')
+        with open(os.path.join(self.input_dir, 'Variable.csv')) as f:
+            variables = f.read()
+        with open(os.path.join(self.input_dir, 'Variable.csv'), 'w') as f:
+            f.write(variables.replace('VAR1 Title', 'VAR1 Modified Title'))
+
+        output, _ = self.run_main([])
+        self.assertIn(b'VAR1 Modified Title', output[DATASET_FILENAME])
+
+        shutil.rmtree(self.cache_dir)
+        uncached_output, _ = self.run_main([])
+        self.assertEqual(output, uncached_output)
+
+    def test_dataset_filter_invalidates_entry(self):
+        """Check that the dataset filter is part of the cache key."""
+        self.run_main([])
+        output, logs = self.run_main(['--dataset-filter', 'DS1', '--best-effort'])
+
+        shutil.rmtree(self.cache_dir)
+        uncached_output, uncached_logs = self.run_main(['--dataset-filter', 'DS1', '--best-effort'])
+        self.assertEqual(output, uncached_output)
+        self.assertEqual(logs, uncached_logs)
+
+    def test_files_with_errors_not_cached(self):
+        """Check that files containing errors are not cached."""
+        with open(os.path.join(self.input_dir, 'Contact.csv'), 'a') as f:
+            f.write('\n1,name,email,phone,website\n')
+
+        loader = Loader(self.input_dir, [], best_effort=True,
+                        options=LoaderOptions(cache_dir=self.cache_dir))
+        with self.assertLogs(level='WARNING'):
+            loader.contacts
+        self.assertEqual(1, loader.error_count())
+        self.assertFalse(os.listdir(self.cache_dir))
+
+        loader = Loader(self.input_dir, [], best_effort=True,
+                        options=LoaderOptions(cache_dir=self.cache_dir))
+        with self.assertLogs(level='WARNING'):
+            loader.contacts
+        self.assertEqual(1, loader.error_count())
+
+
+class TestCacheKey(unittest.TestCase):
+    def test_validate_fn_values(self):
+        """Check that the values used by a validate_fn are part of the key."""
+        self.assertEqual(CacheKey(isoneof(['A', 'B'])).hexdigest(),
+                         CacheKey(isoneof(['B', 'A'])).hexdigest())
+        self.assertNotEqual(CacheKey(isoneof(['A', 'B'])).hexdigest(),
+                            CacheKey(isoneof(['A', 'C'])).hexdigest())
+
+    def test_types(self):
+        """Check that values of different types have different keys."""
+        self.assertNotEqual(CacheKey('1').hexdigest(), CacheKey(1).hexdigest())
+        self.assertNotEqual(CacheKey(['a', 'b']).hexdigest(), CacheKey(['a'], 'b').hexdigest())
+
+    def test_not_cacheable(self):
+        """Check that there is no key if a value cannot be fingerprinted."""
+        self.assertIsNone(CacheKey(object()).hexdigest())
+        self.assertIsNone(CacheKey(isoneof([object()])).hexdigest())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,8 +2,8 @@ import unittest.mock
 import unittest
 import os
 import pathlib
-from ons_csv_to_ctb_json_load import Loader
-from helper_funcs import conditional_mock_open, build_test_file
+from ons_csv_to_ctb_json_load import Loader, build_category_labels
+from helper_funcs import conditional_mock_open, build_test_file, mock_open, BUILTINS_OPEN
 
 HEADERS = ['Variable_Mnemonic', 'Classification_Mnemonic',
            'Id', 'Category_Code', 'External_Category_Label_English', 'External_Category_Label_Welsh',
@@ -67,6 +67,49 @@ cd1,nm1,nmw1
             with self.assertRaisesRegex(ValueError, expected_error):
                 Loader(INPUT_DIR, [GEO_FILENAME]).categories
 
+    def test_identical_categories_shared(self):
+        rows = []
+        for classification in ['CLASS2', 'CLASS3', 'CLASS4']:
+            for code in ['CODE1', 'CODE2']:
+                row = REQUIRED_FIELDS.copy()
+                row['Classification_Mnemonic'] = classification
+                row['Category_Code'] = code
+                row['External_Category_Label_Welsh'] = 'welsh' if classification == 'CLASS4' else ''
+                rows.append(row)
+        read_data = """GEO122cd,GEO122nm,GEO122nmw,GEO222cd,GEO222nm,GEO222nmw
+cd1,nm1,nmw1,cd1,nm1,nmw1
+"""
+        files = {'Category.csv': build_test_file(HEADERS, rows), 'geography.csv': read_data}
+
+        def open_file(*args, **kwargs):
+            name = os.path.basename(args[0])
+            if name in files:
+                return mock_open(read_data=files[name])(*args, **kwargs)
+            return BUILTINS_OPEN(*args, **kwargs)
+
+        with unittest.mock.patch('builtins.open', open_file):
+            with self.assertLogs(level='INFO') as cm:
+                categories = Loader(INPUT_DIR, [GEO_FILENAME]).categories
+
+        self.assertIs(categories['CLASS2'], categories['CLASS3'])
+        self.assertIsNot(categories['CLASS2'], categories['CLASS4'])
+        self.assertEqual(categories['CLASS4'].english(), categories['CLASS2'].english())
+        self.assertIs(categories['GEO1'], categories['GEO2'])
+        self.assertEqual(categories['GEO1'].welsh(), {'cd1': 'nmw1'})
+        self.assertRegex(cm.output[-1], 'Shared the categories of 2 classifications which are '
+                                        'identical to those of other classifications, saving '
+                                        'approximately [0-9]+ bytes$')
+
+    def test_build_category_labels(self):
+        self.assertEqual(
+            build_category_labels('CLASS1', 2, (['CODE1', 'CODE2'], ['label 1', ''],
+                                                 ['internal 1', 'internal 2'], ['', 'welsh 2'])),
+            (('CODE1', 'CODE2'), ('label 1', 'internal 2'), ('', 'welsh 2'), None))
+        self.assertEqual(
+            build_category_labels('CLASS1', 3, (['CODE1'], [''], ['internal 1'], [''])),
+            (('CODE1',), ('internal 1',), None,
+             'Unexpected number of categories for CLASS1: expected 3 but found 1'))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+import pathlib
+import os
+import shutil
+import tempfile
+from ons_csv_to_ctb_json_columns import check_headers, source_filenames
+from ons_csv_to_ctb_json_load import Loader, LoaderOptions
+from ons_csv_to_ctb_json_prune import PrunedLoader
+from ons_csv_to_ctb_json_snapshot import snapshot_inputs
+
+FILE_DIR = pathlib.Path(__file__).parent.resolve()
+INPUT_DIR = os.path.join(FILE_DIR, 'testdata')
+GEOGRAPHY_FILE = os.path.join(FILE_DIR, 'testdata/geography/geography1.csv')
+
+
+class TestCategoryShards(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.input_dir = os.path.join(self.temp_dir, 'input')
+        shutil.copytree(INPUT_DIR, self.input_dir)
+        with open(os.path.join(self.input_dir, 'Category.csv')) as f:
+            self.lines = f.readlines()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_shards(self, shards):
+        os.remove(os.path.join(self.input_dir, 'Category.csv'))
+        os.mkdir(os.path.join(self.input_dir, 'Category'))
+        for name, rows in shards.items():
+            with open(os.path.join(self.input_dir, 'Category', name), 'w') as f:
+                f.writelines([self.lines[0]] + rows)
+
+    def test_shards(self):
+        expected = Loader(self.input_dir, [GEOGRAPHY_FILE]).categories
+        self.write_shards({'a.csv': self.lines[1:4], 'b.csv': self.lines[4:]})
+        with open(os.path.join(self.input_dir, 'Category', 'README.txt'), 'w') as f:
+            f.write('Not a shard\n')
+        self.assertEqual(source_filenames(self.input_dir, 'Category.csv'),
+                         ['Category/a.csv', 'Category/b.csv'])
+        self.assertEqual(source_filenames(self.input_dir, 'Category_Mapping.csv'),
+                         ['Category_Mapping.csv'])
+        check_headers(self.input_dir, [GEOGRAPHY_FILE])
+        self.assertIn('Category/b.csv', [name for name, _ in snapshot_inputs(
+            Loader(self.input_dir, [GEOGRAPHY_FILE]))])
+
+        for options in [LoaderOptions(), LoaderOptions(prefetch=True)]:
+            with self.subTest(options=options):
+                categories = Loader(self.input_dir, [GEOGRAPHY_FILE], options=options).categories
+                self.assertEqual({k: (v.english(), v.welsh()) for k, v in categories.items()},
+                                 {k: (v.english(), v.welsh()) for k, v in expected.items()})
+
+    def test_duplicate_in_earlier_shard(self):
+        self.write_shards({'1.csv': self.lines[1:3], '2.csv': self.lines[2:]})
+        shard_2 = os.path.join(self.input_dir, 'Category', '2.csv')
+        with self.assertRaisesRegex(ValueError, f'^Reading {shard_2}:2 duplicate value combo '
+                                                'CODE5/CLASS1 for Category_Code/'
+                                                'Classification_Mnemonic in an earlier shard$'):
+            Loader(self.input_dir, [GEOGRAPHY_FILE]).categories
+
+        loader = Loader(self.input_dir, [GEOGRAPHY_FILE], best_effort=True)
+        with self.assertLogs(level='WARNING') as cm:
+            categories = loader.categories
+        self.assertEqual(len(categories['CLASS1']), 6)
+        self.assertEqual(loader.error_count(), 1)
+        self.assertEqual(cm.output, [
+            f'WARNING:root:Reading {shard_2}:2 duplicate value combo CODE5/CLASS1 for '
+            'Category_Code/Classification_Mnemonic in an earlier shard',
+            f'WARNING:root:Reading {shard_2}:2 dropping record'])
+
+    def test_other_files_not_shards(self):
+        expected = Loader(self.input_dir, [GEOGRAPHY_FILE]).categories
+        with open(os.path.join(self.input_dir, 'Category_backup.csv'), 'w') as f:
+            f.writelines(self.lines[:2])
+        self.assertEqual(source_filenames(self.input_dir, 'Category.csv'), ['Category.csv'])
+        check_headers(self.input_dir, [GEOGRAPHY_FILE])
+        categories = Loader(self.input_dir, [GEOGRAPHY_FILE]).categories
+        self.assertEqual({k: v.english() for k, v in categories.items()},
+                         {k: v.english() for k, v in expected.items()})
+
+    def test_shards_and_category_file(self):
+        os.mkdir(os.path.join(self.input_dir, 'Category'))
+        with open(os.path.join(self.input_dir, 'Category', '1.csv'), 'w') as f:
+            f.writelines(self.lines)
+        with self.assertRaisesRegex(ValueError, 'Found both Category.csv and Category directory '
+                                                'in .*: only one or the other may be supplied'):
+            Loader(self.input_dir, [GEOGRAPHY_FILE]).categories
+        with self.assertRaisesRegex(ValueError, '1 problem\\(s\\) found in file headers:\n'
+                                                'Found both Category.csv'):
+            check_headers(self.input_dir, [GEOGRAPHY_FILE])
+
+    def test_no_shards(self):
+        self.write_shards({})
+        with self.assertRaisesRegex(ValueError, 'No .csv files found in .*Category$'):
+            Loader(self.input_dir, [GEOGRAPHY_FILE]).categories
+
+    def test_pruned_shards(self):
+        self.write_shards({'1.csv': self.lines[1:4], '2.csv': self.lines[4:]})
+        with open(os.path.join(self.input_dir, 'Category', '2.csv'), 'a') as f:
+            f.write('SOURCE2,CLASS2,2,CODE2-1,LABEL2-1,,2,1,\n')
+
+        loader = PrunedLoader(self.input_dir, [], dataset_filter='DS_TAB')
+        with self.assertLogs(level='INFO'):
+            loader.prune()
+        self.assertEqual(sorted(loader.categories), ['CLASS1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 import unittest.mock
 import unittest
-from ons_csv_to_ctb_json_read import required, optional, Reader
+import sys
+from ons_csv_to_ctb_json_read import required, optional, Reader, RowData, unsigned_int
 
 def mock_open(*args, **kargs):
   f_open = unittest.mock.mock_open(*args, **kargs)
@@ -39,6 +40,25 @@ class TestCSVRead(unittest.TestCase):
 
     @unittest.mock.patch('builtins.open', new_callable=mock_open, read_data="""id,name,email,age
 1,bob,bob@bob.com,40
+2,bill,,50
+3,ben,,60
+""")
+    def test_rows(self, m):
+        columns = [
+            required('name'),
+            optional('email'),
+            required('age', validate_fn=isoneof(['40', '50'])),
+            required('id'),
+            ]
+        rows = Reader('file.csv', columns, raise_error).rows()
+
+        self.assertEqual(next(rows), ({'name': 'bob', 'email': 'bob@bob.com', 'age': '40', 'id': '1'}, 2))
+        self.assertEqual(next(rows), ({'name': 'bill', 'email': None, 'age': '50', 'id': '2'}, 3))
+        with self.assertRaisesRegex(ValueError, 'Reading file.csv:4 invalid value 60 for age'):
+            next(rows)
+
+    @unittest.mock.patch('builtins.open', new_callable=mock_open, read_data="""id,name,email,age
+1,bob,bob@bob.com,40
 """)
     def test_extra_fields(self, m):
         columns = [
@@ -98,6 +118,58 @@ ben
         with self.assertRaisesRegex(ValueError, 'Reading file.csv:4 invalid value ben for name'):
             Reader('file.csv', columns, raise_error).read()
 
+    @unittest.mock.patch('builtins.open', new_callable=mock_open, read_data="""name,age,priority
+bob,40,0
+bill,50,
+""")
+    def test_value_type(self, m):
+        columns = [
+            required('name'),
+            required('age', value_type=unsigned_int),
+            optional('priority', value_type=unsigned_int),
+            ]
+        data = Reader('file.csv', columns, raise_error).read()
+
+        self.assertEqual(data, [
+            ({'name': 'bob', 'age': 40, 'priority': 0}, 2),
+            ({'name': 'bill', 'age': 50, 'priority': None}, 3)])
+
+    def test_invalid_value_type(self):
+        for value in ['x', '-1', '1.5', '½']:
+            with self.subTest(value=value):
+                read_data = f'name,age\nbob,{value}\n'
+                with unittest.mock.patch('builtins.open', new_callable=mock_open, read_data=read_data):
+                    columns = [
+                        required('name'),
+                        optional('age', value_type=unsigned_int),
+                        ]
+                    with self.assertRaisesRegex(ValueError, f'Reading file.csv:2 invalid value {value} for age'):
+                        Reader('file.csv', columns, raise_error).read()
+
+                    with self.assertLogs(level='WARNING') as cm:
+                        data = Reader('file.csv', columns, lambda msg: None).read()
+                    self.assertEqual(data, [({'name': 'bob', 'age': None}, 2)])
+                    self.assertEqual(cm.output, ['WARNING:root:Reading file.csv:2 ignoring field age'])
+
+    @unittest.mock.patch('builtins.open', new_callable=mock_open, read_data="""name,class
+bob, CLASS_1
+bill,CLASS_1
+ben,
+""")
+    def test_intern(self, m):
+        columns = [
+            required('name'),
+            optional('class', intern=True),
+            ]
+        data = Reader('file.csv', columns, raise_error).read()
+
+        self.assertEqual(data, [
+            ({'name': 'bob', 'class': 'CLASS_1'}, 2),
+            ({'name': 'bill', 'class': 'CLASS_1'}, 3),
+            ({'name': 'ben', 'class': None}, 4)])
+        self.assertIs(data[0].data['class'], data[1].data['class'])
+        self.assertIs(data[0].data['class'], sys.intern(''.join(['CLASS', '_1'])))
+
     @unittest.mock.patch('builtins.open', new_callable=mock_open, read_data="""name
 bob
 bill
@@ -139,6 +211,20 @@ bob,bob@bob.com
         self.assertEqual(data, [
             ({'name': 'bob', 'email': 'bob@bob.com'}, 2)])
 
+    @unittest.mock.patch('builtins.open', new_callable=mock_open, read_data="""id,name,email,age
+
+1,bob,bob@bob.com,40
+
+2,bill,bill@bill.com
+""")
+    def test_blank_lines_not_counted(self, m):
+        columns = [
+            required('name'),
+            required('id'),
+            ]
+        with self.assertRaisesRegex(ValueError, 'Reading file.csv: too few fields on row 3'):
+            Reader('file.csv', columns, raise_error).read()
+
     @unittest.mock.patch('builtins.open', new_callable=mock_open, read_data="""name,id
 bob,1
 bill ,2
@@ -171,6 +257,29 @@ bob,1
         with self.assertRaisesRegex(ValueError, 'Reading file.csv:6 duplicate value combo bob/1 for name/id'):
             Reader('file.csv', columns, raise_error, unique_combo_fields=['name', 'id']).read()
 
+    @unittest.mock.patch('builtins.open', new_callable=mock_open, read_data="""name,id,label
+X,1,
+X,1,lbl
+X,1,lbl2
+""")
+    def test_unique_combos_dropped_row(self, m):
+        columns = [
+            required('name'),
+            required('id'),
+            required('label'),
+            ]
+        errors = []
+        with self.assertLogs(level='WARNING') as cm:
+            data = Reader('file.csv', columns, errors.append, unique_combo_fields=['name', 'id']).read()
+
+        self.assertEqual(data, [({'name': 'X', 'id': '1', 'label': 'lbl'}, 3)])
+        self.assertEqual(errors, [
+            'Reading file.csv:2 no value supplied for required field label',
+            'Reading file.csv:4 duplicate value combo X/1 for name/id'])
+        self.assertEqual(cm.output, [
+            'WARNING:root:Reading file.csv:2 dropping record',
+            'WARNING:root:Reading file.csv:4 dropping record'])
+
     @unittest.mock.patch('builtins.open', new_callable=mock_open, read_data="""id,Dataset_Mnemonic
 1,TS1
 2,TT1
@@ -197,5 +306,40 @@ bob,1
         self.assertRegex(cm.output[0], r"file.csv dropped 3 records related to datasets with Dataset_Mnemonics that do not start with one of: \['TS', 'TX']")
 
 
+class TestRowData(unittest.TestCase):
+    def test_mapping(self):
+        row = RowData({'name': 0, 'email': 1, 'age': 2}, ('bob', None, '40'))
+        self.assertEqual(row['name'], 'bob')
+        self.assertIsNone(row['email'])
+        self.assertEqual(row.get('age'), '40')
+        self.assertEqual(row.get('id', 'x'), 'x')
+        self.assertIn('age', row)
+        self.assertNotIn('id', row)
+        self.assertEqual(list(row), ['name', 'email', 'age'])
+        self.assertEqual(len(row), 3)
+        self.assertEqual(row, {'name': 'bob', 'email': None, 'age': '40'})
+        with self.assertRaises(KeyError):
+            row['id']
+
+    def test_reshape(self):
+        index = {'name': 0, 'email': 1, 'age': 2}
+        row = RowData(index, ('bob', None, '40'))
+        other = RowData(index, ('bill', None, '50'))
+
+        row['name'] = row.pop('name').upper()
+        del row['email']
+        row['id'] = '1'
+
+        self.assertEqual(list(row.items()), [('age', '40'), ('name', 'BOB'), ('id', '1')])
+        self.assertEqual(dict(row), {'age': '40', 'name': 'BOB', 'id': '1'})
+        self.assertEqual(row.pop('missing', None), None)
+        with self.assertRaises(KeyError):
+            row.pop('missing')
+
+        # Modifying one row must not affect other rows that share the same column index.
+        self.assertEqual(index, {'name': 0, 'email': 1, 'age': 2})
+        self.assertEqual(other, {'name': 'bill', 'email': None, 'age': '50'})
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -42,8 +42,10 @@ class TestDatasetClassification(unittest.TestCase):
                 self.run_test([row], f'^Reading {FILENAME}:2 invalid value X for {field}$')
 
     def test_duplicate_entry(self):
+        row = {'Dataset_Mnemonic': 'DS1', 'Classification_Mnemonic': 'CLASS1', 'Database_Mnemonic': 'DB1',
+               'Processing_Priority': '1', 'Id': '1', 'Variable_Mnemonic': 'VAR1'}
         self.run_test(
-            [REQUIRED_FIELDS, REQUIRED_FIELDS],
+            [row, row],
             f'^Reading {FILENAME}:3 duplicate value combo DS1/VAR1 for Dataset_Mnemonic/Variable_Mnemonic')
 
     def test_invalid_processing_priority_set1(self):
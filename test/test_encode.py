@@ -0,0 +1,84 @@
+import json
+import unittest.mock
+import unittest
+from ons_csv_to_ctb_json_bilingual import BilingualDict, CategoryLabels
+from ons_csv_to_ctb_json_encode import PLACEHOLDER, LazySharedJSON, SharedJSON, SharedJSONEncoder
+from ons_csv_to_ctb_json_main import build_ctb_variables
+
+
+class TestSharedJSONEncoder(unittest.TestCase):
+    def test_output_unchanged(self):
+        def output(labels, empty):
+            return [
+                {'name': 'a', 'catLabels': labels, 'other': [labels, 'x', {'deep': [[labels]]}]},
+                {'name': 'b', 'catLabels': labels, 'empty': empty, 'none': None},
+                labels,
+                PLACEHOLDER,
+            ]
+
+        labels = {'1': 'one', '2': 'two', '3': 'tiâr\n'}
+        for kwargs in [{'indent': 4}, {'indent': 2, 'ensure_ascii': False}, {}]:
+            with self.subTest(kwargs=kwargs):
+                data = output(SharedJSON(labels), SharedJSON({}))
+                self.assertEqual(json.dumps(data, cls=SharedJSONEncoder, **kwargs),
+                                 json.dumps(output(labels, {}), **kwargs))
+
+    def test_encoded_once(self):
+        shared = SharedJSON({'1': 'one'})
+        with unittest.mock.patch.object(SharedJSON, 'text', autospec=True,
+                                        side_effect=SharedJSON.text) as text:
+            output = json.dumps([shared, {'a': shared}], indent=4, cls=SharedJSONEncoder)
+        self.assertEqual(json.loads(output), [{'1': 'one'}, {'a': {'1': 'one'}}])
+        self.assertEqual(text.call_count, 2)
+
+        with unittest.mock.patch.object(SharedJSONEncoder, 'iterencode',
+                                        side_effect=AssertionError('should not be encoded')):
+            self.assertEqual(shared.text(SharedJSONEncoder(indent=4)), '{\n    "1": "one"\n}')
+
+    def test_lazy_value(self):
+        get_value = unittest.mock.Mock(return_value={'1': 'one', '2': 'two'})
+        lazy = LazySharedJSON(get_value, uses=2)
+        get_value.assert_not_called()
+        output = json.dumps([lazy, {'a': lazy}], indent=2, cls=SharedJSONEncoder)
+        self.assertEqual(output, json.dumps([get_value.return_value,
+                                             {'a': get_value.return_value}], indent=2))
+        get_value.assert_called_once_with()
+        self.assertIsNone(lazy.value)
+        self.assertIsNone(lazy._text)
+
+    def test_lazy_value_unexpected_use(self):
+        get_value = unittest.mock.Mock(return_value={'1': 'one'})
+        lazy = LazySharedJSON(get_value)
+        output = json.dumps([lazy, {'a': lazy}], cls=SharedJSONEncoder)
+        self.assertEqual(output, '[{"1": "one"}, {"a": {"1": "one"}}]')
+        self.assertEqual(get_value.call_count, 2)
+        self.assertIsNone(lazy._text)
+
+    def test_shared_category_labels(self):
+        def classification(mnemonic):
+            return BilingualDict({}, private={
+                'Security_Mnemonic': 'PUB', 'Codebook_Mnemonic': mnemonic,
+                'Classification_Label': mnemonic, 'Variable_Description': mnemonic})
+
+        shared = CategoryLabels(('1', '2'), ('one', 'two'), ('un', 'dau'))
+        ctb_variables = build_ctb_variables(
+            {m: classification(m) for m in ['A', 'B', 'C']},
+            {'A': shared, 'B': CategoryLabels(('1',), ('one',), None), 'C': shared})
+        english = [v.english()['catLabels'] for v in ctb_variables]
+        welsh = [v.welsh()['catLabels'] for v in ctb_variables]
+        self.assertIs(english[0], english[2])
+        self.assertIs(welsh[0], welsh[2])
+        self.assertEqual([v.uses for v in english + welsh if v], [2, 1, 2, 2, 2])
+
+        self.assertEqual(json.loads(json.dumps([english, welsh], cls=SharedJSONEncoder)), [
+            [{'1': 'one', '2': 'two'}, {'1': 'one'}, {'1': 'one', '2': 'two'}],
+            [{'1': 'un', '2': 'dau'}, None, {'1': 'un', '2': 'dau'}]])
+        self.assertEqual([v._text for v in english + welsh if v], [None] * 5)
+
+    def test_unsupported_type(self):
+        with self.assertRaisesRegex(TypeError, 'not JSON serializable'):
+            json.dumps([object()], cls=SharedJSONEncoder)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest.mock
+import unittest
+import os
+from helper_funcs import MainTestMixin
+import ons_csv_to_ctb_json_main
+from ons_csv_to_ctb_json_cache import CACHE_SUFFIX
+from ons_csv_to_ctb_json_incremental import IncrementalBuild
+from ons_csv_to_ctb_json_load import Loader
+from ons_csv_to_ctb_json_stages import OUTPUT_STAGES, STAGE_INPUTS
+
+
+class TestIncremental(MainTestMixin, unittest.TestCase):
+    copy_input = True
+
+    def setUp(self):
+        super().setUp()
+        self.state_dir = os.path.join(self.temp_dir, 'state')
+
+    def run_incremental(self):
+        """Run an incremental build and return the stages that were reused."""
+        runs = self.assert_output_identical(['--incremental-dir', self.state_dir])
+
+        reused_logs = [line for line in runs.option_logs if 'Incremental build reused' in line]
+        self.assertEqual(len(reused_logs), 1)
+        runs.option_logs.remove(reused_logs[0])
+        self.assertEqual(runs.option_logs, runs.logs)
+
+        return set(reused_logs[0].split(': ')[-1].split(', ')) - {'none'}
+
+    def modify(self, filename, old, new):
+        filename = os.path.join(self.input_dir, filename)
+        with open(filename) as f:
+            contents = f.read()
+        self.assertIn(old, contents)
+        with open(filename, 'w') as f:
+            f.write(contents.replace(old, new, 1))
+
+    def test_output_identical(self):
+        """Check that the output is identical to a full build as the source files change."""
+        self.assertEqual(self.run_incremental(), set())
+        self.assertEqual(self.run_incremental(), set(STAGE_INPUTS))
+
+        # The categories only use fields of the classifications that are not affected by topics.
+        self.modify('Topic.csv', 'TOPIC1 Title', 'New Title')
+        reused = self.run_incremental()
+        self.assertIn('categories', reused)
+        self.assertIn('contacts', reused)
+        for name in ['topics', 'variables', 'classifications', 'databases', 'datasets']:
+            self.assertNotIn(name, reused)
+
+        self.modify('Dataset.csv', 'DS1 Title', 'New DS1 Title')
+        self.assertEqual(self.run_incremental(), set(STAGE_INPUTS) - {'datasets'})
+
+        self.modify('Classification.csv', 'CLASS1 Label Welsh,6,', 'CLASS1 Label Welsh,,')
+        reused = self.run_incremental()
+        self.assertNotIn('classifications', reused)
+        self.assertNotIn('categories', reused)
+
+    def test_restore_snapshot_rejected(self):
+        """Check that --incremental-dir cannot be used with --restore-snapshot."""
+        with unittest.mock.patch('sys.argv', [
+                'test', '-i', self.input_dir, '-o', self.output_dir, '--incremental-dir',
+                self.state_dir, '--restore-snapshot', os.path.join(self.temp_dir, 'snapshot')]):
+            with self.assertRaises(SystemExit):
+                ons_csv_to_ctb_json_main.main()
+        self.assertFalse(os.path.exists(self.state_dir))
+
+    def test_stale_entries_removed(self):
+        self.run_incremental()
+        self.assertEqual(len(os.listdir(self.state_dir)), len(STAGE_INPUTS))
+        self.modify('Topic.csv', 'TOPIC1 Title', 'New Title')
+        self.run_incremental()
+        self.assertEqual(len(os.listdir(self.state_dir)), len(STAGE_INPUTS))
+
+    def test_stages_with_errors_not_stored(self):
+        with open(os.path.join(self.input_dir, 'Topic.csv'), 'a') as f:
+            f.write('TOPIC1,dup,dup,99,,\n')
+
+        for expected_reused in [[], ['contacts']]:
+            loader = Loader(self.input_dir, [], best_effort=True)
+            with self.assertLogs(level='INFO'):
+                reused = IncrementalBuild(self.state_dir).load_stages(loader, ['topics',
+                                                                               'contacts'])
+            self.assertEqual(reused, expected_reused)
+        self.assertEqual(len([f for f in os.listdir(self.state_dir)
+                              if f.endswith(CACHE_SUFFIX)]), 1)
+
+    def test_all_output_stages_loaded(self):
+        loader = Loader(self.input_dir, [self.geography_file])
+        with self.assertLogs(level='INFO'):
+            IncrementalBuild(self.state_dir).load_stages(loader, OUTPUT_STAGES)
+        for name in OUTPUT_STAGES:
+            self.assertIn(name, loader.cache)
+
+
+if __name__ == '__main__':
+    unittest.main()
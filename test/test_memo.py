@@ -0,0 +1,202 @@
+import unittest.mock
+import unittest
+import gc
+import pathlib
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import weakref
+from collections import Counter
+from ons_csv_to_ctb_json_load import Loader
+from ons_csv_to_ctb_json_memo import MemoCache
+from ons_csv_to_ctb_json_read import Reader
+from ons_csv_to_ctb_json_stages import STAGE_INPUTS
+
+THREADS = 32
+
+
+def run_threads(target):
+    """Run target(thread_number) in THREADS threads that start together and return the results."""
+    barrier = threading.Barrier(THREADS)
+    results = [None] * THREADS
+    errors = []
+
+    def run(number):
+        barrier.wait()
+        try:
+            results[number] = target(number)
+        except Exception as exception:
+            errors.append(exception)
+
+    threads = [threading.Thread(target=run, args=(n,)) for n in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return results
+
+INPUT_DIR = os.path.join(pathlib.Path(__file__).parent.resolve(), 'testdata')
+
+
+class TestMemoCache(unittest.TestCase):
+    def test_get(self):
+        cache = MemoCache()
+        compute = unittest.mock.Mock(return_value=[1])
+        value = cache.get('a', compute)
+        self.assertIs(cache.get('a', compute), value)
+        compute.assert_called_once_with()
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+
+    def test_error_not_chained(self):
+        cache = MemoCache()
+
+        def fail():
+            raise ValueError('failed')
+
+        with self.assertRaises(ValueError) as cm:
+            cache.get('a', lambda: cache.get('b', fail))
+        self.assertIsNone(cm.exception.__context__)
+        self.assertNotIn('a', cache)
+
+    def test_on_store(self):
+        stored = []
+        cache = MemoCache(on_store=stored.append)
+        cache.get('a', lambda: 1)
+        cache.get('a', lambda: 2)
+        cache.set('b', 3)
+        self.assertEqual(stored, ['a', 'b'])
+
+    def test_clear(self):
+        cache = MemoCache({'a': (), 'b': ('a',), 'c': ('b',), 'd': ()})
+        for name in 'abcd':
+            cache.get(name, lambda: name)
+
+        self.assertEqual(cache.clear('b'), {'b', 'c'})
+        self.assertEqual(sorted(cache.values), ['a', 'd'])
+
+        self.assertEqual(cache.clear(), {'a', 'd'})
+        self.assertEqual(cache.values, {})
+
+    def test_concurrent_get(self):
+        """Check that each value is computed once when it is requested by many threads."""
+        cache = MemoCache({'a': (), 'b': ('a',), 'c': ('a', 'b')})
+        calls = Counter()
+        calls_lock = threading.Lock()
+
+        def compute(name):
+            def compute_fn():
+                with calls_lock:
+                    calls[name] += 1
+                time.sleep(0.01)
+                return [name] + [cache.get(n, compute(n)) for n in cache.dependencies[name]]
+            return compute_fn
+
+        def get_all(number):
+            names = list('abc')
+            random.Random(number).shuffle(names)
+            return {name: cache.get(name, compute(name)) for name in names}
+
+        results = run_threads(get_all)
+        self.assertEqual(calls, {'a': 1, 'b': 1, 'c': 1})
+        for result in results:
+            for name in 'abc':
+                self.assertIs(result[name], cache.values[name])
+        self.assertEqual(cache.values['c'], ['c', ['a'], ['b', ['a']]])
+
+    def test_concurrent_get_error(self):
+        """Check that a value is computed again if computing it failed."""
+        cache = MemoCache()
+        compute = unittest.mock.Mock(side_effect=[ValueError('failed'), 'value'])
+        with self.assertRaisesRegex(ValueError, 'failed'):
+            cache.get('a', compute)
+        self.assertEqual(cache.get('a', compute), 'value')
+        self.assertEqual(compute.call_count, 2)
+
+
+class TestLoaderMemo(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.input_dir = os.path.join(self.temp_dir, 'input')
+        shutil.copytree(INPUT_DIR, self.input_dir)
+        with open(os.path.join(self.input_dir, 'Topic.csv'), 'a') as f:
+            f.write('TOPIC99,99,TOPIC99 Description,,TOPIC99 Title,\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_loaders_coexist(self):
+        """Check that loaders do not discard each other's data."""
+        with unittest.mock.patch.object(Reader, 'rows', autospec=True,
+                                        side_effect=Reader.rows) as rows:
+            loader1 = Loader(INPUT_DIR, [])
+            loader2 = Loader(self.input_dir, [])
+            for _ in range(2):
+                topics1 = loader1.topics
+                topics2 = loader2.topics
+
+        self.assertEqual(rows.call_count, 2)
+        self.assertNotIn('TOPIC99', topics1)
+        self.assertIn('TOPIC99', topics2)
+        self.assertIs(loader1.topics, topics1)
+
+    def test_stage_error_not_chained(self):
+        loader = Loader(os.path.join(INPUT_DIR, 'dataset_filter'), [])
+        with self.assertRaisesRegex(ValueError, 'Dataset_Variable.csv:2 Lowest_Geog_Variable_Flag '
+                                                'set on non-geographic variable') as cm:
+            loader.datasets
+        self.assertIsNone(cm.exception.__context__)
+
+    def test_clear(self):
+        loader = Loader(INPUT_DIR, [])
+        classifications = loader.classifications
+        topics = loader.topics
+        contacts = loader.contacts
+
+        # Classifications depend on topics so they are cleared too, but contacts are retained.
+        cleared = loader.cache.clear('topics')
+        self.assertIn('classifications', cleared)
+        self.assertIn('variables', cleared)
+        self.assertNotIn('contacts', cleared)
+        self.assertIsNot(loader.topics, topics)
+        self.assertIsNot(loader.classifications, classifications)
+        self.assertIs(loader.contacts, contacts)
+
+        loader.cache.clear()
+        self.assertIsNot(loader.contacts, contacts)
+
+    def test_concurrent_loading(self):
+        """Check that each stage of a shared Loader is loaded once when used by many threads."""
+        loader = Loader(INPUT_DIR, [], dataset_filter='DS1,DS2,DS3,DS4')
+        with unittest.mock.patch.object(Reader, 'rows', autospec=True,
+                                        side_effect=Reader.rows) as rows:
+            def load_all(number):
+                names = list(STAGE_INPUTS)
+                random.Random(number).shuffle(names)
+                return {name: getattr(loader, name) for name in names}
+
+            results = run_threads(load_all)
+
+        filenames = Counter(os.path.basename(call[0][0].filename) for call in rows.call_args_list)
+        self.assertEqual(set(filenames.values()), {1})
+        for result in results:
+            for name, value in result.items():
+                self.assertIs(value, loader.cache.values[name])
+        self.assertEqual(loader.error_count(), 0)
+
+    def test_loader_released(self):
+        loader = Loader(INPUT_DIR, [])
+        loader.topics
+        loader_ref = weakref.ref(loader)
+        del loader
+        gc.collect()
+        self.assertIsNone(loader_ref())
+
+
+if __name__ == '__main__':
+    unittest.main()
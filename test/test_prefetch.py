@@ -0,0 +1,83 @@
+import unittest.mock
+import unittest
+import os
+from helper_funcs import INPUT_DIR, MainTestMixin
+from ons_csv_to_ctb_json_prefetch import Prefetcher, read_bytes
+from ons_csv_to_ctb_json_columns import FILE_COLUMNS
+from ons_csv_to_ctb_json_incremental import IncrementalBuild
+from ons_csv_to_ctb_json_load import Loader, LoaderOptions
+from ons_csv_to_ctb_json_stages import OUTPUT_STAGES
+
+
+class TestPrefetch(MainTestMixin, unittest.TestCase):
+    def test_prefetched_output_identical(self):
+        """Check that the output and log messages are identical when files are prefetched."""
+        mock_read_bytes = unittest.mock.Mock(side_effect=read_bytes)
+        runs = self.assert_output_identical(['--prefetch'], option_patches=[
+            unittest.mock.patch('ons_csv_to_ctb_json_prefetch.read_bytes', mock_read_bytes)])
+
+        self.assertEqual(runs.logs, runs.option_logs)
+        self.assertEqual(sorted(c[0][0] for c in mock_read_bytes.call_args_list),
+                         sorted([os.path.join(INPUT_DIR, f) for f in FILE_COLUMNS]
+                                + [self.geography_file]))
+
+    def test_open(self):
+        filename = os.path.join(self.temp_dir, 'file.csv')
+        with open(filename, 'w', encoding='utf-8-sig', newline='') as f:
+            f.write('id,name\r\n1,"a\r\nb"\r\n')
+        missing_filename = os.path.join(self.temp_dir, 'missing.csv')
+
+        prefetcher = Prefetcher([filename, missing_filename])
+        os.remove(filename)
+
+        with prefetcher.open(filename, newline='', encoding='utf-8-sig') as f:
+            self.assertEqual(f.read(), 'id,name\r\n1,"a\r\nb"\r\n')
+
+        # The contents are discarded once the file has been read.
+        with self.assertRaises(FileNotFoundError):
+            prefetcher.read(filename)
+
+        # Errors are raised when the file is read.
+        with self.assertRaises(FileNotFoundError):
+            prefetcher.read(missing_filename)
+
+    def test_unread_files_discarded(self):
+        """Check that no prefetched contents are retained for files that are never parsed."""
+        cache_dir = os.path.join(self.temp_dir, 'cache')
+        incremental_dir = os.path.join(self.temp_dir, 'incremental')
+        for _ in range(2):
+            options = LoaderOptions(cache_dir=cache_dir, prefetch=True)
+            with self.assertLogs(level='INFO'):
+                loader = Loader(INPUT_DIR, [self.geography_file], options=options)
+                for name in OUTPUT_STAGES:
+                    getattr(loader, name)
+            self.assertEqual(loader.prefetcher.pending, {})
+
+            with self.assertLogs(level='INFO'):
+                loader = Loader(INPUT_DIR, [self.geography_file], options=LoaderOptions(prefetch=True))
+                IncrementalBuild(incremental_dir).load_stages(loader, OUTPUT_STAGES)
+            self.assertEqual(loader.prefetcher.pending, {})
+
+    def test_discard(self):
+        filename = os.path.join(self.temp_dir, 'file.csv')
+        with open(filename, 'w') as f:
+            f.write('id\n')
+
+        prefetcher = Prefetcher([filename])
+        prefetcher.discard([filename, 'other.csv'])
+        self.assertEqual(prefetcher.pending, {})
+
+        # Files are read from disk if they are opened after being discarded.
+        self.assertEqual(prefetcher.read(filename), b'id\n')
+
+    def test_restore_snapshot_not_prefetched(self):
+        snapshot_file = os.path.join(self.temp_dir, 'snapshot')
+        self.run_main(['--save-snapshot', snapshot_file])
+        with unittest.mock.patch('ons_csv_to_ctb_json_prefetch.read_bytes',
+                                 side_effect=read_bytes) as mock_read_bytes:
+            self.run_main(['--prefetch', '--restore-snapshot', snapshot_file])
+        mock_read_bytes.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
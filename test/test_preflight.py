@@ -0,0 +1,87 @@
+import unittest.mock
+import unittest
+import os
+import pathlib
+import shutil
+import tempfile
+import ons_csv_to_ctb_json_main
+from ons_csv_to_ctb_json_load import Loader
+from ons_csv_to_ctb_json_columns import FILE_COLUMNS, file_columns, check_headers
+
+FILE_DIR = pathlib.Path(__file__).parent.resolve()
+INPUT_DIR = os.path.join(FILE_DIR, 'testdata')
+GEOGRAPHY_FILE = os.path.join(FILE_DIR, 'testdata/geography/geography1.csv')
+
+
+def remove_column(filename, column):
+    with open(filename, newline='') as f:
+        header, rest = f.read().split('\n', 1)
+    header = ','.join(name for name in header.split(',') if name.strip() != column)
+    with open(filename, 'w', newline='') as f:
+        f.write(header + '\n' + rest)
+
+
+class TestPreflight(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.input_dir = os.path.join(self.temp_dir, 'input')
+        shutil.copytree(INPUT_DIR, self.input_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    @unittest.mock.patch('ons_csv_to_ctb_json_read.Reader.rows')
+    def test_valid_files(self, rows):
+        check_headers(INPUT_DIR, [GEOGRAPHY_FILE])
+        rows.assert_not_called()
+
+    def test_all_problems_reported(self):
+        remove_column(os.path.join(self.input_dir, 'Variable.csv'), 'Id')
+        remove_column(os.path.join(self.input_dir, 'Variable.csv'), 'Version')
+        remove_column(os.path.join(self.input_dir, 'Category_Mapping.csv'), 'Codebook_Mnemonic')
+        os.remove(os.path.join(self.input_dir, 'Topic.csv'))
+        geography_file = os.path.join(self.temp_dir, 'geography.csv')
+        with open(geography_file, 'w') as f:
+            f.write('LAD22cd,lad22CD,LAD22nm\n')
+
+        with self.assertRaises(ValueError) as cm:
+            check_headers(self.input_dir, [geography_file])
+
+        self.assertEqual(str(cm.exception).split('\n'), [
+            '4 problem(s) found in file headers:',
+            f"[Errno 2] No such file or directory: '{self.input_dir}/Topic.csv'",
+            f'Reading {self.input_dir}/Variable.csv: missing expected columns: Id, Version',
+            f'Reading {self.input_dir}/Category_Mapping.csv: missing expected columns: '
+            'Codebook_Mnemonic',
+            f'Reading {geography_file}: duplicate case insensitive column names: lad22cd'])
+
+    def test_main_checks_headers_before_loading(self):
+        remove_column(os.path.join(self.input_dir, 'Category.csv'), 'Category_Code')
+        output_dir = os.path.join(self.temp_dir, 'output')
+        os.mkdir(output_dir)
+        with unittest.mock.patch('sys.argv', ['test', '-i', self.input_dir, '-o', output_dir]):
+            with unittest.mock.patch('ons_csv_to_ctb_json_read.Reader.rows') as rows:
+                with self.assertRaisesRegex(ValueError, 'missing expected columns: Category_Code'):
+                    ons_csv_to_ctb_json_main.main()
+        rows.assert_not_called()
+        self.assertEqual(os.listdir(output_dir), [])
+
+    def test_columns(self):
+        # Foreign key columns are resolved using Loader properties or the supplied values.
+        loader = Loader(INPUT_DIR, [])
+        columns = {c.name: c for c in file_columns('Dataset_Keyword.csv', loader.symbols,
+                                                   dataset_mnemonics=['DS1'])}
+        self.assertTrue(columns['Dataset_Mnemonic'].validate_fn('DS1'))
+        self.assertFalse(columns['Dataset_Mnemonic'].validate_fn('DS2'))
+
+        columns = {c.name: c for c in file_columns('Source.csv', loader.symbols)}
+        for contact in loader.contacts:
+            self.assertTrue(columns['Contact_Id'].validate_fn(contact))
+        self.assertFalse(columns['Contact_Id'].validate_fn('unknown'))
+
+        self.assertEqual([c.name for c in file_columns('Source.csv', loader.symbols)],
+                         [c.name for c in FILE_COLUMNS['Source.csv']])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import json
+import logging
+import unittest.mock
+import unittest
+import os
+import time
+import tracemalloc
+from helper_funcs import MainTestMixin
+from ons_csv_to_ctb_json_profile import Profiler
+from ons_csv_to_ctb_json_read import Reader, required
+from ons_csv_to_ctb_json_stages import STAGE_INPUTS
+
+PROFILE_FILENAME = 'cantabm_v10-2-3_unknown-metadata-version_profile_19700101-1.json'
+
+
+class TestProfile(MainTestMixin, unittest.TestCase):
+    main_args = ['--dataset-filter', 'DS1,DS2,DS3,DS4']
+
+    def test_profile_report(self):
+        for extra_args in [['--profile'], ['--profile', '--stage-threads', '3']]:
+            with self.subTest(extra_args=extra_args):
+                runs = self.assert_output_identical(extra_args, extra_files=[PROFILE_FILENAME])
+                output = runs.output
+                self.assertNotIn('profile', '\n'.join(runs.logs))
+                report = json.loads(runs.option_output[PROFILE_FILENAME])
+                self.assertRegex(runs.option_logs[-1], f'Written profile report to: .*/'
+                                                       f'{PROFILE_FILENAME}$')
+
+                entries = {(e['kind'], e['name']): e for e in report['entries']}
+                self.assertEqual({name for kind, name in entries if kind == 'stage'},
+                                 set(STAGE_INPUTS))
+                self.assertEqual(
+                    {name for kind, name in entries if kind == 'build'},
+                    {'build_ctb_variables', 'build_ctb_datasets', 'build_ctb_tables',
+                     'build_ctb_service_metadata'})
+                self.assertEqual({name for kind, name in entries if kind == 'write'},
+                                 set(output))
+                self.assertEqual({name for kind, name in entries if kind == 'read'},
+                                 {'read_geo_cats'})
+                for entry in report['entries']:
+                    self.assertGreaterEqual(entry['wall_time'], 0)
+                    self.assertGreaterEqual(entry['cpu_time'], 0)
+
+                categories = entries[('stage', 'categories')]
+                self.assertEqual(categories['objects'], 3)
+                self.assertEqual(categories['files'],
+                                 {'Category.csv': {'rows_read': 7, 'rows_dropped': 0,
+                                                   'errors': 0}})
+
+                datasets = entries[('stage', 'datasets')]
+                self.assertEqual(datasets['objects'], 4)
+                self.assertEqual(datasets['files']['Dataset.csv'],
+                                 {'rows_read': 4, 'rows_dropped': 3, 'errors': 0})
+                self.assertEqual(datasets['rows_dropped'],
+                                 sum(f['rows_dropped'] for f in datasets['files'].values()))
+
+                for filename, contents in output.items():
+                    self.assertEqual(entries[('write', filename)]['bytes'], len(contents))
+
+    def test_rows_dropped_by_validation(self):
+        filename = os.path.join(self.temp_dir, 'Dataset.csv')
+        with open(filename, 'w') as f:
+            f.write('id,Dataset_Mnemonic\n1,DS1\n,DS2\n3,OTHER\n4,DS4\n')
+
+        profiler = Profiler()
+        reader = Reader(filename, [required('id'), required('Dataset_Mnemonic')],
+                        logging.warning, dataset_filter='DS')
+        with self.assertLogs(level='WARNING'):
+            with profiler.measure('stage', 'datasets') as entry:
+                self.assertEqual(len(list(profiler.count_rows(reader, reader.rows()))), 2)
+        self.assertEqual(entry['files'], {'Dataset.csv': {'rows_read': 2, 'rows_dropped': 2,
+                                                          'errors': 1}})
+        self.assertEqual(entry['rows_dropped'], 2)
+
+    def test_nested_steps(self):
+        profiler = Profiler()
+        with profiler.measure('stage', 'outer') as outer:
+            time.sleep(0.01)
+            self.assertEqual(profiler.call('stage', 'inner', time.sleep, 0.05), None)
+        inner = profiler.entries[1]
+        self.assertEqual([e['name'] for e in profiler.entries], ['outer', 'inner'])
+        self.assertGreaterEqual(inner['wall_time'], 0.05)
+        self.assertLess(outer['wall_time'], 0.05)
+        self.assertGreaterEqual(outer['wall_time'], 0.01)
+        self.assertIsNone(inner['objects'])
+        self.assertGreaterEqual(profiler.report()['wall_time'], 0.06)
+
+    def test_memory_report(self):
+        output, _ = self.run_main(['--profile-memory'])
+        self.assertFalse(tracemalloc.is_tracing())
+        report = json.loads(output[PROFILE_FILENAME])
+        entries = {(e['kind'], e['name']): e for e in report['entries']}
+        self.assertIn(('read', 'read_geo_cats'), entries)
+        self.assertIn(('build', 'build_ctb_datasets'), entries)
+        for entry in report['entries']:
+            self.assertIsInstance(entry['memory_net'], int)
+            self.assertIsInstance(entry['memory_sites'], list)
+            if hasattr(tracemalloc, 'reset_peak'):
+                self.assertLessEqual(entry['memory_peak'], report['memory_peak'])
+
+    def test_nested_memory(self):
+        profiler = Profiler(memory=True)
+        try:
+            with profiler.measure('stage', 'outer') as outer:
+                outer_data = bytearray(1000000)
+                with profiler.measure('stage', 'inner') as inner:
+                    inner_data = bytearray(2000000)
+        finally:
+            profiler.stop()
+
+        self.assertAlmostEqual(inner['memory_net'], 2000000, delta=100000)
+        self.assertAlmostEqual(outer['memory_net'], 1000000, delta=100000)
+        self.assertEqual(inner['memory_sites'][0]['site'].split(':')[0], 'test_profile.py')
+        self.assertGreaterEqual(inner['memory_sites'][0]['size'], 2000000)
+        self.assertGreaterEqual(outer['memory_sites'][0]['size'], 2000000)
+        if hasattr(tracemalloc, 'reset_peak'):
+            self.assertGreaterEqual(inner['memory_peak'], 3000000)
+            self.assertGreaterEqual(outer['memory_peak'], inner['memory_peak'])
+        self.assertEqual(len(outer_data) + len(inner_data), 3000000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import json
+import unittest.mock
+import unittest
+import os
+import tempfile
+from helper_funcs import INPUT_DIR, MainTestMixin, run_main
+from ons_csv_to_ctb_json_load import Loader, LoaderOptions
+from ons_csv_to_ctb_json_prune import PrunedLoader
+from ons_csv_to_ctb_json_read import Reader, required
+
+
+class TestPrune(MainTestMixin, unittest.TestCase):
+    copy_input = True
+    main_args = ['--dataset-filter', 'DS_TAB']
+
+    def output_json(self, extra_args):
+        """Return the parsed contents of each output file keyed on its type e.g. tables-md."""
+        output, _ = self.run_main(extra_args)
+        return {filename.split('_')[-2]: json.loads(contents)
+                for filename, contents in output.items()}
+
+    def test_pruned_output(self):
+        output = self.output_json([])
+        pruned_output = self.output_json(['--prune'])
+
+        self.assertEqual(pruned_output['tables-md'], output['tables-md'])
+        self.assertEqual([d['name'] for d in pruned_output['dataset-md']],
+                         ['base', 'base', 'DB_TAB', 'DB_TAB'])
+        self.assertEqual([v['name'] for v in pruned_output['dataset-md'][0]['vars']],
+                         ['CLASS1 (Codebook)', 'CLASS4'])
+        self.assertEqual(pruned_output['dataset-md'][0]['vars'],
+                         [v for v in output['dataset-md'][0]['vars']
+                          if v['name'] in ['CLASS1 (Codebook)', 'CLASS4']])
+
+    def test_unreferenced_categories_not_validated(self):
+        with open(os.path.join(self.input_dir, 'Category.csv'), 'a') as f:
+            f.write('SOURCE2,CLASS2,2,CODE2-1,LABEL2-1,,2,1,\n')
+
+        loader = Loader(self.input_dir, [], dataset_filter='DS_TAB')
+        with self.assertRaisesRegex(ValueError, 'Category.csv:9 no value supplied for required field'):
+            loader.categories
+
+        for options in [LoaderOptions(), LoaderOptions(prefetch=True)]:
+            with self.subTest(options=options):
+                loader = PrunedLoader(self.input_dir, [], dataset_filter='DS_TAB', options=options)
+                with self.assertLogs(level='INFO') as cm:
+                    loader.prune()
+                self.assertIn('Pruned metadata to 2 of 10 classifications and 1 of 4 databases '
+                              'referenced by 2 datasets', '\n'.join(cm.output))
+                self.assertEqual(sorted(loader.categories), ['CLASS1'])
+                self.assertEqual(sorted(loader.classifications), ['CLASS1', 'CLASS4'])
+                self.assertEqual(sorted(loader.databases), ['DB_TAB'])
+
+                loader.prune()
+                self.assertEqual(sorted(loader.classifications), ['CLASS1', 'CLASS4'])
+
+    def test_keep_values(self):
+        filename = os.path.join(self.temp_dir, 'file.csv')
+        with open(filename, 'w') as f:
+            f.write('id,name\n1,a\n2,b\n3,a\n')
+
+        columns = [required('id', unique=True, validate_fn=lambda v: v != '2'),
+                   required('name')._replace(keep_values={'a'})]
+        rows = list(Reader(filename, columns, None).rows())
+        self.assertEqual([(row['id'], row_num) for row, row_num in rows], [('1', 2), ('3', 4)])
+
+    def test_different_variant_dataset_filter(self):
+        variants_file = os.path.join(self.temp_dir, 'variants.json')
+        with open(variants_file, 'w') as f:
+            json.dump([{}, {'dataset_filter': 'DS1', 'metadata_master_version': 'ds1'}], f)
+        with unittest.mock.patch.object(Loader, 'iter_file') as iter_file:
+            with self.assertRaisesRegex(ValueError, '--prune cannot be used with variants that '
+                                                    'have different dataset filters'):
+                self.run_main(['--prune', '--variants', variants_file])
+        iter_file.assert_not_called()
+
+    def test_same_variant_dataset_filter(self):
+        """Check that variants may share a dataset filter that differs from the command line."""
+        # Datasets that do not start with TS have errors, so they must never be loaded.
+        input_dir = os.path.join(INPUT_DIR, 'dataset_filter')
+        variants_file = os.path.join(self.temp_dir, 'variants.json')
+        with open(variants_file, 'w') as f:
+            json.dump([{'dataset_filter': 'TS', 'file_prefix': 'd'},
+                       {'dataset_filter': 'TS', 'file_prefix': 't'}], f)
+        output, _ = run_main(self, ['-i', input_dir, '--prune', '--variants', variants_file],
+                             tempfile.mkdtemp(dir=self.temp_dir))
+
+        self.assertEqual(len(output), 6)
+        for file_prefix in ['d', 't']:
+            expected_output, _ = run_main(
+                self, ['-i', input_dir, '--prune', '--dataset-filter', 'TS', '-p', file_prefix],
+                tempfile.mkdtemp(dir=self.temp_dir))
+            for filename, contents in expected_output.items():
+                self.assertEqual(output[filename], contents)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest.mock
+import unittest
+import os
+import pickle
+from helper_funcs import MainTestMixin
+from ons_csv_to_ctb_json_load import Loader
+from ons_csv_to_ctb_json_snapshot import SNAPSHOT_MAGIC, restore_snapshot, save_snapshot
+
+
+class TestSnapshot(MainTestMixin, unittest.TestCase):
+    copy_input = True
+
+    def setUp(self):
+        super().setUp()
+        self.snapshot = os.path.join(self.temp_dir, 'metadata.snapshot')
+
+    def test_restored_output_identical(self):
+        """Check that a restored snapshot can be used to produce files with other output options."""
+        self.run_main(['--save-snapshot', self.snapshot])
+
+        output_args = ['-m', 'other', '-p', 't', '-b', '3', '-v', '10.1.0',
+                       '--base-dataset-name', 'other_base']
+        runs = self.assert_output_identical(
+            ['--restore-snapshot', self.snapshot], base_args=output_args, option_patches=[
+                unittest.mock.patch('ons_csv_to_ctb_json_read.Reader.rows',
+                                    side_effect=AssertionError('file should not be read')),
+                unittest.mock.patch('ons_csv_to_ctb_json_geo.read_file',
+                                    side_effect=AssertionError('file should not be read'))])
+        self.assertEqual(len(runs.option_output), 3)
+
+    def test_stale_snapshot(self):
+        self.run_main(['--save-snapshot', self.snapshot])
+        with open(os.path.join(self.input_dir, 'Topic.csv'), 'a') as f:
+            f.write('TOPIC99,99,TOPIC99 Description,,TOPIC99 Title,\n')
+
+        with self.assertRaisesRegex(ValueError, 'is stale: input files have changed: Topic.csv$'):
+            self.run_main(['--restore-snapshot', self.snapshot])
+
+        loader = Loader(self.input_dir, [])
+        with self.assertRaisesRegex(ValueError, 'geography1.csv$'):
+            restore_snapshot(loader, self.snapshot)
+
+    def test_different_dataset_filter(self):
+        self.run_main(['--save-snapshot', self.snapshot])
+        with self.assertRaisesRegex(ValueError, 'created with a different dataset filter'):
+            self.run_main(['--restore-snapshot', self.snapshot, '--dataset-filter', 'DS1'])
+
+    def test_invalid_snapshot(self):
+        with open(self.snapshot, 'wb') as f:
+            f.write(b'not a snapshot')
+        loader = Loader(self.input_dir, [])
+        with self.assertRaisesRegex(ValueError, 'is not a metadata snapshot file'):
+            restore_snapshot(loader, self.snapshot)
+
+        with open(self.snapshot, 'wb') as f:
+            f.write(SNAPSHOT_MAGIC)
+            pickle.dump(0, f)
+        with self.assertRaisesRegex(ValueError, 'has snapshot format version 0 but version 1 is '
+                                                'required'):
+            restore_snapshot(loader, self.snapshot)
+
+    def test_not_saved_after_errors(self):
+        with open(os.path.join(self.input_dir, 'Topic.csv'), 'a') as f:
+            f.write('TOPIC1,dup,dup,99,,\n')
+
+        loader = Loader(self.input_dir, [], best_effort=True)
+        with self.assertLogs(level='WARNING') as cm:
+            self.assertFalse(save_snapshot(loader, self.snapshot))
+        self.assertIn('Not saving snapshot', cm.output[-1])
+        self.assertFalse(os.path.exists(self.snapshot))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import contextlib
+import unittest.mock
+import unittest
+import os
+import shutil
+from helper_funcs import INPUT_DIR, MainTestMixin
+import ons_csv_to_ctb_json_main
+from ons_csv_to_ctb_json_load import Loader
+from ons_csv_to_ctb_json_stages import STAGE_FILES, STAGE_INPUTS, critical_path, load_stages, \
+    required_stages
+
+
+class TestStages(MainTestMixin, unittest.TestCase):
+    def test_output_identical(self):
+        """Check that the output is identical when stages are loaded concurrently."""
+        runs = self.assert_output_identical(['--stage-threads', '4'])
+
+        critical_path_logs = [line for line in runs.option_logs if 'Critical path:' in line]
+        self.assertEqual(len(critical_path_logs), 1)
+        self.assertRegex(critical_path_logs[0], r'Critical path: .* total=[0-9.]+s$')
+        runs.option_logs.remove(critical_path_logs[0])
+        self.assertEqual(sorted(runs.logs), sorted(runs.option_logs))
+
+    def test_incompatible_options(self):
+        """Check that --stage-threads is rejected with options that load the stages differently."""
+        for option in ['--incremental-dir', '--restore-snapshot']:
+            with self.subTest(option=option):
+                with unittest.mock.patch('sys.argv', [
+                        'test', '-i', INPUT_DIR, '-o', self.output_dir, '--stage-threads', '4',
+                        option, os.path.join(self.temp_dir, 'state')]):
+                    with self.assertRaises(SystemExit):
+                        ons_csv_to_ctb_json_main.main()
+
+    def test_declared_inputs(self):
+        """Check that each stage only uses the properties declared in STAGE_INPUTS."""
+        self.assertEqual(set(STAGE_INPUTS),
+                         {name for name, value in vars(Loader).items()
+                          if isinstance(value, property)})
+
+        used = []
+
+        def recording_property(name):
+            fget = getattr(Loader, name).fget
+
+            def get(loader):
+                used.append(name)
+                return fget(loader)
+            return property(get)
+
+        with contextlib.ExitStack() as stack:
+            for name in STAGE_INPUTS:
+                stack.enter_context(unittest.mock.patch.object(Loader, name,
+                                                               recording_property(name)))
+            for name, inputs in STAGE_INPUTS.items():
+                with self.subTest(stage=name):
+                    loader = Loader(INPUT_DIR, [self.geography_file])
+                    for input_name in required_stages(inputs):
+                        getattr(loader, input_name)
+                    used.clear()
+                    getattr(loader, name)
+                    self.assertLessEqual(set(used) - {name}, set(inputs))
+
+    def test_declared_files(self):
+        """Check that each stage only reads the files declared in STAGE_FILES."""
+        self.assertEqual(set(STAGE_FILES), set(STAGE_INPUTS))
+        loader = Loader(INPUT_DIR, [self.geography_file])
+        with unittest.mock.patch.object(Loader, 'iter_file', autospec=True,
+                                        side_effect=Loader.iter_file) as iter_file:
+            for name in required_stages(STAGE_INPUTS):
+                with self.subTest(stage=name):
+                    iter_file.reset_mock()
+                    getattr(loader, name)
+                    self.assertEqual({c[0][1] for c in iter_file.call_args_list},
+                                     set(STAGE_FILES[name]))
+
+    def test_failure(self):
+        input_dir = os.path.join(self.temp_dir, 'input')
+        shutil.copytree(INPUT_DIR, input_dir)
+        with open(os.path.join(input_dir, 'Topic.csv'), 'a') as f:
+            f.write('TOPIC1,dup,dup,99,,\n')
+
+        loader = Loader(input_dir, [])
+        with unittest.mock.patch.object(Loader, 'variables',
+                                        new_callable=unittest.mock.PropertyMock) as variables:
+            with self.assertRaisesRegex(ValueError, 'duplicate value TOPIC1'):
+                load_stages(loader, ['classifications'], 4)
+        variables.assert_not_called()
+
+    def test_critical_path(self):
+        durations = {name: 1.0 for name in required_stages(['datasets', 'categories'])}
+        self.assertEqual(critical_path(durations),
+                         ['questions', 'variables', 'classifications', 'databases', 'datasets'])
+
+        durations['categories'] = 10.0
+        self.assertEqual(critical_path(durations),
+                         ['questions', 'variables', 'classifications', 'categories'])
+
+
+if __name__ == '__main__':
+    unittest.main()
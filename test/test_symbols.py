@@ -0,0 +1,51 @@
+import unittest.mock
+import unittest
+import pathlib
+import os
+from ons_csv_to_ctb_json_columns import file_columns
+from ons_csv_to_ctb_json_load import Loader
+from ons_csv_to_ctb_json_symbols import Symbols, SymbolTable
+
+INPUT_DIR = os.path.join(pathlib.Path(__file__).parent.resolve(), 'testdata')
+
+
+class TestSymbols(unittest.TestCase):
+    def test_lookups(self):
+        symbols = Symbols(['Abc', 'ABC', 'def'])
+        self.assertEqual(len(symbols), 3)
+        self.assertIn('ABC', symbols)
+        self.assertNotIn('abc', symbols)
+        self.assertEqual(symbols.find('abc'), 'Abc')
+        self.assertEqual(symbols.find('DEF'), 'def')
+        self.assertIsNone(symbols.find('ghi'))
+
+        validate_fn = symbols.validator()
+        self.assertTrue(validate_fn('def'))
+        self.assertFalse(validate_fn('DEF'))
+
+    def test_symbol_table(self):
+        loader = Loader(INPUT_DIR, [])
+        symbols = SymbolTable(loader)
+        topics = symbols['topics']
+        self.assertEqual(topics.names, set(loader.topics))
+        self.assertIs(symbols['topics'], topics)
+        self.assertEqual(symbols.find('topics', 'topic1'), 'TOPIC1')
+
+        # The symbols are rebuilt when the loaded metadata are discarded.
+        loader.cache.clear('topics')
+        self.assertIsNot(symbols['topics'], topics)
+        self.assertEqual(symbols['topics'].names, topics.names)
+
+    def test_symbols_not_rebuilt(self):
+        loader = Loader(INPUT_DIR, [])
+        dataset_mnemonics = Symbols(['DS1'])
+        loader.symbols['contacts']
+        with unittest.mock.patch.object(Symbols, '__init__', autospec=True,
+                                        side_effect=Symbols.__init__) as init:
+            file_columns('Dataset_Keyword.csv', loader.symbols, dataset_mnemonics=dataset_mnemonics)
+            file_columns('Source.csv', loader.symbols)
+            file_columns('Source.csv', loader.symbols)
+        init.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -86,6 +86,29 @@ class TestVariable(unittest.TestCase):
                         {'Variable_Mnemonic': 'VAR1', 'Variable_Type_Code': 'DVO', **COMMON_FIELDS}]
         self.run_test(rows, f'^Reading {FILENAME}:3 Geography_Hierarchy_Order value of 1 specified for both GEO2 and GEO1$')
 
+        rows[0]['Geography_Hierarchy_Order'] = '01'
+        self.run_test(rows, f'^Reading {FILENAME}:3 Geography_Hierarchy_Order value of 1 specified for both GEO2 and GEO1$')
+
+    def test_invalid_geo_hierarchy(self):
+        for value in ['-1', '1.0', '½', '²']:
+            with self.subTest(value=value):
+                rows = [{'Variable_Mnemonic': 'GEO1', 'Variable_Type_Code': 'GEOG', 'Geography_Hierarchy_Order': value,
+                         **COMMON_FIELDS}]
+                self.run_test(rows, f'^Reading {FILENAME}:2 invalid value {value} for Geography_Hierarchy_Order$')
+
+    def test_geo_hierarchy_exported_unchanged(self):
+        rows = [{'Variable_Mnemonic': 'GEO1', 'Variable_Type_Code': 'GEOG', 'Geography_Hierarchy_Order': '01',
+                 **COMMON_FIELDS},
+                {'Variable_Mnemonic': 'GEO2', 'Variable_Type_Code': 'GEOG', 'Geography_Hierarchy_Order': '2',
+                 **COMMON_FIELDS},
+                {'Variable_Mnemonic': 'VAR1', 'Variable_Type_Code': 'DVO', **COMMON_FIELDS}]
+        with unittest.mock.patch('builtins.open', conditional_mock_open('Variable.csv',
+                read_data = build_test_file(HEADERS, rows))):
+            variables = Loader(INPUT_DIR, None).variables
+        self.assertEqual(variables['GEO1'].english()['Geography_Hierarchy_Order'], '01')
+        self.assertEqual(variables['GEO2'].english()['Geography_Hierarchy_Order'], '2')
+        self.assertEqual(variables['GEO1'].private['Geography_Hierarchy_Order'], 1)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,85 @@
+import json
+import unittest.mock
+import unittest
+import os
+from collections import Counter
+from helper_funcs import INPUT_DIR, MainTestMixin
+from ons_csv_to_ctb_json_load import Loader, LoaderOptions
+from ons_csv_to_ctb_json_main import loader_for_dataset_filter
+from ons_csv_to_ctb_json_stages import dataset_filter_stages
+
+VARIANTS = [
+    ({'file_prefix': 'd'}, ['-p', 'd']),
+    ({'file_prefix': 't', 'cantabular_version': '10.1.0'}, ['-p', 't', '-v', '10.1.0']),
+    ({'dataset_filter': 'DS1,DS2,DS3,DS4', 'metadata_master_version': 'ds1'},
+     ['--dataset-filter', 'DS1,DS2,DS3,DS4', '-m', 'ds1']),
+    ({'base_dataset_name': 'other', 'build_number': '2', 'file_prefix': None},
+     ['--base-dataset-name', 'other', '-b', '2']),
+]
+
+
+class TestVariants(MainTestMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.variants_file = os.path.join(self.temp_dir, 'variants.json')
+
+    def write_variants(self, variants):
+        with open(self.variants_file, 'w') as f:
+            json.dump(variants, f)
+
+    def test_output_identical(self):
+        """Check that each variant is identical to the output of a separate run."""
+        self.write_variants([variant for variant, _ in VARIANTS])
+        with unittest.mock.patch.object(Loader, 'iter_file', autospec=True,
+                                        side_effect=Loader.iter_file) as iter_file, \
+                unittest.mock.patch('ons_csv_to_ctb_json_main.json.dumps',
+                                    side_effect=json.dumps) as dumps:
+            output, _ = self.run_main(['--variants', self.variants_file])
+
+        expected_output = {}
+        for _, args in VARIANTS:
+            expected_output.update(self.run_main(args)[0])
+        self.assertEqual(len(output), 3 * len(VARIANTS))
+        self.assertEqual(output, expected_output)
+
+        # Only the files read by the datasets stage are read again for the second dataset filter.
+        read_counts = Counter(call[0][1] for call in iter_file.call_args_list)
+        self.assertEqual(read_counts['Dataset.csv'], 2)
+        self.assertEqual(read_counts['Classification.csv'], 1)
+        self.assertEqual(read_counts['Category.csv'], 1)
+
+        # The dataset metadata are shared by three variants and the tables and service metadata
+        # by the first, second and fourth variants. Each is serialised once.
+        self.assertEqual(len([c for c in dumps.call_args_list if c[1].get('indent')]), 3)
+
+    def test_filtered_loader_not_prefetched(self):
+        loader = Loader(INPUT_DIR, [self.geography_file], options=LoaderOptions(prefetch=True))
+        loader.classifications
+        filtered_loader = loader_for_dataset_filter(loader, 'DS1,DS2,DS3,DS4', best_effort=False)
+        self.assertIsNone(filtered_loader.prefetcher)
+        self.assertEqual(filtered_loader.classifications, loader.classifications)
+        self.assertEqual(sorted(filtered_loader.datasets), ['DS1', 'DS2', 'DS3', 'DS4'])
+
+    def test_dataset_filter_stages(self):
+        self.assertEqual(dataset_filter_stages(), {'datasets'})
+
+    def test_invalid_variants(self):
+        for variants, error in [
+                ({'file_prefix': 'd'}, 'expected a non-empty list of variants'),
+                ([], 'expected a non-empty list of variants'),
+                (['d'], 'variant 1 is not an object'),
+                ([{}, {'prefix': 'd'}], 'variant 2 has unknown options: prefix'),
+                ([{'file_prefix': 'x'}], "variant 1 has invalid file_prefix: invalid value: 'x'"),
+                ([{'build_number': 2}], 'variant 1 has invalid build_number: invalid value: 2'),
+                ([{'dataset_filter': None}], 'variant 1 has invalid dataset_filter'),
+                ([{'metadata_master_version': 'a/b'}], 'invalid metadata_master_version'),
+                ([{'file_prefix': 'd'}, {'dataset_filter': 'DS1', 'file_prefix': 'd'}],
+                 'variants 1 and 2 have the same output filenames')]:
+            with self.subTest(variants=variants):
+                self.write_variants(variants)
+                with self.assertRaisesRegex(ValueError, error):
+                    self.run_main(['--variants', self.variants_file])
+
+
+if __name__ == '__main__':
+    unittest.main()